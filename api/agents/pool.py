@@ -0,0 +1,151 @@
+"""
+Warm agents for the lifetime of a worker process
+Tasks used to build a SummarizationAgent or RiskAssessmentAgent per call, each
+with its own MedicalAIService, HTTP clients and (empty) vector store. The pool
+builds one service per process - in the worker_process_init handler, so forked
+pool children never share the parent's connections - and both agents share
+it, keeping provider connections alive between tasks and the persisted note
+vector index loaded.
+
+Every checkout runs a cheap health check; a client that looks broken is
+replaced before the task sees it instead of failing it:
+- the HTTP connection pool was closed
+- the provider circuit breaker tripped since the clients were built, so the
+  recovery probe goes out on fresh connections
+- the clients are older than AI_AGENT_MAX_AGE_S
+The vector index is reloaded when a sync has written a newer one.
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from api.agents.risk_agent import RiskAssessmentAgent
+from api.agents.summarization_agent import SummarizationAgent
+from api.services.ai_service import MedicalAIService
+from api.services.circuit_breaker import get_breaker
+
+MAX_AGE_SECONDS = float(os.getenv("AI_AGENT_MAX_AGE_S", "3600"))
+
+
+class AgentPool:
+    """One MedicalAIService and the agents built on it, rebuilt when unhealthy"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._service: Optional[MedicalAIService] = None
+        self._summarization: Optional[SummarizationAgent] = None
+        self._risk: Optional[RiskAssessmentAgent] = None
+        self._built_at = 0.0
+        self._trip_count = 0
+        self._index_mtime: Optional[float] = None
+        self.builds = 0
+        self.last_rebuild_reason: Optional[str] = None
+
+    def warm(self):
+        """Build the agents and load the vector index now rather than on the first task"""
+        self._checked()
+
+    def ai_service(self) -> MedicalAIService:
+        return self._checked()[0]
+
+    def summarization_agent(self) -> SummarizationAgent:
+        return self._checked()[1]
+
+    def risk_agent(self) -> RiskAssessmentAgent:
+        return self._checked()[2]
+
+    def close(self):
+        with self._lock:
+            if self._service is not None:
+                self._service.close()
+            self._service = self._summarization = self._risk = None
+
+    def status(self) -> Dict:
+        with self._lock:
+            service = self._service
+            return {
+                "built": service is not None,
+                "builds": self.builds,
+                "age_s": round(time.monotonic() - self._built_at, 1) if service else None,
+                "last_rebuild_reason": self.last_rebuild_reason,
+                "vector_store_loaded": bool(service and service.vectorstore is not None),
+            }
+
+    def _checked(self):
+        with self._lock:
+            reason = self._unhealthy_reason()
+            if reason:
+                self._rebuild(reason)
+            self._refresh_vector_index()
+            return self._service, self._summarization, self._risk
+
+    def _unhealthy_reason(self) -> Optional[str]:
+        service = self._service
+        if service is None:
+            return "not built"
+        if service.http_client is not None and service.http_client.is_closed:
+            return "HTTP client closed"
+        if service.enabled and get_breaker(service.backend).trip_count != self._trip_count:
+            return "circuit breaker tripped"
+        if time.monotonic() - self._built_at > MAX_AGE_SECONDS:
+            return "max age reached"
+        return None
+
+    def _rebuild(self, reason: str):
+        try:
+            service = MedicalAIService()
+        except Exception as e:
+            # Keep serving the old clients rather than failing the task
+            print(f"⚠️ Could not rebuild AI agents ({reason}): {e}")
+            if self._service is None:
+                raise
+            return
+
+        rebuilt = self._service is not None
+        self._service = service
+        self._summarization = SummarizationAgent(service)
+        self._risk = RiskAssessmentAgent(service)
+        self._built_at = time.monotonic()
+        self._trip_count = get_breaker(service.backend).trip_count if service.enabled else 0
+        self._index_mtime = None
+        self.builds += 1
+        self.last_rebuild_reason = reason
+        if rebuilt:
+            # Not closed here: a task on another thread may still be using the old
+            # clients; their connections are released once nothing references them
+            print(f"🔄 Rebuilt AI agents: {reason}")
+
+    def _refresh_vector_index(self):
+        """Load the persisted vector index when a sync has saved a newer one"""
+        from api.services import vector_index
+
+        service = self._service
+        if not service.enabled:
+            return
+        try:
+            # The watermark is written after the index, so a newer one means a complete save
+            mtime = os.path.getmtime(os.path.join(vector_index.VECTOR_STORE_DIR, vector_index.WATERMARK_FILE))
+        except OSError:
+            return
+        if mtime == self._index_mtime:
+            return
+        # Whatever the outcome, try this version of the index only once
+        self._index_mtime = mtime
+        try:
+            service.vectorstore = vector_index.load_store(service.embeddings)
+        except Exception as e:
+            print(f"⚠️ Could not load the note vector index: {e}")
+
+
+_default_pool: Optional[AgentPool] = None
+_default_lock = threading.Lock()
+
+
+def get_agent_pool() -> AgentPool:
+    """Process-wide agent pool"""
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = AgentPool()
+        return _default_pool
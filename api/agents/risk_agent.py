@@ -1,20 +1,32 @@
 """
 Risk Assessment Agent for clinical risk evaluation
 """
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 from api.services.ai_service import MedicalAIService
+from api.services.clinical_lexicon import get_lexicon
+from api.services.risk_trends import risk_trend_series, DEFAULT_WINDOW, DEFAULT_PERIODS
+from api.services.report_cache import get_report_cache, patient_data_version
+from api.services.llm_scheduler import Priority, llm_request_context
+from api.db.database import SessionLocal
 from api.models.note import Note
 from api.models.patient import Patient
 from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
+from sqlalchemy import case, func
+from datetime import datetime
+
+# Note risk levels that put a patient on the high-risk list
+HIGH_RISK_LEVELS = ("HIGH", "CRITICAL")
 
 class RiskAssessmentAgent:
-    def __init__(self):
-        self.ai_service = MedicalAIService()
+    def __init__(self, ai_service: Optional[MedicalAIService] = None):
+        # Agents built together (see api/agents/pool.py) share one service and its clients
+        self.ai_service = ai_service or MedicalAIService()
     
-    def generate_patient_risk_report(self, patient_id: int, db: Session) -> Dict[str, any]:
+    def generate_patient_risk_report(self, patient_id: int, db: Session, trend_window: str = DEFAULT_WINDOW,
+                                     trend_periods: int = DEFAULT_PERIODS) -> Dict[str, any]:
         """
-        Generate comprehensive risk report for a patient
+        Generate comprehensive risk report for a patient, with risk trends over
+        the last `trend_periods` days, weeks or months
         """
         try:
             # Get patient and all their notes
@@ -40,7 +52,6 @@ class RiskAssessmentAgent:
             
             # Analyze all notes for comprehensive risk assessment
             all_note_content = "\n\n".join([f"{note.title}: {note.content}" for note in notes])
-            patient_context = self._build_patient_context(patient, notes)
             
             # Get AI risk assessment
             risk_analysis = self.ai_service.assess_risk(
@@ -48,39 +59,116 @@ class RiskAssessmentAgent:
                 patient_history=[note.content for note in notes[:10]]  # Last 10 notes
             )
             
-            # Analyze trends
-            trends = self._analyze_risk_trends(notes)
+            return self._build_report(patient, notes, risk_analysis, db, trend_window, trend_periods)
             
-            # Generate specific recommendations
-            recommendations = self._generate_risk_recommendations(risk_analysis, trends, patient)
+        except Exception as e:
+            return self._error_report(e)
+    
+    def get_cached_risk_report(self, patient_id: int, db: Session, trend_window: str = DEFAULT_WINDOW,
+                               trend_periods: int = DEFAULT_PERIODS, refresh: bool = False,
+                               allow_stale: bool = True) -> Tuple[Dict, Dict]:
+        """
+        Risk report from the report cache, built on a miss and refreshed in the
+        background when stale (rebuilt inline if allow_stale=False).
+        Returns (report, cache metadata).
+        """
+        cache = get_report_cache()
+        variant = f"{trend_window}:{trend_periods}"
+        
+        def build(session: Session) -> Dict:
+            return self.generate_patient_risk_report(patient_id, session, trend_window, trend_periods)
+        
+        def rebuild() -> Dict:
+            session = SessionLocal()
+            try:
+                with llm_request_context(Priority.URGENT):
+                    version = patient_data_version(session, patient_id)
+                    report = build(session)
+                cache.store(patient_id, variant, version, report)
+                return report
+            finally:
+                session.close()
+        
+        return cache.get_or_build(db, patient_id, variant, build, rebuild, refresh=refresh, allow_stale=allow_stale)
+    
+    def stream_patient_risk_report(self, patient_id: int, db: Session, trend_window: str = DEFAULT_WINDOW,
+                                   trend_periods: int = DEFAULT_PERIODS) -> Iterator[Dict]:
+        """
+        Generate a risk report like generate_patient_risk_report, streaming the
+        assessment tokens and fields as they arrive. The last event is
+        {"event": "report", "data": <risk report>}.
+        """
+        try:
+            patient = db.query(Patient).filter(Patient.id == patient_id).first()
+            if not patient:
+                yield {"event": "report", "data": {"error": "Patient not found"}}
+                return
             
-            # Determine escalation criteria
-            escalation = self._determine_escalation(risk_analysis, trends)
+            notes = db.query(Note).filter(
+                Note.patient_id == patient_id
+            ).order_by(Note.created_at.desc()).all()
             
-            return {
-                "patient_name": f"{patient.first_name} {patient.last_name}",
-                "patient_id": patient.patient_id,
-                "risk_level": risk_analysis["risk_level"],
-                "summary": risk_analysis["risk_analysis"],
-                "risks": self._extract_risk_factors(risk_analysis["risk_analysis"]),
-                "recommendations": recommendations,
-                "escalation": escalation,
-                "trends": trends,
-                "last_assessment": datetime.now().isoformat(),
-                "monitoring_suggestions": risk_analysis.get("monitoring_suggestions", ""),
-                "escalation_criteria": risk_analysis.get("escalation_criteria", "")
-            }
+            if not notes:
+                yield {"event": "report", "data": self.generate_patient_risk_report(patient_id, db, trend_window, trend_periods)}
+                return
             
+            all_note_content = "\n\n".join([f"{note.title}: {note.content}" for note in notes])
+            
+            risk_analysis = None
+            for event in self.ai_service.stream_patient_risk(
+                note_content=all_note_content,
+                patient_history=[note.content for note in notes[:10]]
+            ):
+                if event["event"] == "assessment":
+                    risk_analysis = self.ai_service.format_risk_for_agent(event["data"])
+                else:
+                    yield event
+            
+            report = self._build_report(patient, notes, risk_analysis, db, trend_window, trend_periods)
         except Exception as e:
-            return {
-                "error": f"Error generating risk report: {str(e)}",
-                "patient_name": "Unknown",
-                "risk_level": "UNKNOWN",
-                "summary": "Unable to assess risk",
-                "risks": [],
-                "recommendations": [],
-                "escalation": "Contact IT support"
-            }
+            report = self._error_report(e)
+        
+        yield {"event": "report", "data": report}
+    
+    def _build_report(self, patient: Patient, notes: List[Note], risk_analysis: Dict, db: Session,
+                      trend_window: str, trend_periods: int) -> Dict[str, any]:
+        """Assemble the risk report from the AI assessment and note history"""
+        # Analyze trends
+        trends = self._analyze_risk_trends(patient.id, db, trend_window, trend_periods)
+        
+        # Generate specific recommendations
+        recommendations = self._generate_risk_recommendations(risk_analysis, trends, patient)
+        
+        # Determine escalation criteria
+        escalation = self._determine_escalation(risk_analysis, trends)
+        
+        return {
+            "patient_name": f"{patient.first_name} {patient.last_name}",
+            "patient_id": patient.patient_id,
+            "risk_level": risk_analysis["risk_level"],
+            "summary": risk_analysis["risk_analysis"],
+            "risks": self._extract_risk_factors(risk_analysis["risk_analysis"]),
+            "recommendations": recommendations,
+            "escalation": escalation,
+            "trends": trends,
+            "trend_window": trend_window,
+            "last_assessment": datetime.now().isoformat(),
+            "monitoring_suggestions": risk_analysis.get("monitoring_suggestions", ""),
+            "escalation_criteria": risk_analysis.get("escalation_criteria", ""),
+            "provisional": risk_analysis.get("provisional", False)
+        }
+    
+    def _error_report(self, error: Exception) -> Dict[str, any]:
+        """Report returned when risk report generation fails"""
+        return {
+            "error": f"Error generating risk report: {str(error)}",
+            "patient_name": "Unknown",
+            "risk_level": "UNKNOWN",
+            "summary": "Unable to assess risk",
+            "risks": [],
+            "recommendations": [],
+            "escalation": "Contact IT support"
+        }
     
     def _build_patient_context(self, patient: Patient, notes: List[Note]) -> str:
         """Build comprehensive patient context for risk assessment"""
@@ -104,34 +192,10 @@ class RiskAssessmentAgent:
         
         return "\n".join(context_parts)
     
-    def _analyze_risk_trends(self, notes: List[Note]) -> List[Dict[str, any]]:
-        """Analyze risk trends over time"""
-        trends = []
-        
-        # Group notes by week
-        weekly_notes = {}
-        for note in notes:
-            week_start = note.created_at - timedelta(days=note.created_at.weekday())
-            week_key = week_start.strftime('%Y-%m-%d')
-            
-            if week_key not in weekly_notes:
-                weekly_notes[week_key] = []
-            weekly_notes[week_key].append(note)
-        
-        # Analyze each week
-        for week, week_notes in list(weekly_notes.items())[:4]:  # Last 4 weeks
-            high_risk_count = sum(1 for note in week_notes if note.risk_level == "HIGH")
-            medium_risk_count = sum(1 for note in week_notes if note.risk_level == "MEDIUM")
-            
-            trends.append({
-                "week": week,
-                "total_notes": len(week_notes),
-                "high_risk_notes": high_risk_count,
-                "medium_risk_notes": medium_risk_count,
-                "risk_trend": "increasing" if high_risk_count > 0 else "stable"
-            })
-        
-        return trends
+    def _analyze_risk_trends(self, patient_id: int, db: Session, window: str = DEFAULT_WINDOW,
+                             periods: int = DEFAULT_PERIODS) -> List[Dict[str, any]]:
+        """Risk level counts per period, oldest first, aggregated in the database"""
+        return risk_trend_series(db, patient_id, window, periods)
     
     def _generate_risk_recommendations(self, risk_analysis: Dict, trends: List[Dict], patient: Patient) -> List[str]:
         """Generate specific risk management recommendations"""
@@ -172,22 +236,8 @@ class RiskAssessmentAgent:
     
     def _extract_risk_factors(self, risk_analysis_text: str) -> List[str]:
         """Extract specific risk factors from AI analysis"""
-        # Simple extraction - in production, use more sophisticated NLP
-        risk_factors = []
-        
-        # Common risk factor keywords
-        risk_keywords = [
-            "hypertension", "diabetes", "infection", "fever", "pain", "shortness of breath",
-            "chest pain", "dizziness", "nausea", "vomiting", "bleeding", "swelling",
-            "confusion", "weakness", "fatigue", "weight loss", "weight gain"
-        ]
-        
-        text_lower = risk_analysis_text.lower()
-        for keyword in risk_keywords:
-            if keyword in text_lower:
-                risk_factors.append(keyword.title())
-        
-        return list(set(risk_factors))
+        # Single pass over the text; synonyms map to one concept and negated mentions are skipped
+        return [concept.title() for concept in get_lexicon().concepts(risk_analysis_text, "risk_factor")]
     
     def _determine_escalation(self, risk_analysis: Dict, trends: List[Dict]) -> str:
         """Determine escalation requirements"""
@@ -203,30 +253,52 @@ class RiskAssessmentAgent:
             return "No immediate escalation required"
     
     def get_high_risk_patients(self, db: Session, limit: int = 10) -> List[Dict[str, any]]:
-        """Get list of high-risk patients"""
+        """
+        Patients whose latest HIGH/CRITICAL note ranks highest by severity, then recency.
+        One query: a window function picks each patient's latest high-risk note
+        and the patient fields are joined in, so `limit` counts patients.
+        """
         try:
-            # Get patients with high-risk notes
-            high_risk_notes = db.query(Note).filter(
-                Note.risk_level.in_(["HIGH", "CRITICAL"])
-            ).order_by(Note.created_at.desc()).limit(limit).all()
+            latest = db.query(
+                Note.id.label("note_id"),
+                Note.patient_id,
+                Note.risk_level,
+                Note.created_at,
+                Note.title,
+                Note.recommendations,
+                func.row_number().over(
+                    partition_by=Note.patient_id,
+                    order_by=(Note.created_at.desc(), Note.id.desc())
+                ).label("recency_rank")
+            ).filter(
+                Note.risk_level.in_(HIGH_RISK_LEVELS)
+            ).subquery()
             
-            high_risk_patients = []
-            processed_patients = set()
+            severity = case((latest.c.risk_level == "CRITICAL", 0), else_=1)
+            rows = db.query(
+                latest,
+                Patient.patient_id.label("external_patient_id"),
+                Patient.first_name,
+                Patient.last_name
+            ).join(
+                Patient, Patient.id == latest.c.patient_id
+            ).filter(
+                latest.c.recency_rank == 1
+            ).order_by(
+                severity, latest.c.created_at.desc(), latest.c.note_id.desc()
+            ).limit(limit).all()
             
-            for note in high_risk_notes:
-                if note.patient_id not in processed_patients:
-                    patient = note.patient
-                    high_risk_patients.append({
-                        "patient_id": patient.patient_id,
-                        "patient_name": f"{patient.first_name} {patient.last_name}",
-                        "risk_level": note.risk_level,
-                        "last_note_date": note.created_at.isoformat(),
-                        "last_note_title": note.title,
-                        "recommendations": note.recommendations
-                    })
-                    processed_patients.add(note.patient_id)
-            
-            return high_risk_patients
+            return [
+                {
+                    "patient_id": row.external_patient_id,
+                    "patient_name": f"{row.first_name} {row.last_name}",
+                    "risk_level": row.risk_level,
+                    "last_note_date": row.created_at.isoformat(),
+                    "last_note_title": row.title,
+                    "recommendations": row.recommendations
+                }
+                for row in rows
+            ]
             
         except Exception as e:
             return []
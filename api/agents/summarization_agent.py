@@ -1,20 +1,40 @@
 """
 Summarization Agent for medical notes using LangChain
 """
-from typing import Dict, List, Optional
+import asyncio
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 from api.services.ai_service import MedicalAIService
+from api.services.clinical_lexicon import get_lexicon
+from api.services.ai_pipeline import content_hash, is_ai_current, pipeline_version
+from api.services.risk_state import refresh_patient_risk_state
 from api.models.note import Note
 from api.models.patient import Patient
-from sqlalchemy.orm import Session
+from sqlalchemy import case
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.sql import func
+
+# Recent notes sent to the risk assessment as patient history
+HISTORY_NOTES = 5
+HISTORY_CHARS = 200
 
 class SummarizationAgent:
-    def __init__(self):
-        self.ai_service = MedicalAIService()
+    def __init__(self, ai_service: Optional[MedicalAIService] = None):
+        # Agents built together (see api/agents/pool.py) share one service and its clients
+        self.ai_service = ai_service or MedicalAIService()
+    
+    @property
+    def pipeline_version(self) -> str:
+        return pipeline_version(self.ai_service.model_name)
     
-    def process_note(self, note: Note, patient: Patient, db: Session) -> Dict[str, str]:
+    def process_note(self, note: Note, patient: Patient, db: Session, force: bool = False) -> Dict[str, str]:
         """
-        Process a note and generate AI-powered summary and analysis
+        Process a note and generate AI-powered summary and analysis.
+        Notes whose AI fields are already current are returned as stored
+        unless force is set.
         """
+        if not force and is_ai_current(note, self.pipeline_version):
+            return self._stored_result(note)
+        
         try:
             # Get patient context
             patient_context = self._build_patient_context(patient, db)
@@ -26,61 +46,243 @@ class SummarizationAgent:
                 patient_context=patient_context
             )
             
-            # Assess risk
-            patient_history = self._get_patient_history(patient.id, db)
-            risk_result = self.ai_service.assess_risk(
+            return self._complete_processing(note, patient, db, summary_result, patient_context)
+            
+        except Exception as e:
+            return self._failed_result(e)
+    
+    def stream_note(self, note: Note, patient: Patient, db: Session, force: bool = False) -> Iterator[Dict]:
+        """
+        Process a note like process_note, streaming summary tokens and fields
+        as they arrive. The last event is {"event": "result", "data": <process_note result>}.
+        """
+        if not force and is_ai_current(note, self.pipeline_version):
+            yield {"event": "result", "data": self._stored_result(note)}
+            return
+        
+        try:
+            patient_context = self._build_patient_context(patient, db)
+            
+            summary_result = None
+            for event in self.ai_service.stream_medical_note_summary(
                 note_content=note.content,
-                patient_history=patient_history
-            )
+                note_type=note.note_type.value
+            ):
+                if event["event"] == "summary":
+                    summary_result = self.ai_service.format_summary_for_agent(event["data"])
+                else:
+                    yield event
             
-            # Generate nurse recommendations if it's a nurse note
-            nurse_recommendations = {}
+            result = self._complete_processing(note, patient, db, summary_result, patient_context)
+        except Exception as e:
+            result = self._failed_result(e)
+        
+        yield {"event": "result", "data": result}
+    
+    def process_notes(self, note_ids: Sequence[int], db: Session, force: bool = False,
+                      progress: Optional[Callable[[int, Dict], None]] = None,
+                      claim: Optional[Callable[[Note], Optional[str]]] = None) -> Dict[int, Dict]:
+        """
+        Process a batch of notes like process_note, with the database work
+        amortised: notes, patients and recent histories are loaded in three
+        queries and all AI results are written back in one UPDATE and one
+        commit. Returns process_note results by note id (missing ids are
+        absent); `progress(note_id, result)` is called as each note finishes.
+        `claim(note)` is asked before a note is sent to the model and returns
+        the id of a task already working on it, in which case it is skipped.
+        """
+        notes = db.query(Note).options(joinedload(Note.patient)).filter(Note.id.in_(list(note_ids))).all()
+        pending = {n.id: n for n in notes if n.patient is not None and (force or not is_ai_current(n, self.pipeline_version))}
+        histories = self._get_patient_histories({n.patient_id for n in pending.values()}, db)
+        
+        results: Dict[int, Dict] = {}
+        updates: Dict[int, Dict] = {}
+        for note in notes:
+            if note.patient is None:
+                continue
+            holder = claim(note) if claim and note.id in pending else None
+            if note.id not in pending:
+                results[note.id] = self._stored_result(note)
+            elif holder is not None:
+                results[note.id] = {**self._stored_result(note), "duplicate_of": holder}
+            else:
+                try:
+                    patient_context = self._build_patient_context(note.patient, db)
+                    summary_result = self.ai_service.summarize_note(
+                        note_content=note.content,
+                        note_type=note.note_type.value,
+                        patient_context=patient_context
+                    )
+                    updates[note.id], results[note.id] = self._analyze(
+                        note, summary_result, patient_context, histories.get(note.patient_id, [])
+                    )
+                except Exception as e:
+                    results[note.id] = self._failed_result(e)
+            if progress:
+                progress(note.id, results[note.id])
+        
+        if updates:
+            self.save_results(db, updates, {pending[note_id].patient_id for note_id in updates})
+        return results
+    
+    async def aprocess_note(self, note: Note, patient: Patient, patient_history: List[str],
+                            force: bool = False) -> Tuple[Optional[Dict], Dict]:
+        """
+        process_note for the asyncio worker. Touches no database: the note and
+        patient are loaded (and may be detached) beforehand, and the returned
+        column values - None when there is nothing to save - are written with
+        save_results. Risk assessment and nurse recommendations run concurrently.
+        """
+        if not force and is_ai_current(note, self.pipeline_version):
+            return None, self._stored_result(note)
+        
+        try:
+            patient_context = self._build_patient_context(patient, None)
+            summary_result = await self.ai_service.asummarize_note(
+                note_content=note.content,
+                note_type=note.note_type.value,
+                patient_context=patient_context
+            )
+            risk_call = self.ai_service.aassess_risk(note_content=note.content, patient_history=patient_history)
             if note.note_type.value == "nurse_note":
-                nurse_recommendations = self.ai_service.generate_nurse_recommendations(
-                    note_content=note.content,
-                    patient_context=patient_context
+                risk_result, nurse_recommendations = await asyncio.gather(
+                    risk_call,
+                    self.ai_service.agenerate_nurse_recommendations(
+                        note_content=note.content,
+                        patient_context=patient_context
+                    )
                 )
-            
-            # Update note with AI results
-            note.summary = summary_result["summary"]
-            note.risk_level = risk_result["risk_level"]
-            
-            # Combine recommendations
-            all_recommendations = []
-            if summary_result.get("recommendations"):
-                all_recommendations.append(f"Clinical: {summary_result['recommendations']}")
-            if risk_result.get("recommendations"):
-                all_recommendations.append(f"Risk Management: {risk_result['recommendations']}")
-            if nurse_recommendations.get("nursing_actions"):
-                all_recommendations.append(f"Nursing: {nurse_recommendations['nursing_actions']}")
-            
-            note.recommendations = "\n\n".join(all_recommendations) if all_recommendations else None
-            
-            # Create tags from key findings
-            tags = self._extract_tags(summary_result, risk_result)
-            note.tags = ",".join(tags) if tags else None
-            
-            db.commit()
-            
-            return {
-                "success": True,
-                "summary": summary_result["summary"],
-                "risk_level": risk_result["risk_level"],
-                "recommendations": note.recommendations,
-                "tags": tags,
-                "nurse_recommendations": nurse_recommendations
-            }
-            
+            else:
+                risk_result, nurse_recommendations = await risk_call, {}
+            return self._combine(note, summary_result, risk_result, nurse_recommendations)
         except Exception as e:
-            return {
-                "success": False,
-                "error": str(e),
-                "summary": None,
-                "risk_level": "UNKNOWN",
-                "recommendations": None,
-                "tags": [],
-                "nurse_recommendations": {}
-            }
+            return None, self._failed_result(e)
+    
+    def save_results(self, db: Session, updates: Dict[int, Dict], patient_ids: set):
+        """Write AI column values for notes, refresh their patients' risk state and commit"""
+        self._write_results(db, updates)
+        for patient_id in patient_ids:
+            refresh_patient_risk_state(db, patient_id)
+        db.commit()
+    
+    def _complete_processing(self, note: Note, patient: Patient, db: Session,
+                             summary_result: Dict, patient_context: str) -> Dict:
+        """Run risk assessment and recommendations, then persist AI results on the note"""
+        values, result = self._analyze(note, summary_result, patient_context,
+                                       self.get_patient_history(patient.id, db))
+        for column, value in values.items():
+            setattr(note, column, value)
+        # Same database clock as updated_at, so this write does not look like a later edit
+        note.ai_processed_at = func.now()
+        
+        # Keep the patient's materialized risk state in step with this note
+        db.flush()
+        refresh_patient_risk_state(db, patient.id)
+        
+        db.commit()
+        return result
+    
+    def _analyze(self, note: Note, summary_result: Dict, patient_context: str,
+                 patient_history: List[str]) -> Tuple[Dict, Dict]:
+        """
+        Run risk assessment and recommendations for a summarized note.
+        Returns the note column values to save and the process_note result.
+        """
+        # Assess risk
+        risk_result = self.ai_service.assess_risk(
+            note_content=note.content,
+            patient_history=patient_history
+        )
+        
+        # Generate nurse recommendations if it's a nurse note
+        nurse_recommendations = {}
+        if note.note_type.value == "nurse_note":
+            nurse_recommendations = self.ai_service.generate_nurse_recommendations(
+                note_content=note.content,
+                patient_context=patient_context
+            )
+        
+        return self._combine(note, summary_result, risk_result, nurse_recommendations)
+    
+    def _combine(self, note: Note, summary_result: Dict, risk_result: Dict,
+                 nurse_recommendations: Dict) -> Tuple[Dict, Dict]:
+        """Note column values and process_note result from the model outputs"""
+        # Combine recommendations
+        all_recommendations = []
+        if summary_result.get("recommendations"):
+            all_recommendations.append(f"Clinical: {summary_result['recommendations']}")
+        if risk_result.get("recommendations"):
+            all_recommendations.append(f"Risk Management: {risk_result['recommendations']}")
+        if nurse_recommendations.get("nursing_actions"):
+            all_recommendations.append(f"Nursing: {nurse_recommendations['nursing_actions']}")
+        recommendations = "\n\n".join(all_recommendations) if all_recommendations else None
+        
+        # Create tags from key findings
+        tags = self._extract_tags(summary_result, risk_result)
+        
+        # Provisional (fallback) results stay in the backlog so they are redone
+        # once the model is reachable again
+        provisional = bool(summary_result.get("provisional") or risk_result.get("provisional"))
+        values = {
+            "summary": summary_result["summary"],
+            "risk_level": risk_result["risk_level"],
+            "recommendations": recommendations,
+            "tags": ",".join(tags) if tags else None,
+            "content_hash": content_hash(note),
+            "ai_pipeline_version": None if provisional else self.pipeline_version,
+        }
+        result = {
+            "success": True,
+            "summary": summary_result["summary"],
+            "risk_level": risk_result["risk_level"],
+            "recommendations": recommendations,
+            "tags": tags,
+            "nurse_recommendations": nurse_recommendations,
+            "provisional": provisional
+        }
+        return values, result
+    
+    def _write_results(self, db: Session, updates: Dict[int, Dict]):
+        """Save AI column values for many notes in a single UPDATE ... WHERE id IN (...)"""
+        columns = next(iter(updates.values())).keys()
+        db.query(Note).filter(Note.id.in_(list(updates))).update(
+            {
+                **{
+                    getattr(Note, column): case(
+                        {note_id: values[column] for note_id, values in updates.items()},
+                        value=Note.id
+                    )
+                    for column in columns
+                },
+                Note.ai_processed_at: func.now(),
+            },
+            synchronize_session=False
+        )
+    
+    def _stored_result(self, note: Note) -> Dict:
+        """Result built from AI fields already saved on an up-to-date note"""
+        return {
+            "success": True,
+            "summary": note.summary,
+            "risk_level": note.risk_level,
+            "recommendations": note.recommendations,
+            "tags": note.tags.split(",") if note.tags else [],
+            "nurse_recommendations": {},
+            "provisional": False,
+            "skipped": True
+        }
+    
+    def _failed_result(self, error: Exception) -> Dict:
+        """Result returned when note processing fails"""
+        return {
+            "success": False,
+            "error": str(error),
+            "summary": None,
+            "risk_level": "UNKNOWN",
+            "recommendations": None,
+            "tags": [],
+            "nurse_recommendations": {}
+        }
     
     def _build_patient_context(self, patient: Patient, db: Session) -> str:
         """Build comprehensive patient context"""
@@ -98,13 +300,36 @@ class SummarizationAgent:
         
         return "\n".join(context_parts)
     
-    def _get_patient_history(self, patient_id: int, db: Session) -> List[str]:
+    def get_patient_history(self, patient_id: int, db: Session) -> List[str]:
         """Get recent patient history for context"""
         recent_notes = db.query(Note).filter(
             Note.patient_id == patient_id
-        ).order_by(Note.created_at.desc()).limit(5).all()
+        ).order_by(Note.created_at.desc()).limit(HISTORY_NOTES).all()
+        
+        return [f"{note.title}: {note.content[:HISTORY_CHARS]}..." for note in recent_notes]
+    
+    def _get_patient_histories(self, patient_ids: set, db: Session) -> Dict[int, List[str]]:
+        """Recent history of several patients in one query (same entries as get_patient_history)"""
+        if not patient_ids:
+            return {}
+        position = func.row_number().over(
+            partition_by=Note.patient_id,
+            order_by=Note.created_at.desc()
+        ).label("position")
+        recent = db.query(
+            Note.patient_id,
+            Note.title,
+            func.substr(Note.content, 1, HISTORY_CHARS).label("excerpt"),
+            position
+        ).filter(Note.patient_id.in_(list(patient_ids))).subquery()
+        rows = db.query(recent).filter(recent.c.position <= HISTORY_NOTES).order_by(
+            recent.c.patient_id, recent.c.position
+        ).all()
         
-        return [f"{note.title}: {note.content[:200]}..." for note in recent_notes]
+        histories: Dict[int, List[str]] = {}
+        for row in rows:
+            histories.setdefault(row.patient_id, []).append(f"{row.title}: {row.excerpt}...")
+        return histories
     
     def _extract_tags(self, summary_result: Dict, risk_result: Dict) -> List[str]:
         """Extract relevant tags from AI analysis"""
@@ -112,11 +337,8 @@ class SummarizationAgent:
         
         # Extract from summary
         if summary_result.get("key_findings"):
-            # Simple keyword extraction (in production, use more sophisticated NLP)
-            keywords = ["hypertension", "diabetes", "infection", "pain", "fever", "cough", "shortness of breath"]
-            for keyword in keywords:
-                if keyword.lower() in summary_result["key_findings"].lower():
-                    tags.append(keyword.title())
+            for concept in get_lexicon().concepts(summary_result["key_findings"], "tag"):
+                tags.append(concept.title())
         
         # Add risk level as tag
         if risk_result.get("risk_level"):
@@ -73,3 +73,11 @@ async def get_current_active_user(current_user: User = Depends(get_current_user)
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
+
+def require_roles(*roles: str):
+    """Dependency: the active user, if their role is one of roles"""
+    async def check_role(current_user: User = Depends(get_current_active_user)):
+        if current_user.role not in roles:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient permissions")
+        return current_user
+    return check_role
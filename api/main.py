@@ -1,16 +1,23 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
-from api.db.database import engine, Base
+from api.db.database import engine, Base, SessionLocal
 from api.routes import auth, patients, notes, ai, appointments
+from api.services.note_events import register_note_events
 
 # Create database tables
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Create tables
     Base.metadata.create_all(bind=engine)
+    # Queue AI processing after notes are created, edited or finalized
+    register_note_events(SessionLocal)
     yield
+    # Close the AI agents' provider connections
+    from api.agents.pool import get_agent_pool
+    get_agent_pool().close()
 
 app = FastAPI(
     title="Secure Medical Notes API",
@@ -42,3 +49,10 @@ def healthcheck():
 @app.get("/health")
 def health():
     return {"status": "healthy", "version": "1.0.0"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Celery queue and task metrics in Prometheus text format"""
+    from api.services.task_metrics import render_prometheus
+    from api.tasks.celery_app import QUEUE_CONCURRENCY
+    return PlainTextResponse(render_prometheus(QUEUE_CONCURRENCY), media_type="text/plain; version=0.0.4")
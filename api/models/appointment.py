@@ -1,12 +1,17 @@
 from datetime import datetime
 from sqlalchemy import (
+    DDL,
     Column,
     Integer,
     String,
     Text,
     DateTime,
     ForeignKey,
+    Index,
+    event,
+    text,
 )
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -23,6 +28,7 @@ class Appointment(Base):
     appointment_type = Column(String(50), nullable=False)
     status = Column(String(50), default="confirmed")
     location = Column(String(255), nullable=False)
+    clinician_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # Clinician seeing the patient
     notes = Column(Text, nullable=True)
     start_time = Column(DateTime(timezone=True), nullable=False)
     end_time = Column(DateTime(timezone=True), nullable=False)
@@ -31,4 +37,36 @@ class Appointment(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     patient = relationship("Patient", backref="appointments")
-    creator = relationship("User")
+    creator = relationship("User", foreign_keys=[created_by])
+    clinician = relationship("User", foreign_keys=[clinician_id])
+
+    # Overlap checks and availability sweeps (see api/services/scheduling.py).
+    # Postgres rejects double bookings itself with exclusion constraints on the
+    # booked time range; elsewhere (resource, start_time) indexes bound the
+    # overlap query, since no appointment is longer than APPOINTMENT_MAX_HOURS.
+    __table_args__ = (
+        Index("ix_appointments_location_start", location, start_time, end_time),
+        Index("ix_appointments_clinician_start", clinician_id, start_time, end_time),
+        ExcludeConstraint(
+            (location, "="),
+            (func.tstzrange(start_time, end_time, "[)"), "&&"),
+            name="ex_appointments_location_overlap",
+            using="gist",
+            where=text("status <> 'cancelled'"),
+        ).ddl_if(dialect="postgresql"),
+        ExcludeConstraint(
+            (clinician_id, "="),
+            (func.tstzrange(start_time, end_time, "[)"), "&&"),
+            name="ex_appointments_clinician_overlap",
+            using="gist",
+            where=text("status <> 'cancelled'"),
+        ).ddl_if(dialect="postgresql"),
+    )
+
+
+# Equality on plain columns inside a GiST exclusion constraint needs btree_gist
+event.listen(
+    Appointment.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS btree_gist").execute_if(dialect="postgresql"),
+)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from api.db.database import Base
@@ -36,3 +36,23 @@ class Note(Base):
     risk_level = Column(String, nullable=True)  # Low, Medium, High
     recommendations = Column(Text, nullable=True)
     tags = Column(Text, nullable=True)  # JSON string of tags
+    
+    # AI freshness: hash of the content the AI fields were produced from and
+    # the pipeline version that produced them (see api/services/ai_pipeline.py)
+    content_hash = Column(String(64), nullable=True)
+    ai_pipeline_version = Column(String, nullable=True, index=True)
+    ai_processed_at = Column(DateTime(timezone=True), nullable=True)
+    
+    __table_args__ = (
+        # Per-patient history and risk trend range scans
+        Index("ix_notes_patient_created", patient_id, created_at),
+        # Backs the high-risk patient ranking: latest HIGH/CRITICAL note per patient
+        Index(
+            "ix_notes_high_risk_patient_recent",
+            patient_id, created_at.desc(), id.desc(),
+            postgresql_where=risk_level.in_(["HIGH", "CRITICAL"]),
+            sqlite_where=risk_level.in_(["HIGH", "CRITICAL"]),
+        ),
+        # Keyset scans of notes changed since the vector store's high-water mark
+        Index("ix_notes_changed_id", func.coalesce(updated_at, created_at), id),
+    )
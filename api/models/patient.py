@@ -22,3 +22,7 @@ class Patient(Base):
     
     # Relationships
     notes = relationship("Note", back_populates="patient")
+    risk_state = relationship("PatientRiskState", back_populates="patient", uselist=False)
+
+# Register the risk state mapper wherever Patient is used
+from api.models.risk_state import PatientRiskState  # noqa: E402,F401
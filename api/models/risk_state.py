@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, Text, Float, DateTime, ForeignKey, Index
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+from api.db.database import Base
+
+class PatientRiskState(Base):
+    """Current risk of a patient, maintained by the AI pipeline (see api/services/risk_state.py)"""
+    __tablename__ = "patient_risk_state"
+
+    patient_id = Column(Integer, ForeignKey("patients.id"), primary_key=True)
+    risk_level = Column(String, nullable=False, index=True)  # LOW, MEDIUM, HIGH, CRITICAL
+    risk_score = Column(Float, nullable=False)  # 0-100, recency-weighted over recent notes
+    previous_risk_score = Column(Float, nullable=True)  # Score of the assessment before this one
+    trend = Column(String, nullable=True)  # increasing, decreasing, stable (risk_score vs previous_risk_score)
+    contributing_note_ids = Column(Text, nullable=True)  # JSON list of note ids
+    last_assessed_at = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    # Relationships
+    patient = relationship("Patient", back_populates="risk_state")
+
+    __table_args__ = (
+        # Census views: highest risk first
+        Index("ix_patient_risk_state_score", risk_score.desc(), last_assessed_at.desc()),
+    )
@@ -0,0 +1,44 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+from api.db.database import Base
+
+class RiskSweep(Base):
+    """One population-wide risk assessment run (see api/services/risk_sweep.py)"""
+    __tablename__ = "risk_sweeps"
+
+    id = Column(Integer, primary_key=True, index=True)
+    status = Column(String, nullable=False, default="running", index=True)  # running, completed, failed
+    activity_since = Column(DateTime(timezone=True), nullable=False)  # Patients with notes written after this
+    cursor_patient_id = Column(Integer, nullable=False, default=0)  # Every patient up to this id has been handled
+    total_patients = Column(Integer, nullable=False, default=0)
+    assessed_patients = Column(Integer, nullable=False, default=0)
+    failed_patients = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime(timezone=True), server_default=func.now())
+    heartbeat_at = Column(DateTime(timezone=True), server_default=func.now())  # Last chunk queued or finished
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Relationships
+    results = relationship("RiskSweepResult", back_populates="sweep")
+
+class RiskSweepResult(Base):
+    """Risk report produced for one patient by a sweep"""
+    __tablename__ = "risk_sweep_results"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sweep_id = Column(Integer, ForeignKey("risk_sweeps.id"), nullable=False)
+    patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False, index=True)
+    status = Column(String, nullable=False)  # completed, failed
+    risk_level = Column(String, nullable=True)  # Overall level from the report
+    report = Column(Text, nullable=True)  # JSON risk report
+    error = Column(Text, nullable=True)
+    assessed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Relationships
+    sweep = relationship("RiskSweep", back_populates="results")
+
+    __table_args__ = (
+        # A resumed sweep never assesses the same patient twice
+        UniqueConstraint("sweep_id", "patient_id", name="uq_risk_sweep_results_patient"),
+        Index("ix_risk_sweep_results_sweep_level", "sweep_id", "risk_level"),
+    )
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from api.db.database import Base
+
+class TaskOutput(Base):
+    """Full output of a background task, referenced from its compact result (see api/services/task_results.py)"""
+    __tablename__ = "task_outputs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    task_id = Column(String, nullable=False, unique=True, index=True)
+    task_name = Column(String, nullable=False)
+    kind = Column(String, nullable=False)  # risk_report, note_batch
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # Who requested the task
+    patient_id = Column(Integer, ForeignKey("patients.id"), nullable=True, index=True)
+    payload = Column(Text, nullable=False)  # JSON
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)  # Purged after this
@@ -1,29 +1,61 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional
 import asyncio
+import json
+import time
 
-from api.db.database import get_db
-from api.models.user import User
+from api.db.database import get_db, SessionLocal
+from api.models.user import User, UserRole
 from api.models.patient import Patient
 from api.models.note import Note
-from api.deps import get_current_active_user
-from api.agents.summarization_agent import SummarizationAgent
-from api.agents.risk_agent import RiskAssessmentAgent
+from api.models.audit import AuditLog, AuditAction
+from api.deps import get_current_active_user, require_roles
+from api.agents.pool import get_agent_pool
+from api.services.llm_scheduler import (
+    Priority,
+    llm_request_context,
+    iterate_in_llm_context,
+    all_scheduler_metrics,
+)
+from api.services.circuit_breaker import all_breaker_status
+from api.services.ai_pipeline import notes_needing_ai
+from api.services.task_events import TERMINAL_STATES, subscribe_task_events, close_subscription
+from api.services.report_cache import get_report_cache, patient_data_version
+from api.services import risk_sweep
+from api.services.task_results import expand_result, result_backend_metrics, grant_task_access, can_read_task
+from api.models.risk_sweep import RiskSweep
+from api.services.risk_trends import risk_trend_series, TREND_WINDOWS, DEFAULT_WINDOW, DEFAULT_PERIODS
 
 router = APIRouter(prefix="/ai", tags=["ai"])
 
-# Initialize agents
-summarization_agent = SummarizationAgent()
-risk_agent = RiskAssessmentAgent()
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # Stop nginx from buffering the stream
+}
+
+# Routes that call the model, Redis, the broker or the agent pool (which may
+# build the service or load the vector index) are plain `def`: FastAPI runs
+# them in its threadpool, so a throttled LLM request (held back by priority
+# and per-user share) or a slow Redis or broker does not block the event loop.
+
+# Task event streams: comment line to keep idle proxies open, and an upper bound on stream length
+TASK_STREAM_KEEPALIVE_SECONDS = 15
+TASK_STREAM_MAX_SECONDS = 3600
+
+def _sse_event(event: str, data: Any) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
 
 @router.post("/summarize/{note_id}")
-async def summarize_note(
+def summarize_note(
     note_id: int,
+    force: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Generate AI summary for a specific note"""
+    """Generate AI summary for a specific note (skipped if unchanged unless force=true)"""
     try:
         # Get note and patient
         note = db.query(Note).filter(Note.id == note_id).first()
@@ -35,15 +67,18 @@ async def summarize_note(
             raise HTTPException(status_code=404, detail="Patient not found")
         
         # Process note with AI
-        result = summarization_agent.process_note(note, patient, db)
+        with llm_request_context(Priority.INTERACTIVE, current_user.id):
+            result = get_agent_pool().summarization_agent().process_note(note, patient, db, force=force)
         
         if result["success"]:
             return {
-                "message": "Note summarized successfully",
+                "message": "Note already up to date" if result.get("skipped") else "Note summarized successfully",
                 "summary": result["summary"],
                 "risk_level": result["risk_level"],
                 "recommendations": result["recommendations"],
-                "tags": result["tags"]
+                "tags": result["tags"],
+                "provisional": result["provisional"],
+                "skipped": result.get("skipped", False)
             }
         else:
             raise HTTPException(status_code=500, detail=f"AI processing failed: {result['error']}")
@@ -51,24 +86,177 @@ async def summarize_note(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing note: {str(e)}")
 
+@router.post("/summarize/{note_id}/stream")
+async def stream_note_summary(
+    note_id: int,
+    force: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Stream an AI summary for a note over server-sent events.
+    Emits `token` and `field` events while the model is generating and a final
+    `result` event once the summary, risk level and recommendations are saved.
+    """
+    note = db.query(Note).filter(Note.id == note_id).first()
+    if not note:
+        raise HTTPException(status_code=404, detail="Note not found")
+    user_id = current_user.id
+    
+    def event_stream() -> Iterator[str]:
+        # The request session is closed once the response starts, so the
+        # stream uses its own session for the whole generation.
+        stream_db = SessionLocal()
+        try:
+            stream_note = stream_db.query(Note).filter(Note.id == note_id).first()
+            patient = stream_db.query(Patient).filter(Patient.id == stream_note.patient_id).first()
+            if not patient:
+                yield _sse_event("error", {"detail": "Patient not found"})
+                return
+            
+            events = get_agent_pool().summarization_agent().stream_note(stream_note, patient, stream_db, force=force)
+            for event in iterate_in_llm_context(events, Priority.INTERACTIVE, user_id):
+                if event["event"] == "result" and not event["data"]["success"]:
+                    yield _sse_event("error", {"detail": f"AI processing failed: {event['data']['error']}"})
+                else:
+                    yield _sse_event(event["event"], event["data"])
+        finally:
+            stream_db.close()
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@router.post("/summarize/{note_id}/async")
+def queue_note_summary(
+    note_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Queue AI processing of a note as a background task (follow it at
+    /ai/tasks/{task_id}). Repeat submissions for unchanged content attach to
+    the task already running or reuse the one that recently finished.
+    """
+    from api.services.task_dedup import submit_note_ai
+    
+    note = db.query(Note).filter(Note.id == note_id).first()
+    if not note:
+        raise HTTPException(status_code=404, detail="Note not found")
+    try:
+        task_id, submission = submit_note_ai(note, current_user.id, get_agent_pool().summarization_agent().pipeline_version)
+        grant_task_access(task_id, current_user.id)
+        return {"task_id": task_id, "note_id": note_id, "submission": submission}
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error queueing note processing: {str(e)}")
+
+def _check_trend_window(trend_window: str):
+    if trend_window not in TREND_WINDOWS:
+        raise HTTPException(status_code=400, detail=f"trend_window must be one of: {', '.join(TREND_WINDOWS)}")
+
 @router.get("/risk-report/{patient_id}")
-async def get_patient_risk_report(
+def get_patient_risk_report(
     patient_id: int,
+    trend_window: str = DEFAULT_WINDOW,
+    trend_periods: int = DEFAULT_PERIODS,
+    refresh: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Get comprehensive risk report for a patient"""
+    """
+    Get comprehensive risk report for a patient.
+    Served from the report cache while the patient's notes and record are
+    unchanged; a stale report is returned while it is rebuilt in the
+    background (see `cache.status`). refresh=true forces a rebuild.
+    """
+    _check_trend_window(trend_window)
     try:
-        risk_report = risk_agent.generate_patient_risk_report(patient_id, db)
+        with llm_request_context(Priority.INTERACTIVE, current_user.id):
+            risk_report, cache = get_agent_pool().risk_agent().get_cached_risk_report(
+                patient_id, db, trend_window, trend_periods, refresh=refresh
+            )
         
         if "error" in risk_report:
             raise HTTPException(status_code=404, detail=risk_report["error"])
         
-        return risk_report
+        return {**risk_report, "cache": cache}
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating risk report: {str(e)}")
 
+@router.get("/risk-report/{patient_id}/stream")
+async def stream_patient_risk_report(
+    patient_id: int,
+    trend_window: str = DEFAULT_WINDOW,
+    trend_periods: int = DEFAULT_PERIODS,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Stream a patient risk report over server-sent events.
+    Emits `token` and `field` events while the model is generating and a final
+    `report` event with the complete report, which is recorded in the audit log.
+    """
+    _check_trend_window(trend_window)
+    patient = db.query(Patient).filter(Patient.id == patient_id).first()
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    user_id = current_user.id
+    
+    def event_stream() -> Iterator[str]:
+        stream_db = SessionLocal()
+        try:
+            # An up-to-date cached report is sent as the only event; otherwise
+            # the streamed report is cached under the data version it was built from
+            cache = get_report_cache()
+            variant = f"{trend_window}:{trend_periods}"
+            cached = cache.lookup_fresh(stream_db, patient_id, variant)
+            if cached is not None:
+                events = iter([{"event": "report", "data": cached}])
+            else:
+                version = patient_data_version(stream_db, patient_id)
+                events = get_agent_pool().risk_agent().stream_patient_risk_report(patient_id, stream_db, trend_window, trend_periods)
+            for event in iterate_in_llm_context(events, Priority.INTERACTIVE, user_id):
+                if event["event"] == "report":
+                    report = event["data"]
+                    if "error" in report:
+                        yield _sse_event("error", {"detail": report["error"]})
+                        return
+                    if cached is None:
+                        cache.store(patient_id, variant, version, report)
+                    stream_db.add(AuditLog(
+                        user_id=user_id,
+                        action=AuditAction.READ,
+                        resource_type="patient",
+                        resource_id=str(patient_id),
+                        details=f"Risk report generated for patient (risk level: {report['risk_level']})",
+                        ip_address="system"
+                    ))
+                    stream_db.commit()
+                yield _sse_event(event["event"], event["data"])
+        finally:
+            stream_db.close()
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@router.get("/risk-trends/{patient_id}")
+async def get_patient_risk_trends(
+    patient_id: int,
+    window: str = DEFAULT_WINDOW,
+    periods: int = DEFAULT_PERIODS,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Risk level counts per day, week or month for a patient, without an AI assessment"""
+    _check_trend_window(window)
+    patient = db.query(Patient).filter(Patient.id == patient_id).first()
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    return {
+        "patient_id": patient_id,
+        "window": window,
+        "periods": risk_trend_series(db, patient_id, window, periods)
+    }
+
 @router.get("/high-risk-patients")
 async def get_high_risk_patients(
     limit: int = 10,
@@ -77,7 +265,7 @@ async def get_high_risk_patients(
 ):
     """Get list of high-risk patients"""
     try:
-        high_risk_patients = risk_agent.get_high_risk_patients(db, limit)
+        high_risk_patients = get_agent_pool().risk_agent().get_high_risk_patients(db, limit)
         return {
             "high_risk_patients": high_risk_patients,
             "count": len(high_risk_patients)
@@ -87,7 +275,7 @@ async def get_high_risk_patients(
         raise HTTPException(status_code=500, detail=f"Error fetching high-risk patients: {str(e)}")
 
 @router.post("/batch-summarize")
-async def batch_summarize_notes(
+def batch_summarize_notes(
     request_data: Dict[str, List[int]],
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
@@ -95,43 +283,254 @@ async def batch_summarize_notes(
     """Batch process multiple notes for AI summarization"""
     try:
         note_ids = request_data.get("note_ids", [])
-        results = []
+        with llm_request_context(Priority.BATCH, current_user.id):
+            processed = get_agent_pool().summarization_agent().process_notes(note_ids, db)
         
+        results = []
         for note_id in note_ids:
-            note = db.query(Note).filter(Note.id == note_id).first()
-            if note:
-                patient = db.query(Patient).filter(Patient.id == note.patient_id).first()
-                if patient:
-                    result = summarization_agent.process_note(note, patient, db)
-                    results.append({
-                        "note_id": note_id,
-                        "success": result["success"],
-                        "summary": result.get("summary"),
-                        "risk_level": result.get("risk_level"),
-                        "error": result.get("error")
-                    })
+            result = processed.get(note_id)
+            if result:
+                results.append({
+                    "note_id": note_id,
+                    "success": result["success"],
+                    "summary": result.get("summary"),
+                    "risk_level": result.get("risk_level"),
+                    "skipped": result.get("skipped", False),
+                    "error": result.get("error")
+                })
         
         return {
             "message": f"Processed {len(results)} notes",
+            "skipped": sum(1 for r in results if r["skipped"]),
             "results": results
         }
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error in batch processing: {str(e)}")
 
+@router.get("/batches/{batch_id}")
+def get_batch_progress(
+    batch_id: str,
+    include_notes: bool = True,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Per-note progress of a queued batch_process_notes job"""
+    from api.services.batch_progress import batch_progress
+    _check_task_access(batch_id, current_user)
+    try:
+        progress = batch_progress(batch_id, include_notes=include_notes)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching batch progress: {str(e)}")
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Batch not found or expired")
+    return progress
+
+def _check_task_access(task_id: str, user: User):
+    """403 unless the user may read the task (results hold note summaries and risk reports)"""
+    db = SessionLocal()
+    try:
+        allowed = can_read_task(db, task_id, user)
+    finally:
+        db.close()
+    if not allowed:
+        raise HTTPException(status_code=403, detail="Insufficient permissions")
+
+def _task_status(task_id: str, include_notes: bool = True) -> Dict[str, Any]:
+    """Result-backend state of a task, plus batch progress when the task is a fanned-out batch"""
+    from celery.result import AsyncResult
+    from api.tasks.celery_app import celery_app
+    from api.services.batch_progress import batch_progress
+    
+    result = AsyncResult(task_id, app=celery_app)
+    status = {"task_id": task_id, "state": result.state}
+    if result.state == "SUCCESS":
+        # Large outputs are kept in the database; the result only references them
+        db = SessionLocal()
+        try:
+            status["result"] = expand_result(db, result.result)
+        finally:
+            db.close()
+    elif result.state in ("FAILURE", "RETRY", "REVOKED"):
+        status["error"] = str(result.info)
+    elif isinstance(result.info, dict):
+        status["progress"] = result.info
+    
+    # The batch task itself returns once its chunks are queued; the batch runs on
+    batch = batch_progress(task_id, include_notes=include_notes)
+    if batch is not None:
+        status["batch"] = batch
+        if batch["status"] == "running":
+            status["state"] = "PROGRESS"
+    return status
+
+@router.get("/tasks/{task_id}")
+async def get_task_status(
+    task_id: str,
+    include_notes: bool = True,
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Status, progress and result of a background AI task (batch, risk report,
+    sweep, ...) queued by this user. Unknown or expired ids report PENDING,
+    as in Celery, to admins.
+    """
+    await asyncio.to_thread(_check_task_access, task_id, current_user)
+    try:
+        return await asyncio.to_thread(_task_status, task_id, include_notes)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching task status: {str(e)}")
+
+@router.get("/tasks/{task_id}/events")
+async def stream_task_events(
+    task_id: str,
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Follow a background AI task over server-sent events.
+    Emits a `status` event with the current state, `progress` events as the
+    task (or each note of a batch) advances, and a final `result` event with
+    the task's status once it has finished.
+    """
+    await asyncio.to_thread(_check_task_access, task_id, current_user)
+    # Subscribe before taking the snapshot so no event falls in between
+    try:
+        pubsub = await subscribe_task_events(task_id)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Task events unavailable: {str(e)}")
+    
+    async def event_stream():
+        try:
+            status = await asyncio.to_thread(_task_status, task_id, False)
+            if status["state"] in TERMINAL_STATES:
+                yield _sse_event("result", status)
+                return
+            yield _sse_event("status", status)
+            
+            deadline = time.monotonic() + TASK_STREAM_MAX_SECONDS
+            last_sent = time.monotonic()
+            while time.monotonic() < deadline:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is None:
+                    if time.monotonic() - last_sent >= TASK_STREAM_KEEPALIVE_SECONDS:
+                        last_sent = time.monotonic()
+                        yield ": keepalive\n\n"
+                    continue
+                
+                event = json.loads(message["data"])
+                last_sent = time.monotonic()
+                if event["state"] not in TERMINAL_STATES:
+                    yield _sse_event("progress", event)
+                    continue
+                # A finished batch task only means its chunks are queued; keep following the batch
+                status = await asyncio.to_thread(_task_status, task_id, False)
+                if status["state"] in TERMINAL_STATES:
+                    yield _sse_event("result", status)
+                    return
+                yield _sse_event("progress", event)
+        finally:
+            await close_subscription(pubsub)
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@router.get("/backlog")
+def get_ai_backlog(
+    patient_id: Optional[int] = None,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Notes whose AI summary, risk level and recommendations are missing or out of date"""
+    try:
+        version = get_agent_pool().summarization_agent().pipeline_version
+        notes = notes_needing_ai(db, version, patient_id=patient_id, limit=limit)
+        return {
+            "pipeline_version": version,
+            "count": len(notes),
+            "notes": [
+                {
+                    "note_id": note.id,
+                    "patient_id": note.patient_id,
+                    "title": note.title,
+                    "ai_pipeline_version": note.ai_pipeline_version,
+                    "ai_processed_at": note.ai_processed_at,
+                    "updated_at": note.updated_at
+                }
+                for note in notes
+            ]
+        }
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching AI backlog: {str(e)}")
+
+@router.get("/risk-sweep")
+async def get_risk_sweep(
+    sweep_id: Optional[int] = None,
+    risk_level: Optional[str] = None,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Progress and per-patient results (highest risk first) of the latest or a given population risk sweep"""
+    try:
+        sweep = db.get(RiskSweep, sweep_id) if sweep_id else risk_sweep.latest_sweep(db)
+        if sweep is None:
+            raise HTTPException(status_code=404, detail="Risk sweep not found")
+        
+        results = risk_sweep.sweep_results(db, sweep.id, risk_level=risk_level, limit=limit)
+        return {
+            "sweep": risk_sweep.sweep_summary(sweep),
+            "count": len(results),
+            "results": results
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching risk sweep: {str(e)}")
+
+@router.post("/risk-sweep")
+def start_risk_sweep(
+    current_user: User = Depends(require_roles(UserRole.ADMIN, UserRole.DOCTOR))
+):
+    """
+    Start a population risk sweep now, or resume the running one if it stalled.
+    Admins and doctors only: it assesses every active patient with the LLM.
+    """
+    try:
+        from api.tasks.ai_tasks import run_risk_sweep
+        task = run_risk_sweep.delay(force=True)
+        grant_task_access(task.id, current_user.id)
+        return {"message": "Risk sweep queued", "task_id": task.id}
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error queueing risk sweep: {str(e)}")
+
+def _result_backend_status() -> Dict[str, Any]:
+    try:
+        return result_backend_metrics()
+    except Exception as e:
+        return {"error": str(e)}
+
 @router.get("/ai-status")
-async def get_ai_status():
+def get_ai_status():
     """Check AI service status and configuration"""
     try:
-        # Test AI service availability
-        from api.services.ai_service import MedicalAIService
-        ai_service = MedicalAIService()
+        # The service the routes' agents share; building one per call would leak its HTTP clients
+        pool = get_agent_pool()
+        ai_service = pool.ai_service()
         
         return {
             "status": "operational" if ai_service.enabled else "disabled",
+            "backend": ai_service.backend,
+            "model": ai_service.model_name,
             "openai_configured": bool(ai_service.enabled and hasattr(ai_service, 'openai_api_key') and ai_service.openai_api_key),
             "models_available": ai_service.enabled,
-            "vector_store_ready": ai_service.enabled and ai_service.vectorstore is not None
+            "vector_store_ready": ai_service.enabled and ai_service.vectorstore is not None,
+            "agents": pool.status(),
+            "scheduler": all_scheduler_metrics(),
+            "risk_report_cache": get_report_cache().metrics(),
+            "circuit_breakers": all_breaker_status(),
+            "result_backend": _result_backend_status()
         }
     
     except Exception as e:
@@ -1,7 +1,9 @@
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 from typing import List, Optional
+from zoneinfo import ZoneInfoNotFoundError
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from api.db.database import get_db
@@ -12,7 +14,9 @@ from api.schemas.appointment import (
     AppointmentCreate,
     AppointmentResponse,
     AppointmentUpdate,
+    AvailabilityResponse,
 )
+from api.services import scheduling
 
 router = APIRouter(prefix="/appointments", tags=["appointments"])
 
@@ -23,19 +27,51 @@ def create_appointment(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
 ):
-    if appointment.end_time <= appointment.start_time:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="End time must be after start time.",
-        )
-
     db_appointment = Appointment(**appointment.dict(), created_by=current_user.id)
+    _book(db, db_appointment)
     db.add(db_appointment)
-    db.commit()
+    _commit_booking(db)
     db.refresh(db_appointment)
     return db_appointment
 
 
+@router.get("/availability", response_model=AvailabilityResponse)
+def get_availability(
+    start: datetime,
+    end: datetime,
+    clinician_id: List[int] = Query([]),
+    location: List[str] = Query([]),
+    duration_minutes: int = Query(30, ge=5, le=24 * 60),
+    open_time: Optional[time] = None,
+    close_time: Optional[time] = None,
+    tz: str = "UTC",
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Free slots of at least duration_minutes between start and end for each
+    requested clinician (?clinician_id=) and location (?location=), plus the
+    slots in which all of them are free. open_time/close_time limit slots to
+    those hours of each day in timezone tz.
+    """
+    if not clinician_id and not location:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Give at least one clinician_id or location.")
+    if end <= start:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="End must be after start.")
+    if scheduling.as_utc(end) - scheduling.as_utc(start) > timedelta(days=scheduling.MAX_AVAILABILITY_DAYS):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"The range cannot be longer than {scheduling.MAX_AVAILABILITY_DAYS} days.")
+    if (open_time is None) != (close_time is None):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Give both open_time and close_time, or neither.")
+    try:
+        return scheduling.availability(db, start, end, clinician_id, location, duration_minutes,
+                                       open_time, close_time, tz)
+    except ZoneInfoNotFoundError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown timezone: {tz}")
+
+
 @router.get("/", response_model=List[AppointmentResponse])
 def list_appointments(
     start: Optional[datetime] = None,
@@ -45,9 +81,9 @@ def list_appointments(
 ):
     query = db.query(Appointment)
     if start:
-        query = query.filter(Appointment.start_time >= start)
+        query = query.filter(Appointment.start_time >= scheduling.as_utc(start))
     if end:
-        query = query.filter(Appointment.start_time <= end)
+        query = query.filter(Appointment.start_time <= scheduling.as_utc(end))
 
     appointments = query.order_by(Appointment.start_time.asc()).all()
 
@@ -74,21 +110,17 @@ def update_appointment(
     if appointment.created_by != current_user.id and current_user.role != "admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient permissions")
 
-    if (
-        appointment_update.start_time
-        and appointment_update.end_time
-        and appointment_update.end_time <= appointment_update.start_time
-    ):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="End time must be after start time.",
-        )
-
     update_data = appointment_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(appointment, field, value)
 
-    db.commit()
+    # The updated times, location and clinician are checked together
+    try:
+        _book(db, appointment)
+    except HTTPException:
+        db.rollback()
+        raise
+    _commit_booking(db)
     db.refresh(appointment)
     return appointment
 
@@ -110,6 +142,51 @@ def delete_appointment(
     db.commit()
 
 
+def _book(db: Session, appointment: Appointment) -> None:
+    """400 for invalid times or an unknown clinician, 409 when the slot is taken"""
+    if appointment.clinician_id is not None:
+        with db.no_autoflush:
+            clinician = db.query(User.id).filter(User.id == appointment.clinician_id).first()
+        if not clinician:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Clinician not found")
+    try:
+        scheduling.prepare_booking(db, appointment)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except scheduling.AppointmentConflict as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={
+                "message": "The location or clinician is already booked at that time.",
+                "conflicts": [
+                    {
+                        "id": conflict.id,
+                        "title": conflict.title,
+                        "location": conflict.location,
+                        "clinician_id": conflict.clinician_id,
+                        "start_time": conflict.start_time.isoformat(),
+                        "end_time": conflict.end_time.isoformat(),
+                    }
+                    for conflict in e.conflicts
+                ],
+            },
+        )
+
+
+def _commit_booking(db: Session) -> None:
+    """Commit, turning a Postgres exclusion violation (a booking that raced ours) into a 409"""
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if getattr(e.orig, "pgcode", None) == "23P01":
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail={"message": "The location or clinician is already booked at that time.", "conflicts": []},
+            )
+        raise
+
+
 def _seed_sample_appointments(db: Session, user: User, start: Optional[datetime]) -> None:
     """Bootstrap the calendar with a few sample appointments when the table is empty."""
     reference = start or datetime.now()
@@ -1,15 +1,34 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.orm import Session, contains_eager
+from sqlalchemy import func
+from typing import List, Optional
 
 from api.db.database import get_db
 from api.schemas.patient import PatientCreate, PatientUpdate, PatientResponse
 from api.models.patient import Patient
+from api.models.risk_state import PatientRiskState
 from api.models.user import User
 from api.deps import get_current_active_user
 
 router = APIRouter(prefix="/patients", tags=["patients"])
 
+# sort_by values for the patient list; unassessed patients sort last on risk
+PATIENT_SORTS = {
+    "id": (Patient.id,),
+    "name": (Patient.last_name, Patient.first_name, Patient.id),
+    "risk": (
+        PatientRiskState.risk_score.is_(None),
+        PatientRiskState.risk_score.desc(),
+        PatientRiskState.last_assessed_at.desc(),
+        Patient.id
+    ),
+    "last_assessed": (
+        PatientRiskState.last_assessed_at.is_(None),
+        PatientRiskState.last_assessed_at.desc(),
+        Patient.id
+    ),
+}
+
 @router.post("/", response_model=PatientResponse)
 def create_patient(
     patient: PatientCreate,
@@ -36,12 +55,56 @@ def create_patient(
 def get_patients(
     skip: int = 0,
     limit: int = 100,
+    risk_level: Optional[str] = None,
+    min_risk_score: Optional[float] = None,
+    sort_by: str = "id",
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    patients = db.query(Patient).offset(skip).limit(limit).all()
+    """
+    List patients with their current risk state.
+    Filter with risk_level (comma-separated) and min_risk_score; sort_by is
+    one of id, name, risk or last_assessed.
+    """
+    if sort_by not in PATIENT_SORTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"sort_by must be one of: {', '.join(PATIENT_SORTS)}"
+        )
+    
+    query = db.query(Patient).outerjoin(Patient.risk_state).options(contains_eager(Patient.risk_state))
+    
+    if risk_level:
+        levels = [level.strip().upper() for level in risk_level.split(",") if level.strip()]
+        query = query.filter(PatientRiskState.risk_level.in_(levels))
+    if min_risk_score is not None:
+        query = query.filter(PatientRiskState.risk_score >= min_risk_score)
+    
+    patients = query.order_by(*PATIENT_SORTS[sort_by]).offset(skip).limit(limit).all()
     return patients
 
+@router.get("/risk-summary")
+def get_patient_risk_summary(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Patient counts by current risk level and trend"""
+    by_level = dict(
+        db.query(PatientRiskState.risk_level, func.count()).group_by(PatientRiskState.risk_level).all()
+    )
+    by_trend = dict(
+        db.query(PatientRiskState.trend, func.count())
+        .filter(PatientRiskState.trend.isnot(None))
+        .group_by(PatientRiskState.trend).all()
+    )
+    total = db.query(func.count(Patient.id)).scalar()
+    return {
+        "total_patients": total,
+        "assessed_patients": sum(by_level.values()),
+        "by_risk_level": by_level,
+        "by_trend": by_trend
+    }
+
 @router.get("/{patient_id}", response_model=PatientResponse)
 def get_patient(
     patient_id: int,
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -11,6 +11,7 @@ class AppointmentBase(BaseModel):
     appointment_type: str = Field(..., example="Consultation")
     status: str = Field("confirmed", example="confirmed")
     location: str = Field(..., example="Clinic 4A")
+    clinician_id: Optional[int] = Field(None, description="Clinician booked for the appointment")
     start_time: datetime
     end_time: datetime
     notes: Optional[str] = None
@@ -27,6 +28,7 @@ class AppointmentUpdate(BaseModel):
     appointment_type: Optional[str] = None
     status: Optional[str] = None
     location: Optional[str] = None
+    clinician_id: Optional[int] = None
     start_time: Optional[datetime] = None
     end_time: Optional[datetime] = None
     notes: Optional[str] = None
@@ -40,3 +42,23 @@ class AppointmentResponse(AppointmentBase):
 
     class Config:
         orm_mode = True
+
+
+class TimeSlot(BaseModel):
+    start: datetime
+    end: datetime
+
+
+class ResourceAvailability(BaseModel):
+    type: str = Field(..., example="clinician")  # clinician or location
+    id: str = Field(..., example="12")
+    free: List[TimeSlot]
+
+
+class AvailabilityResponse(BaseModel):
+    start: datetime
+    end: datetime
+    min_duration_minutes: int
+    bookings_scanned: int
+    resources: List[ResourceAvailability]
+    all_free: List[TimeSlot] = Field(..., description="Slots in which every requested resource is free")
@@ -25,6 +25,7 @@ class NoteResponse(NoteBase):
     risk_level: Optional[str] = None
     recommendations: Optional[str] = None
     tags: Optional[str] = None
+    ai_processed_at: Optional[datetime] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
     
@@ -1,5 +1,6 @@
-from pydantic import BaseModel
-from typing import Optional
+import json
+from pydantic import BaseModel, field_validator
+from typing import List, Optional
 from datetime import datetime, date
 
 class PatientBase(BaseModel):
@@ -22,10 +23,28 @@ class PatientUpdate(BaseModel):
     allergies: Optional[str] = None
     medical_history: Optional[str] = None
 
+class PatientRiskStateResponse(BaseModel):
+    risk_level: str
+    risk_score: float
+    previous_risk_score: Optional[float] = None
+    trend: Optional[str] = None
+    contributing_note_ids: List[int] = []
+    last_assessed_at: datetime
+    
+    @field_validator("contributing_note_ids", mode="before")
+    @classmethod
+    def parse_note_ids(cls, value):
+        # Stored as a JSON string
+        return json.loads(value) if isinstance(value, str) else (value or [])
+    
+    class Config:
+        from_attributes = True
+
 class PatientResponse(PatientBase):
     id: int
     created_at: datetime
     updated_at: Optional[datetime] = None
+    risk_state: Optional[PatientRiskStateResponse] = None
     
     class Config:
         from_attributes = True
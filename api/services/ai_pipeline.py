@@ -0,0 +1,66 @@
+"""
+AI processing freshness for notes
+A note's AI fields (summary, risk level, recommendations, tags) are current
+when they were produced from the note's present content by the present
+pipeline version. The pipeline version combines AI_PIPELINE_REVISION (bump it
+when prompts or post-processing change) with the model name, so switching
+models or prompts re-queues every note while unchanged notes are skipped.
+"""
+import os
+import hashlib
+from typing import List, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from api.models.note import Note
+
+AI_PIPELINE_REVISION = "1"
+
+
+def pipeline_version(model_name: Optional[str]) -> str:
+    """Version string stored on notes processed by this revision and model"""
+    revision = os.getenv("AI_PIPELINE_REVISION", AI_PIPELINE_REVISION)
+    return f"{revision}/{model_name or 'none'}"
+
+
+def content_hash(note: Note) -> str:
+    """SHA-256 of everything the note's AI output is derived from"""
+    note_type = note.note_type.value if hasattr(note.note_type, "value") else str(note.note_type)
+    digest = hashlib.sha256()
+    digest.update(note_type.encode())
+    digest.update(b"\0")
+    digest.update((note.content or "").encode())
+    return digest.hexdigest()
+
+
+def is_ai_current(note: Note, version: str) -> bool:
+    """The note's AI fields were produced from its current content by this pipeline version"""
+    return (
+        note.ai_processed_at is not None
+        and note.ai_pipeline_version == version
+        and note.content_hash == content_hash(note)
+    )
+
+
+def notes_needing_ai(db: Session, version: str, patient_id: Optional[int] = None,
+                     limit: Optional[int] = None) -> List[Note]:
+    """
+    Notes whose AI fields are missing, from another pipeline version, or older
+    than the note's last edit. Edits that leave the content unchanged (e.g. a
+    title change) are included here and skipped by the content hash check.
+    """
+    query = db.query(Note).filter(
+        or_(
+            Note.ai_processed_at.is_(None),
+            Note.ai_pipeline_version.is_(None),
+            Note.ai_pipeline_version != version,
+            Note.updated_at > Note.ai_processed_at,
+        )
+    )
+    if patient_id is not None:
+        query = query.filter(Note.patient_id == patient_id)
+    query = query.order_by(Note.created_at.desc(), Note.id.desc())
+    if limit:
+        query = query.limit(limit)
+    return query.all()
@@ -3,12 +3,14 @@ Enhanced AI Service for medical note processing using LangChain and OpenAI
 REAL AI implementation with GPT-4 and embeddings
 """
 import os
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 import json
 import re
 from datetime import datetime
+from itertools import chain
 
 try:
+    import httpx
     from langchain_openai import ChatOpenAI, OpenAIEmbeddings
     from langchain_core.prompts import PromptTemplate, ChatPromptTemplate
     from langchain_core.messages import HumanMessage, SystemMessage
@@ -20,6 +22,21 @@ except ImportError as e:
     AI_AVAILABLE = False
     print(f"⚠️ LangChain not available: {e}")
 
+from api.services.fake_llm import create_fake_backend, FAKE_MODEL_NAME
+from api.services.llm_scheduler import get_scheduler, estimate_tokens
+from api.services.clinical_lexicon import get_lexicon
+from api.services.entity_extractor import get_entity_extractor, ENTITY_FIELDS
+from api.services.circuit_breaker import (
+    get_breaker,
+    latency_budget,
+    call_with_budget,
+    CircuitOpenError,
+    OPEN,
+)
+
+# Matches a completed `"key": "value"` pair in a partially streamed JSON object
+PARTIAL_FIELD_PATTERN = re.compile(r'"(\w+)"\s*:\s*"((?:[^"\\]|\\.)*)"\s*[,}]')
+
 class MedicalAIService:
     """
     Enhanced Medical AI Service with real OpenAI integration
@@ -32,37 +49,68 @@ class MedicalAIService:
     """
     
     def __init__(self):
+        # "openai" (default) or "fake" for the deterministic offline backend
+        self.backend = os.getenv("AI_BACKEND", "openai").lower()
+        self.model_name = None
+        self.http_client = None
+        self.http_async_client = None
+        
         if not AI_AVAILABLE:
             self.enabled = False
             print("⚠️ AI Service disabled - missing dependencies")
             return
-            
-        self.openai_api_key = os.getenv("OPENAI_API_KEY")
-        if not self.openai_api_key:
-            self.enabled = False
-            print("⚠️ AI Service disabled - OPENAI_API_KEY not set")
-            return
         
-        self.enabled = True
+        self.openai_api_key = os.getenv("OPENAI_API_KEY")
         
-        # Initialize LLM models
-        self.llm = ChatOpenAI(
-            model="gpt-4o-mini",  # Using GPT-4o-mini for cost efficiency
-            temperature=0.1,  # Low temperature for medical accuracy
-            openai_api_key=self.openai_api_key
-        )
+        if self.backend == "fake":
+            self.llm, self.creative_llm, self.embeddings = create_fake_backend()
+            self.model_name = FAKE_MODEL_NAME
+        else:
+            if not self.openai_api_key:
+                self.enabled = False
+                print("⚠️ AI Service disabled - OPENAI_API_KEY not set")
+                return
+            
+            self.model_name = "gpt-4o-mini"  # Using GPT-4o-mini for cost efficiency
+            # Hard client timeout; callers stop waiting earlier via latency budgets
+            client_timeout = float(os.getenv("OPENAI_TIMEOUT_S", "60"))
+            # One keep-alive connection pool shared by both chat models and the embeddings
+            self.http_client = httpx.Client(timeout=client_timeout)
+            # Used by ainvoke; only ever awaited on the asyncio worker's event loop
+            self.http_async_client = httpx.AsyncClient(timeout=client_timeout)
+            
+            # Initialize LLM models
+            self.llm = ChatOpenAI(
+                model=self.model_name,
+                temperature=0.1,  # Low temperature for medical accuracy
+                openai_api_key=self.openai_api_key,
+                timeout=client_timeout,
+                http_client=self.http_client,
+                http_async_client=self.http_async_client
+            )
+            
+            self.creative_llm = ChatOpenAI(
+                model=self.model_name,
+                temperature=0.7,  # Higher temperature for recommendations
+                openai_api_key=self.openai_api_key,
+                timeout=client_timeout,
+                http_client=self.http_client,
+                http_async_client=self.http_async_client
+            )
+            
+            # Initialize embeddings for RAG
+            self.embeddings = OpenAIEmbeddings(
+                openai_api_key=self.openai_api_key,
+                model="text-embedding-3-small",
+                http_client=self.http_client,
+                http_async_client=self.http_async_client
+            )
         
-        self.creative_llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=0.7,  # Higher temperature for recommendations
-            openai_api_key=self.openai_api_key
-        )
+        self.enabled = True
         
-        # Initialize embeddings for RAG
-        self.embeddings = OpenAIEmbeddings(
-            openai_api_key=self.openai_api_key,
-            model="text-embedding-3-small"
-        )
+        # Shared per-process admission control and circuit breaker for this provider
+        self.scheduler = get_scheduler(self.backend)
+        self.breaker = get_breaker(self.backend)
         
         # Text splitter for document chunking
         self.text_splitter = RecursiveCharacterTextSplitter(
@@ -76,6 +124,17 @@ class MedicalAIService:
         
         print("✅ Enhanced AI Service initialized successfully!")
     
+    def close(self):
+        """Close the provider HTTP connection pool"""
+        if self.http_client is not None:
+            self.http_client.close()
+    
+    async def aclose(self):
+        """Close both provider connection pools (from the event loop the async one ran on)"""
+        self.close()
+        if self.http_async_client is not None:
+            await self.http_async_client.aclose()
+    
     def summarize_medical_note(self, note_content: str, note_type: str = "general", 
                                patient_history: Optional[List[str]] = None) -> Dict:
         """
@@ -85,15 +144,50 @@ class MedicalAIService:
             return self._get_mock_summary(note_content, note_type)
         
         try:
-            # Build context from patient history if available
-            history_context = ""
-            if patient_history and self.vectorstore:
-                # Use RAG to find relevant historical information
-                relevant_docs = self.vectorstore.similarity_search(note_content, k=3)
-                history_context = "\n".join([doc.page_content for doc in relevant_docs])
-            
-            # Create specialized prompt based on note type
-            system_prompt = """You are an expert medical AI assistant specializing in clinical documentation. 
+            messages = self._build_summary_messages(note_content, note_type, patient_history)
+            response = self._invoke(self.llm, messages, "summarize")
+            return self._parse_summary_response(response.content)
+                
+        except Exception as e:
+            print(f"Error in AI summarization: {str(e)}")
+            return self._get_mock_summary(note_content, note_type, fallback_reason=str(e))
+    
+    def stream_medical_note_summary(self, note_content: str, note_type: str = "general",
+                                    patient_history: Optional[List[str]] = None) -> Iterator[Dict]:
+        """
+        Stream a note summary as it is generated.
+        Yields {"event": "token"|"field"|"summary", "data": ...}; the last event
+        is always "summary" with the fully parsed result.
+        """
+        if not self.enabled:
+            yield {"event": "summary", "data": self._get_mock_summary(note_content, note_type)}
+            return
+        
+        try:
+            messages = self._build_summary_messages(note_content, note_type, patient_history)
+            content = ""
+            for event in self._stream_llm(self.llm, messages):
+                if event["event"] == "content":
+                    content = event["data"]
+                else:
+                    yield event
+            yield {"event": "summary", "data": self._parse_summary_response(content)}
+        except Exception as e:
+            print(f"Error in AI summarization stream: {str(e)}")
+            yield {"event": "summary", "data": self._get_mock_summary(note_content, note_type, fallback_reason=str(e))}
+    
+    def _build_summary_messages(self, note_content: str, note_type: str,
+                                patient_history: Optional[List[str]] = None) -> List:
+        """Build the chat messages for note summarization"""
+        # Build context from patient history if available
+        history_context = ""
+        if patient_history and self.vectorstore:
+            # Use RAG to find relevant historical information
+            relevant_docs = self.vectorstore.similarity_search(note_content, k=3)
+            history_context = "\n".join([doc.page_content for doc in relevant_docs])
+        
+        # Create specialized prompt based on note type
+        system_prompt = """You are an expert medical AI assistant specializing in clinical documentation. 
 Your task is to analyze medical notes and provide structured, accurate summaries that help healthcare providers quickly understand patient conditions and care plans.
 
 Guidelines:
@@ -103,12 +197,12 @@ Guidelines:
 - Maintain HIPAA compliance (no identifiable information)
 - Focus on actionable insights
 """
-            
-            history_section = ""
-            if history_context:
-                history_section = f"\nPATIENT HISTORY CONTEXT:\n{history_context}\n"
-            
-            summary_json_template = """{
+        
+        history_section = ""
+        if history_context:
+            history_section = f"\nPATIENT HISTORY CONTEXT:\n{history_context}\n"
+        
+        summary_json_template = """{
     "summary": "Brief 2-3 sentence overview",
     "key_findings": "Most important clinical findings",
     "chief_complaint": "Primary reason for visit",
@@ -120,51 +214,44 @@ Guidelines:
     "risk_factors": "Any identified risk factors",
     "urgent_flags": "Any urgent concerns requiring immediate attention"
 }"""
-            
-            user_prompt = (
-                f"Analyze this {note_type} medical note and provide a comprehensive structured summary:\n\n"
-                f"MEDICAL NOTE:\n{note_content}\n"
-                f"{history_section}"
-                "Provide your analysis in the following JSON format:\n"
-                f"{summary_json_template}\n"
-            )
-            
-            # Call GPT-4
-            messages = [
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=user_prompt)
-            ]
-            
-            response = self.llm.invoke(messages)
-            
-            # Parse JSON response
-            try:
-                # Extract JSON from response
-                content = response.content
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                if json_match:
-                    result = json.loads(json_match.group())
-                    result["ai_generated"] = True
-                    result["model"] = "gpt-4o-mini"
-                    result["timestamp"] = datetime.now().isoformat()
-                    return result
-                else:
-                    # Fallback if no JSON found
-                    return {
-                        "summary": content[:500],
-                        "ai_generated": True,
-                        "model": "gpt-4o-mini"
-                    }
-            except json.JSONDecodeError:
+        
+        user_prompt = (
+            f"Analyze this {note_type} medical note and provide a comprehensive structured summary:\n\n"
+            f"MEDICAL NOTE:\n{note_content}\n"
+            f"{history_section}"
+            "Provide your analysis in the following JSON format:\n"
+            f"{summary_json_template}\n"
+        )
+        
+        return [
+            SystemMessage(content=system_prompt),
+            HumanMessage(content=user_prompt)
+        ]
+    
+    def _parse_summary_response(self, content: str) -> Dict:
+        """Parse the LLM summary response into a result dict"""
+        try:
+            # Extract JSON from response
+            json_match = re.search(r'\{.*\}', content, re.DOTALL)
+            if json_match:
+                result = json.loads(json_match.group())
+                result["ai_generated"] = True
+                result["model"] = self.model_name
+                result["timestamp"] = datetime.now().isoformat()
+                return result
+            else:
+                # Fallback if no JSON found
                 return {
-                    "summary": response.content[:500],
+                    "summary": content[:500],
                     "ai_generated": True,
-                    "parsing_error": True
+                    "model": self.model_name
                 }
-                
-        except Exception as e:
-            print(f"Error in AI summarization: {str(e)}")
-            return self._get_mock_summary(note_content, note_type)
+        except json.JSONDecodeError:
+            return {
+                "summary": content[:500],
+                "ai_generated": True,
+                "parsing_error": True
+            }
     
     def assess_patient_risk(self, note_content: str, patient_history: List[str] = None, 
                            vital_signs: Dict = None) -> Dict:
@@ -174,19 +261,63 @@ Guidelines:
         if not self.enabled:
             return self._get_mock_risk_assessment(note_content)
         
+        if self.breaker.state == OPEN:
+            # Provider is down: answer from the local keyword assessment right away
+            return self._get_mock_risk_assessment(note_content, fallback_reason="circuit open")
+        
         try:
-            # Prepare comprehensive context
-            context_parts = [f"CURRENT NOTE:\n{note_content}"]
-            
-            if patient_history:
-                context_parts.append(f"\nPATIENT HISTORY:\n" + "\n".join(patient_history[-5:]))  # Last 5 notes
+            messages = self._build_risk_messages(note_content, patient_history, vital_signs)
+            response = self._invoke(self.llm, messages, "risk")
             
-            if vital_signs:
-                context_parts.append(f"\nVITAL SIGNS:\n{json.dumps(vital_signs, indent=2)}")
-            
-            full_context = "\n".join(context_parts)
+            result = self._parse_risk_response(response.content)
+            if result:
+                return result
+            return self._get_mock_risk_assessment(note_content)
             
-            system_prompt = """You are a clinical risk assessment AI with expertise in identifying patient risk factors and providing evidence-based recommendations.
+        except Exception as e:
+            print(f"Error in risk assessment: {str(e)}")
+            return self._get_mock_risk_assessment(note_content, fallback_reason=str(e))
+    
+    def stream_patient_risk(self, note_content: str, patient_history: List[str] = None,
+                            vital_signs: Dict = None) -> Iterator[Dict]:
+        """
+        Stream a risk assessment as it is generated.
+        Yields {"event": "token"|"field"|"assessment", "data": ...}; the last event
+        is always "assessment" with the fully parsed result.
+        """
+        if not self.enabled:
+            yield {"event": "assessment", "data": self._get_mock_risk_assessment(note_content)}
+            return
+        
+        try:
+            messages = self._build_risk_messages(note_content, patient_history, vital_signs)
+            content = ""
+            for event in self._stream_llm(self.llm, messages):
+                if event["event"] == "content":
+                    content = event["data"]
+                else:
+                    yield event
+            result = self._parse_risk_response(content) or self._get_mock_risk_assessment(note_content)
+            yield {"event": "assessment", "data": result}
+        except Exception as e:
+            print(f"Error in risk assessment stream: {str(e)}")
+            yield {"event": "assessment", "data": self._get_mock_risk_assessment(note_content, fallback_reason=str(e))}
+    
+    def _build_risk_messages(self, note_content: str, patient_history: List[str] = None,
+                             vital_signs: Dict = None) -> List:
+        """Build the chat messages for risk assessment"""
+        # Prepare comprehensive context
+        context_parts = [f"CURRENT NOTE:\n{note_content}"]
+        
+        if patient_history:
+            context_parts.append(f"\nPATIENT HISTORY:\n" + "\n".join(patient_history[-5:]))  # Last 5 notes
+        
+        if vital_signs:
+            context_parts.append(f"\nVITAL SIGNS:\n{json.dumps(vital_signs, indent=2)}")
+        
+        full_context = "\n".join(context_parts)
+        
+        system_prompt = """You are a clinical risk assessment AI with expertise in identifying patient risk factors and providing evidence-based recommendations.
 
 Your task is to:
 1. Assess overall patient risk level (LOW, MEDIUM, HIGH, CRITICAL)
@@ -201,8 +332,8 @@ Base your assessment on:
 - Patient history and comorbidities
 - Standard clinical guidelines
 """
-            
-            risk_json_template = """{
+        
+        risk_json_template = """{
     "risk_level": "LOW|MEDIUM|HIGH|CRITICAL",
     "confidence_score": 0-100,
     "summary": "Overall risk assessment summary",
@@ -214,38 +345,89 @@ Base your assessment on:
     "requires_urgent_attention": true/false,
     "estimated_severity": "mild|moderate|severe|life-threatening"
 }"""
-            
-            user_prompt = (
-                "Perform a comprehensive risk assessment:\n\n"
-                f"{full_context}\n\n"
-                "Provide your assessment in JSON format:\n"
-                f"{risk_json_template}\n"
-            )
-            
-            messages = [
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=user_prompt)
-            ]
-            
-            response = self.llm.invoke(messages)
-            
-            # Parse response
-            try:
-                content = response.content
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                if json_match:
-                    result = json.loads(json_match.group())
-                    result["ai_generated"] = True
-                    result["assessment_timestamp"] = datetime.now().isoformat()
-                    return result
-            except json.JSONDecodeError:
-                pass
-            
-            return self._get_mock_risk_assessment(note_content)
-            
+        
+        user_prompt = (
+            "Perform a comprehensive risk assessment:\n\n"
+            f"{full_context}\n\n"
+            "Provide your assessment in JSON format:\n"
+            f"{risk_json_template}\n"
+        )
+        
+        return [
+            SystemMessage(content=system_prompt),
+            HumanMessage(content=user_prompt)
+        ]
+    
+    def _parse_risk_response(self, content: str) -> Optional[Dict]:
+        """Parse the LLM risk response; returns None if no valid JSON was found"""
+        try:
+            json_match = re.search(r'\{.*\}', content, re.DOTALL)
+            if json_match:
+                result = json.loads(json_match.group())
+                result["ai_generated"] = True
+                result["assessment_timestamp"] = datetime.now().isoformat()
+                return result
+        except json.JSONDecodeError:
+            pass
+        return None
+    
+    def _invoke(self, llm, messages: List, operation: str):
+        """
+        Send a chat request through the rate-limited, prioritized scheduler,
+        guarded by the provider circuit breaker and the operation's latency budget
+        """
+        self._check_circuit()
+        budget = latency_budget(operation)
+        return self.scheduler.run(
+            lambda: self.breaker.call(lambda: llm.invoke(messages), budget),
+            messages
+        )
+    
+    def _check_circuit(self):
+        """Fail fast, before queueing, while the provider circuit is open"""
+        if self.breaker.state == OPEN:
+            raise CircuitOpenError(f"Circuit for {self.backend} is open")
+    
+    def _stream_llm(self, llm, messages: List) -> Iterator[Dict]:
+        """
+        Stream an LLM response, yielding "token" events for each chunk and a
+        "field" event whenever a top-level JSON string field is complete.
+        The final event is {"event": "content", "data": <full response text>}.
+        """
+        content = ""
+        emitted_fields = set()
+        self._check_circuit()
+        self.scheduler.acquire(estimate_tokens(messages))
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(f"Circuit for {self.backend} is open")
+        
+        # Only the wait for the first token is budgeted; the rest streams to the client
+        chunks = iter(llm.stream(messages))
+        try:
+            first = call_with_budget(lambda: next(chunks, None), latency_budget("first_token"))
         except Exception as e:
-            print(f"Error in risk assessment: {str(e)}")
-            return self._get_mock_risk_assessment(note_content)
+            self.breaker.record_failure(e)
+            raise
+        self.breaker.record_success()
+        
+        for chunk in chain([first] if first is not None else [], chunks):
+            token = chunk.content
+            if not token:
+                continue
+            content += token
+            yield {"event": "token", "data": token}
+            
+            for match in PARTIAL_FIELD_PATTERN.finditer(content):
+                name = match.group(1)
+                if name in emitted_fields:
+                    continue
+                emitted_fields.add(name)
+                try:
+                    value = json.loads(f'"{match.group(2)}"')
+                except json.JSONDecodeError:
+                    value = match.group(2)
+                yield {"event": "field", "data": {"name": name, "value": value}}
+        yield {"event": "content", "data": content}
     
     def generate_treatment_recommendations(self, diagnosis: str, patient_context: str,
                                          contraindications: List[str] = None) -> Dict:
@@ -256,15 +438,26 @@ Base your assessment on:
             return self._get_mock_treatment_recommendations(diagnosis)
         
         try:
-            contraindications_text = ""
-            if contraindications:
-                contraindications_text = f"\nCONTRAINDICATIONS:\n" + "\n".join(contraindications)
+            messages = self._build_treatment_messages(diagnosis, patient_context, contraindications)
+            response = self._invoke(self.creative_llm, messages, "treatment")
+            return self._parse_treatment_response(response.content) or self._get_mock_treatment_recommendations(diagnosis)
             
-            system_prompt = """You are a medical AI assistant specialized in evidence-based treatment planning.
+        except Exception as e:
+            print(f"Error generating recommendations: {str(e)}")
+            return self._get_mock_treatment_recommendations(diagnosis, fallback_reason=str(e))
+    
+    def _build_treatment_messages(self, diagnosis: str, patient_context: str,
+                                  contraindications: List[str] = None) -> List:
+        """Build the chat messages for treatment recommendations"""
+        contraindications_text = ""
+        if contraindications:
+            contraindications_text = f"\nCONTRAINDICATIONS:\n" + "\n".join(contraindications)
+        
+        system_prompt = """You are a medical AI assistant specialized in evidence-based treatment planning.
 Provide treatment recommendations based on current clinical guidelines and best practices.
 Always consider patient safety, contraindications, and individual patient factors."""
-            
-            treatment_json_template = """{
+        
+        treatment_json_template = """{
     "primary_treatment": "First-line treatment approach",
     "medications": [
         {
@@ -281,44 +474,44 @@ Always consider patient safety, contraindications, and individual patient factor
     "red_flags": ["warning signs to watch for"],
     "follow_up_timeline": "When to follow up"
 }"""
-            
-            user_prompt = (
-                "Generate treatment recommendations for:\n\n"
-                f"DIAGNOSIS: {diagnosis}\n\n"
-                "PATIENT CONTEXT:\n"
-                f"{patient_context}\n"
-                f"{contraindications_text}\n\n"
-                "Provide recommendations in JSON format:\n"
-                f"{treatment_json_template}\n"
-            )
-            
-            messages = [
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=user_prompt)
-            ]
-            
-            response = self.creative_llm.invoke(messages)
-            
-            try:
-                content = response.content
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                if json_match:
-                    return json.loads(json_match.group())
-            except json.JSONDecodeError:
-                pass
-            
-            return self._get_mock_treatment_recommendations(diagnosis)
-            
-        except Exception as e:
-            print(f"Error generating recommendations: {str(e)}")
-            return self._get_mock_treatment_recommendations(diagnosis)
+        
+        user_prompt = (
+            "Generate treatment recommendations for:\n\n"
+            f"DIAGNOSIS: {diagnosis}\n\n"
+            "PATIENT CONTEXT:\n"
+            f"{patient_context}\n"
+            f"{contraindications_text}\n\n"
+            "Provide recommendations in JSON format:\n"
+            f"{treatment_json_template}\n"
+        )
+        
+        return [
+            SystemMessage(content=system_prompt),
+            HumanMessage(content=user_prompt)
+        ]
+    
+    def _parse_treatment_response(self, content: str) -> Optional[Dict]:
+        """Parse the LLM treatment response; returns None if no valid JSON was found"""
+        try:
+            json_match = re.search(r'\{.*\}', content, re.DOTALL)
+            if json_match:
+                return json.loads(json_match.group())
+        except json.JSONDecodeError:
+            pass
+        return None
     
     def extract_medical_entities(self, text: str) -> Dict:
         """
         Extract medical entities (conditions, medications, procedures) from text
+        Vitals, labs, doses and known terms are extracted locally; only sentences
+        the local pass could not resolve are sent to the LLM
         """
-        if not self.enabled:
-            return {"entities": [], "error": "AI not available"}
+        local = get_entity_extractor().extract(text)
+        entities = local.entities
+        if not local.unresolved:
+            return {**entities, "source": "local"}
+        if not self.enabled or self.breaker.state == OPEN:
+            return {**entities, "source": "local", "unresolved": local.unresolved}
         
         try:
             entity_json_template = """{
@@ -332,24 +525,29 @@ Always consider patient safety, contraindications, and individual patient factor
             
             prompt = (
                 "Extract all medical entities from the following text and categorize them:\n\n"
-                f"TEXT: {text}\n\n"
+                f"TEXT: {' '.join(local.unresolved)}\n\n"
                 "Return JSON format:\n"
                 f"{entity_json_template}\n"
             )
             
-            response = self.llm.invoke([HumanMessage(content=prompt)])
+            response = self._invoke(self.llm, [HumanMessage(content=prompt)], "entities")
             
             try:
                 json_match = re.search(r'\{.*\}', response.content, re.DOTALL)
                 if json_match:
-                    return json.loads(json_match.group())
+                    llm_entities = json.loads(json_match.group())
+                    for field_name in ENTITY_FIELDS:
+                        for value in llm_entities.get(field_name) or []:
+                            if isinstance(value, str):
+                                local.add(field_name, value)
+                    return {**entities, "source": "local+llm"}
             except:
                 pass
             
-            return {"entities": [], "raw_response": response.content}
+            return {**entities, "source": "local", "raw_response": response.content}
             
         except Exception as e:
-            return {"error": str(e)}
+            return {**entities, "source": "local", "error": str(e)}
     
     def create_vectorstore_from_notes(self, notes: List[Dict]):
         """
@@ -373,44 +571,190 @@ Always consider patient safety, contraindications, and individual patient factor
         except Exception as e:
             print(f"Error creating vector store: {str(e)}")
     
+    # Agent-facing helpers
+    def summarize_note(self, note_content: str, note_type: str = "general",
+                       patient_context: Optional[str] = None) -> Dict:
+        """Summarize a note in the shape the agents consume"""
+        result = self.summarize_medical_note(note_content, note_type)
+        return self.format_summary_for_agent(result)
+    
+    def assess_risk(self, note_content: str, patient_history: List[str] = None) -> Dict:
+        """Assess risk in the shape the agents consume"""
+        result = self.assess_patient_risk(note_content, patient_history)
+        return self.format_risk_for_agent(result)
+    
+    def generate_nurse_recommendations(self, note_content: str, patient_context: str = "") -> Dict:
+        """Nursing-focused recommendations for nurse notes"""
+        result = self.generate_treatment_recommendations(
+            diagnosis=note_content[:500],
+            patient_context=patient_context
+        )
+        return self._format_nurse_recommendations(result)
+    
+    # Async variants for the asyncio worker (api/tasks/async_worker.py): same
+    # prompts, parsing and fallbacks, with the call awaited via ainvoke
+    async def asummarize_note(self, note_content: str, note_type: str = "general",
+                              patient_context: Optional[str] = None) -> Dict:
+        result = await self.asummarize_medical_note(note_content, note_type)
+        return self.format_summary_for_agent(result)
+    
+    async def aassess_risk(self, note_content: str, patient_history: List[str] = None) -> Dict:
+        result = await self.aassess_patient_risk(note_content, patient_history)
+        return self.format_risk_for_agent(result)
+    
+    async def agenerate_nurse_recommendations(self, note_content: str, patient_context: str = "") -> Dict:
+        result = await self.agenerate_treatment_recommendations(
+            diagnosis=note_content[:500],
+            patient_context=patient_context
+        )
+        return self._format_nurse_recommendations(result)
+    
+    async def asummarize_medical_note(self, note_content: str, note_type: str = "general",
+                                      patient_history: Optional[List[str]] = None) -> Dict:
+        if not self.enabled:
+            return self._get_mock_summary(note_content, note_type)
+        
+        try:
+            messages = self._build_summary_messages(note_content, note_type, patient_history)
+            response = await self._ainvoke(self.llm, messages, "summarize")
+            return self._parse_summary_response(response.content)
+        except Exception as e:
+            print(f"Error in AI summarization: {str(e)}")
+            return self._get_mock_summary(note_content, note_type, fallback_reason=str(e))
+    
+    async def aassess_patient_risk(self, note_content: str, patient_history: List[str] = None,
+                                   vital_signs: Dict = None) -> Dict:
+        if not self.enabled:
+            return self._get_mock_risk_assessment(note_content)
+        
+        if self.breaker.state == OPEN:
+            return self._get_mock_risk_assessment(note_content, fallback_reason="circuit open")
+        
+        try:
+            messages = self._build_risk_messages(note_content, patient_history, vital_signs)
+            response = await self._ainvoke(self.llm, messages, "risk")
+            return self._parse_risk_response(response.content) or self._get_mock_risk_assessment(note_content)
+        except Exception as e:
+            print(f"Error in risk assessment: {str(e)}")
+            return self._get_mock_risk_assessment(note_content, fallback_reason=str(e))
+    
+    async def agenerate_treatment_recommendations(self, diagnosis: str, patient_context: str,
+                                                  contraindications: List[str] = None) -> Dict:
+        if not self.enabled:
+            return self._get_mock_treatment_recommendations(diagnosis)
+        
+        try:
+            messages = self._build_treatment_messages(diagnosis, patient_context, contraindications)
+            response = await self._ainvoke(self.creative_llm, messages, "treatment")
+            return self._parse_treatment_response(response.content) or self._get_mock_treatment_recommendations(diagnosis)
+        except Exception as e:
+            print(f"Error generating recommendations: {str(e)}")
+            return self._get_mock_treatment_recommendations(diagnosis, fallback_reason=str(e))
+    
+    async def _ainvoke(self, llm, messages: List, operation: str):
+        """_invoke for coroutines: the scheduler wait and the call leave the event loop free"""
+        self._check_circuit()
+        budget = latency_budget(operation)
+        return await self.scheduler.arun(
+            lambda: self.breaker.acall(lambda: llm.ainvoke(messages), budget),
+            messages
+        )
+    
+    def _format_nurse_recommendations(self, result: Dict) -> Dict:
+        nursing_actions = list(result.get("non_pharmacological", []))
+        if result.get("monitoring_requirements"):
+            nursing_actions.append(result["monitoring_requirements"])
+        return {
+            "nursing_actions": "; ".join(nursing_actions),
+            "patient_education": result.get("patient_education", []),
+            "red_flags": result.get("red_flags", []),
+            "ai_generated": result.get("ai_generated", self.enabled)
+        }
+    
+    def add_documents_to_vector_store(self, texts: List[str]):
+        """Add raw note texts to the RAG vector store"""
+        if not self.enabled or not texts:
+            return
+        
+        try:
+            docs = self.text_splitter.create_documents(texts)
+            if self.vectorstore is None:
+                self.vectorstore = FAISS.from_documents(docs, self.embeddings)
+            else:
+                self.vectorstore.add_documents(docs)
+            print(f"✅ Added {len(docs)} documents to vector store")
+        except Exception as e:
+            print(f"Error updating vector store: {str(e)}")
+    
+    @staticmethod
+    def format_summary_for_agent(result: Dict) -> Dict:
+        """Map a raw summary result onto the keys the agents read"""
+        formatted = dict(result)
+        formatted.setdefault("summary", "")
+        if not formatted.get("recommendations"):
+            formatted["recommendations"] = result.get("treatment_plan") or result.get("follow_up")
+        return formatted
+    
+    @staticmethod
+    def format_risk_for_agent(result: Dict) -> Dict:
+        """Map a raw risk assessment onto the keys the agents read"""
+        formatted = dict(result)
+        formatted["risk_level"] = str(result.get("risk_level", "UNKNOWN")).upper()
+        formatted["risk_analysis"] = result.get("summary", "")
+        formatted["monitoring_suggestions"] = result.get("monitoring_plan", "")
+        formatted["escalation_criteria"] = result.get("escalation_criteria", "")
+        recommendations = result.get("recommendations")
+        if isinstance(recommendations, list):
+            formatted["recommendations"] = "; ".join(recommendations)
+        return formatted
+    
     # Mock methods for fallback
-    def _get_mock_summary(self, content: str, note_type: str) -> Dict:
+    def _get_mock_summary(self, content: str, note_type: str, fallback_reason: Optional[str] = None) -> Dict:
         """Fallback summary when AI is not available"""
-        return {
+        return self._mark_provisional({
             "summary": f"Summary of {note_type}: {content[:200]}...",
             "key_findings": "AI analysis not available - OpenAI API key needed",
             "assessment": "Manual review required",
             "ai_generated": False,
             "mock": True
-        }
+        }, fallback_reason)
     
-    def _get_mock_risk_assessment(self, content: str) -> Dict:
+    def _get_mock_risk_assessment(self, content: str, fallback_reason: Optional[str] = None) -> Dict:
         """Fallback risk assessment"""
         risk_level = "MEDIUM"
-        if any(word in content.lower() for word in ["critical", "urgent", "emergency", "severe"]):
+        present = get_lexicon().categories_present(content)
+        if "high_risk" in present:
             risk_level = "HIGH"
-        elif any(word in content.lower() for word in ["stable", "normal", "routine"]):
+        elif "low_risk" in present:
             risk_level = "LOW"
         
-        return {
+        return self._mark_provisional({
             "risk_level": risk_level,
             "summary": "Risk assessment based on keyword analysis",
             "risk_factors": ["Automated assessment - AI not available"],
             "recommendations": ["Manual clinical review recommended"],
             "ai_generated": False,
             "mock": True
-        }
+        }, fallback_reason)
     
-    def _get_mock_treatment_recommendations(self, diagnosis: str) -> Dict:
+    def _get_mock_treatment_recommendations(self, diagnosis: str, fallback_reason: Optional[str] = None) -> Dict:
         """Fallback treatment recommendations"""
-        return {
+        return self._mark_provisional({
             "primary_treatment": "Please consult clinical guidelines",
             "medications": [],
             "non_pharmacological": ["Lifestyle modifications", "Regular monitoring"],
             "follow_up_timeline": "As clinically indicated",
             "ai_generated": False,
             "mock": True
-        }
+        }, fallback_reason)
+    
+    @staticmethod
+    def _mark_provisional(result: Dict, fallback_reason: Optional[str]) -> Dict:
+        """Flag a fallback that stood in for a failed, slow or circuit-broken LLM call"""
+        if fallback_reason:
+            result["provisional"] = True
+            result["fallback_reason"] = fallback_reason
+        return result
 
 # Example usage
 if __name__ == "__main__":
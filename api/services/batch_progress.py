@@ -0,0 +1,98 @@
+"""
+Per-note progress of fanned-out AI batches
+A batch is split into chunk tasks that run on any worker; each note's outcome
+is written to a Redis hash keyed by the batch id as soon as it is known, so
+progress can be read while chunks are still running and a retried chunk only
+has to redo the notes that failed. The chord callback aggregates the hash.
+Note outcomes and batch completion are also published on the batch's task
+event channel.
+"""
+import json
+import time
+from typing import Dict, Iterable, List, Optional
+
+from api.services.note_events import get_redis
+from api.services.task_events import publish_task_event
+
+BATCH_TTL_SECONDS = 24 * 3600
+
+QUEUED, COMPLETED, SKIPPED, FAILED, MISSING = "queued", "completed", "skipped", "failed", "missing"
+NOTE_STATUSES = (QUEUED, COMPLETED, SKIPPED, FAILED, MISSING)
+
+
+def _meta_key(batch_id: str) -> str:
+    return f"ai:batch:{batch_id}:meta"
+
+
+def _notes_key(batch_id: str) -> str:
+    return f"ai:batch:{batch_id}:notes"
+
+
+def start_batch(batch_id: str, note_ids: Iterable[int], user_id: int, chunks: int):
+    """Register a batch with every note queued"""
+    note_ids = list(note_ids)
+    client = get_redis()
+    pipe = client.pipeline()
+    pipe.hset(_meta_key(batch_id), mapping={
+        "status": "running",
+        "user_id": user_id,
+        "total": len(note_ids),
+        "chunks": chunks,
+        "started_at": time.time(),
+    })
+    if note_ids:
+        pipe.hset(_notes_key(batch_id), mapping={
+            str(note_id): json.dumps({"status": QUEUED}) for note_id in note_ids
+        })
+    pipe.expire(_meta_key(batch_id), BATCH_TTL_SECONDS)
+    pipe.expire(_notes_key(batch_id), BATCH_TTL_SECONDS)
+    pipe.execute()
+
+
+def record_note(batch_id: str, note_id: int, status: str, attempt: int = 0, **fields):
+    """Record one note's outcome (status plus e.g. risk_level or error)"""
+    entry = {"status": status, "attempts": attempt + 1, **fields}
+    get_redis().hset(_notes_key(batch_id), str(note_id), json.dumps(entry, default=str))
+    publish_task_event(batch_id, "PROGRESS", {"note_id": note_id, **entry})
+
+
+def finish_batch(batch_id: str, summary: Optional[Dict] = None):
+    get_redis().hset(_meta_key(batch_id), mapping={"status": "completed", "finished_at": time.time()})
+    publish_task_event(batch_id, "SUCCESS", summary)
+
+
+def note_results(batch_id: str) -> List[Dict]:
+    """Latest outcome of every note in the batch, in note id order"""
+    raw = get_redis().hgetall(_notes_key(batch_id))
+    results = []
+    for note_id, value in raw.items():
+        results.append({"note_id": int(note_id), **json.loads(value)})
+    return sorted(results, key=lambda r: r["note_id"])
+
+
+def batch_progress(batch_id: str, include_notes: bool = True) -> Optional[Dict]:
+    """Batch status with per-status counts, or None for an unknown or expired batch"""
+    meta = {
+        (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+        for k, v in get_redis().hgetall(_meta_key(batch_id)).items()
+    }
+    if not meta:
+        return None
+    notes = note_results(batch_id)
+    counts = {status: 0 for status in NOTE_STATUSES}
+    for note in notes:
+        counts[note["status"]] = counts.get(note["status"], 0) + 1
+    total = int(meta.get("total", len(notes)))
+    progress = {
+        "batch_id": batch_id,
+        "status": meta.get("status"),
+        "total": total,
+        "chunks": int(meta.get("chunks", 0)),
+        "done": total - counts[QUEUED],
+        "counts": counts,
+        "started_at": float(meta["started_at"]) if "started_at" in meta else None,
+        "finished_at": float(meta["finished_at"]) if "finished_at" in meta else None,
+    }
+    if include_notes:
+        progress["notes"] = notes
+    return progress
@@ -0,0 +1,182 @@
+"""
+Circuit breaker and latency budgets for LLM calls
+A provider that is slow or down fails fast instead of making every request
+wait for the client's full timeout. After LLM_BREAKER_FAILURES consecutive
+failures or budget overruns the circuit opens and calls are rejected
+immediately; after LLM_BREAKER_RECOVERY_S one probe call is let through
+(half-open) and its outcome closes or re-opens the circuit.
+"""
+import os
+import time
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Awaitable, Callable, Dict, List
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Seconds each operation may spend waiting on the provider
+DEFAULT_BUDGETS = {
+    "summarize": 20.0,
+    "risk": 20.0,
+    "treatment": 30.0,
+    "entities": 15.0,
+    "first_token": 10.0,
+}
+
+# Calls run on these threads so the caller can stop waiting once the budget is spent
+_call_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("LLM_CALL_THREADS", "16")),
+    thread_name_prefix="llm-call",
+)
+
+
+class CircuitOpenError(Exception):
+    """The circuit is open; the call was not attempted"""
+
+
+class LatencyBudgetExceeded(Exception):
+    """The call did not finish within its latency budget"""
+
+
+def latency_budget(operation: str) -> float:
+    """Budget in seconds for an operation, overridable with LLM_BUDGET_<OPERATION>_S"""
+    default = DEFAULT_BUDGETS.get(operation, DEFAULT_BUDGETS["summarize"])
+    return float(os.getenv(f"LLM_BUDGET_{operation.upper()}_S", default))
+
+
+def call_with_budget(call: Callable, budget: float):
+    """Run call() and give up waiting after `budget` seconds"""
+    # Carry context variables (e.g. the LLM priority) onto the call thread
+    future = _call_executor.submit(contextvars.copy_context().run, call)
+    try:
+        return future.result(timeout=budget)
+    except FutureTimeoutError:
+        future.cancel()
+        raise LatencyBudgetExceeded(f"LLM call exceeded its {budget:.1f}s latency budget")
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker shared by all calls to one provider"""
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.trip_count = 0
+        self.rejected_calls = 0
+        self.budget_overruns = 0
+        self.last_error = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def allow_request(self) -> bool:
+        """Whether a call may be attempted now; in half-open only one probe is allowed"""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected_calls += 1
+            return False
+
+    def call(self, fn: Callable, budget: float):
+        """Run fn() under the breaker and a latency budget"""
+        if not self.allow_request():
+            raise CircuitOpenError(f"Circuit for {self.name} is open")
+        try:
+            result = call_with_budget(fn, budget)
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        self.record_success()
+        return result
+
+    async def acall(self, fn: Callable[[], Awaitable], budget: float):
+        """call() for coroutines: await fn() under the breaker and a latency budget"""
+        if not self.allow_request():
+            raise CircuitOpenError(f"Circuit for {self.name} is open")
+        try:
+            result = await asyncio.wait_for(fn(), budget)
+        except asyncio.TimeoutError:
+            error = LatencyBudgetExceeded(f"LLM call exceeded its {budget:.1f}s latency budget")
+            self.record_failure(error)
+            raise error
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        self.record_success()
+        return result
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+            self._state = CLOSED
+
+    def record_failure(self, error: Exception):
+        with self._lock:
+            if isinstance(error, LatencyBudgetExceeded):
+                self.budget_overruns += 1
+            self.last_error = str(error)
+            self._consecutive_failures += 1
+            state = self._current_state()
+            if state == HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if state != OPEN:
+                    self.trip_count += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "state": self._current_state(),
+                "trip_count": self.trip_count,
+                "consecutive_failures": self._consecutive_failures,
+                "rejected_calls": self.rejected_calls,
+                "budget_overruns": self.budget_overruns,
+                "last_error": self.last_error,
+                "budgets_s": {op: latency_budget(op) for op in DEFAULT_BUDGETS},
+            }
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = HALF_OPEN
+        return self._state
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    """Process-wide breaker for a provider"""
+    with _breakers_lock:
+        if provider not in _breakers:
+            _breakers[provider] = CircuitBreaker(
+                provider,
+                failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+                recovery_timeout=float(os.getenv("LLM_BREAKER_RECOVERY_S", "30")),
+            )
+        return _breakers[provider]
+
+
+def all_breaker_status() -> List[Dict]:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return [breaker.status() for breaker in breakers]
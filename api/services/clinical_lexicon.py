@@ -0,0 +1,191 @@
+"""
+Compiled multi-pattern clinical lexicon shared by the agents
+All terms, synonyms, negation cues and scope terminators from the term file
+are compiled into one trie-shaped regular expression, so a note is scanned in
+a single pass regardless of how many terms the lexicon holds. A term is
+negated when it follows a negation cue ("denies chest pain") within the
+configured number of words and no terminator (punctuation, "but", ...) sits
+in between.
+"""
+import os
+import re
+import json
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, Optional
+
+DEFAULT_LEXICON_PATH = Path(__file__).resolve().parents[2] / "data" / "lexicon" / "clinical_terms.json"
+
+_SPACE = " "
+_TERMINAL = ""
+_TERM, _CUE, _STOP = "term", "cue", "stop"
+# Punctuation that ends a negation scope
+_SCOPE_BOUNDARY = re.compile(r"[.;:!?\n]")
+
+
+@dataclass(frozen=True)
+class LexiconMatch:
+    concept: str
+    categories: FrozenSet[str]
+    surface: str
+    start: int
+    end: int
+    negated: bool
+
+
+def _trie_pattern(phrases: Iterable[str]) -> str:
+    """Regex alternation of phrases, factored by common prefix so matching does not retry each phrase"""
+    trie: Dict = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[_TERMINAL] = True
+
+    def build(node: Dict) -> str:
+        terminal = _TERMINAL in node
+        branches = []
+        for char in sorted(k for k in node if k != _TERMINAL):
+            piece = r"\s+" if char == _SPACE else re.escape(char)
+            branches.append(piece + build(node[char]))
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            # Shorter phrase ends here; prefer the longer continuation when present
+            return f"(?:{body})?" if len(branches) == 1 else body + "?"
+        return body
+
+    return build(trie)
+
+
+class ClinicalLexicon:
+    """Single-pass term matcher with synonyms and negation handling"""
+
+    def __init__(self, config: Dict):
+        negation = config.get("negation", {})
+        self.negation_window = int(negation.get("window", 6))
+
+        # surface form -> (concept, categories)
+        self._terms: Dict[str, tuple] = {}
+        self._categories: Dict[str, List[str]] = {}
+        for concept in config.get("concepts", []):
+            name = self._normalize(concept["name"])
+            categories = frozenset(concept.get("categories", []))
+            for surface in [name] + [self._normalize(s) for s in concept.get("synonyms", [])]:
+                self._terms[surface] = (name, categories)
+            for category in categories:
+                self._categories.setdefault(category, []).append(name)
+
+        # Shorter terms inside a longer one ("pain" in "chest pain"): the scan
+        # reports only the longest match, so category lookups fall back to these
+        self._nested: Dict[str, List[tuple]] = {}
+        for surface in self._terms:
+            words = surface.split()
+            self._nested[surface] = [
+                self._terms[phrase]
+                for phrase in dict.fromkeys(
+                    " ".join(words[i:j]) for i in range(len(words)) for j in range(i + 1, len(words) + 1)
+                )
+                if phrase != surface and phrase in self._terms
+            ]
+
+        # Terms, negation cues and terminator words share one trie so each
+        # position in the text is tried against a single alternation
+        self._kinds: Dict[str, str] = {surface: _TERM for surface in self._terms}
+        for cue in negation.get("cues", []):
+            self._kinds.setdefault(self._normalize(cue), _CUE)
+        for stop in negation.get("terminators", []):
+            self._kinds.setdefault(self._normalize(stop), _STOP)
+        source = r"\b" + _trie_pattern(self._kinds) + r"\b"
+        self._pattern = re.compile(source)
+        self._pattern_ignorecase = re.compile(source, re.IGNORECASE)
+
+    @classmethod
+    def from_file(cls, path) -> "ClinicalLexicon":
+        with open(path) as f:
+            return cls(json.load(f))
+
+    @staticmethod
+    def _normalize(phrase: str) -> str:
+        return " ".join(phrase.lower().split())
+
+    def scan(self, text: str) -> List[LexiconMatch]:
+        """All term matches in order of appearance, with negation resolved"""
+        # Matching lowercased text case-sensitively is much faster than IGNORECASE;
+        # fall back when lowercasing would shift character offsets
+        lowered = text.lower()
+        if len(lowered) == len(text):
+            found = self._pattern.finditer(lowered)
+        else:
+            lowered, found = text, self._pattern_ignorecase.finditer(text)
+
+        matches = []
+        negation_start = None
+        for m in found:
+            surface = self._normalize(m.group())
+            kind = self._kinds[surface]
+            if kind == _TERM:
+                concept, categories = self._terms[surface]
+                negated = negation_start is not None and self._in_negation_scope(lowered, negation_start, m.start())
+                matches.append(LexiconMatch(concept, categories, surface, m.start(), m.end(), negated))
+            elif kind == _CUE:
+                negation_start = m.end()
+            else:
+                negation_start = None
+        return matches
+
+    def _in_negation_scope(self, text: str, cue_end: int, term_start: int) -> bool:
+        """Term is within the word window of the cue with no sentence/clause boundary between"""
+        if text.count(" ", cue_end, term_start) > self.negation_window:
+            return False
+        return _SCOPE_BOUNDARY.search(text, cue_end, term_start) is None
+
+    def concepts(self, text: str, category: Optional[str] = None, include_negated: bool = False) -> List[str]:
+        """
+        Distinct concepts found in text, in order of first appearance. With a
+        category, a match outside it reports the terms nested in it that are
+        in it ("chest pain" gives "pain" as a tag).
+        """
+        found = []
+        seen = set()
+        for match in self.scan(text):
+            if match.negated and not include_negated:
+                continue
+            candidates = [(match.concept, match.categories)]
+            if category and category not in match.categories:
+                candidates = self._nested[match.surface]
+            for concept, categories in candidates:
+                if category and category not in categories:
+                    continue
+                if concept not in seen:
+                    seen.add(concept)
+                    found.append(concept)
+        return found
+
+    def categories_present(self, text: str) -> FrozenSet[str]:
+        """Every category with at least one non-negated match"""
+        present = set()
+        for match in self.scan(text):
+            if not match.negated:
+                present.update(match.categories)
+        return frozenset(present)
+
+    def terms(self, category: str) -> List[str]:
+        """Canonical concept names in a category"""
+        return list(self._categories.get(category, []))
+
+
+_default_lexicon: Optional[ClinicalLexicon] = None
+_default_lock = threading.Lock()
+
+
+def get_lexicon() -> ClinicalLexicon:
+    """Process-wide lexicon loaded from CLINICAL_LEXICON_PATH or data/lexicon/clinical_terms.json"""
+    global _default_lexicon
+    with _default_lock:
+        if _default_lexicon is None:
+            path = os.getenv("CLINICAL_LEXICON_PATH", str(DEFAULT_LEXICON_PATH))
+            _default_lexicon = ClinicalLexicon.from_file(path)
+        return _default_lexicon
@@ -0,0 +1,160 @@
+"""
+Local rule-based clinical entity extractor
+Vital signs, lab values, medication doses and lexicon terms are pulled out of
+a note with regular expressions and the shared clinical lexicon, in the same
+schema the LLM entity extractor returns. Sentences with no local match are
+reported as unresolved so only they need to be sent to the LLM; a lab name
+with neither a value nor a status ("troponin pending") is not a match.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from api.services.clinical_lexicon import ClinicalLexicon, get_lexicon
+
+ENTITY_FIELDS = ("conditions", "symptoms", "medications", "procedures", "vital_signs", "lab_results")
+
+# Lexicon category -> entity field
+LEXICON_FIELDS = {
+    "condition": "conditions",
+    "symptom": "symptoms",
+    "procedure": "procedures",
+}
+
+# (label, pattern, unit suffix); the first group(s) hold the value, a None unit is captured from the text
+VITAL_PATTERNS = [
+    ("BP", re.compile(r"\b(?:BP|blood\s+pressure)\s*(?:of|is|was|:|=)?\s*(\d{2,3})\s*/\s*(\d{2,3})", re.IGNORECASE), " mmHg"),
+    ("HR", re.compile(r"\b(?:HR|heart\s+rate|pulse)\s*(?:of|is|was|:|=)?\s*(\d{2,3})\b", re.IGNORECASE), " bpm"),
+    ("RR", re.compile(r"\b(?:RR|resp(?:iratory)?\s+rate|resps?)\s*(?:of|is|was|:|=)?\s*(\d{1,2})\b", re.IGNORECASE), "/min"),
+    ("Temp", re.compile(r"\b(?:T|temp|temperature)\s*(?:of|is|was|:|=)?\s*(\d{2,3}(?:\.\d)?)\s*°?\s*([FC])?\b", re.IGNORECASE), None),
+    ("SpO2", re.compile(r"\b(?:SpO2|O2\s*sat(?:uration)?|sats?|oxygen\s+saturation)\s*(?:of|is|was|:|=)?\s*(\d{2,3})\s*%", re.IGNORECASE), "%"),
+    ("Weight", re.compile(r"\b(?:wt|weight)\s*(?:of|is|was|:|=)?\s*(\d{2,3}(?:\.\d)?)\s*(kg|lbs?)\b", re.IGNORECASE), None),
+]
+
+_LAB_UNITS = r"(?:mg/dl|mmol/l|meq/l|g/dl|ng/ml|pg/ml|ng/l|k/ul|x10\^?9/l|iu/l|u/l|mg/l|%)"
+# Value (and optional unit) right after a lab name: "troponin 0.04 ng/mL", "potassium of 5.8"
+LAB_VALUE = re.compile(r"\s*(?:level|value)?\s*(?:of|is|was|:|=)?\s*(\d+(?:\.\d+)?)\s*(" + _LAB_UNITS + r")?", re.IGNORECASE)
+# A lab mentioned without a value yet: "troponin pending", "lactate was sent"
+LAB_STATUS = re.compile(
+    r"\s*(?:level|result)?\s*(?:is|was|:|=)?\s*"
+    r"(pending|ordered|sent|requested|awaited|not\s+(?:yet\s+)?(?:back|resulted))\b",
+    re.IGNORECASE,
+)
+
+_DOSE_UNITS = r"(?:mg|mcg|g|units?|u|ml|meq|mg/kg)"
+_FREQUENCIES = r"(?:daily|once\s+daily|twice\s+daily|bid|tid|qid|qd|qhs|nightly|q\d+h|prn|as\s+needed|stat|weekly)"
+_ROUTES = r"(?:po|iv|im|sc|subq|sl|inh|pr)"
+# Dose, route and frequency in any order right after a medication name
+MED_DOSE = re.compile(
+    r"(?:\s+(?:" + r"\d+(?:\.\d+)?\s*" + _DOSE_UNITS + r"|" + _ROUTES + r"|" + _FREQUENCIES + r")\b)+",
+    re.IGNORECASE,
+)
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+# Sentences shorter than this carry no entities worth an LLM call
+MIN_UNRESOLVED_WORDS = 3
+
+
+@dataclass
+class ExtractionResult:
+    entities: Dict[str, List[str]] = field(default_factory=lambda: {name: [] for name in ENTITY_FIELDS})
+    unresolved: List[str] = field(default_factory=list)
+
+    def add(self, field_name: str, value: str):
+        values = self.entities[field_name]
+        if value.lower() not in (v.lower() for v in values):
+            values.append(value)
+
+
+class LocalEntityExtractor:
+    """Regex and lexicon extraction of clinical entities"""
+
+    def __init__(self, lexicon: ClinicalLexicon = None):
+        self.lexicon = lexicon or get_lexicon()
+
+    def extract(self, text: str) -> ExtractionResult:
+        result = ExtractionResult()
+        # Character spans covered by a local match; used to find unresolved sentences
+        spans = []
+
+        for label, pattern, unit in VITAL_PATTERNS:
+            for m in pattern.finditer(text):
+                result.add("vital_signs", self._format_vital(label, m, unit))
+                spans.append((m.start(), m.end()))
+
+        for match in self.lexicon.scan(text):
+            # Negated mentions are resolved too: there is nothing for the LLM to add
+            if match.negated:
+                spans.append((match.start, match.end))
+                continue
+            surface = text[match.start:match.end]
+            resolved = True
+            if "medication" in match.categories:
+                dose = MED_DOSE.match(text, match.end)
+                result.add("medications", surface + (" " + " ".join(dose.group().split()) if dose else ""))
+            if "lab" in match.categories:
+                lab = self._format_lab(text, match.end, surface)
+                if lab:
+                    result.add("lab_results", lab)
+                elif match.categories == {"lab"}:
+                    # A bare lab name gives nothing to record; leave its sentence to the LLM
+                    resolved = False
+            if resolved:
+                spans.append((match.start, match.end))
+            for category, field_name in LEXICON_FIELDS.items():
+                if category in match.categories:
+                    result.add(field_name, match.concept)
+
+        result.unresolved = self._unresolved_sentences(text, spans)
+        return result
+
+    @staticmethod
+    def _format_lab(text: str, end: int, surface: str):
+        """'name: value unit' or 'name: pending' for the lab name ending at end, None if neither follows"""
+        value = LAB_VALUE.match(text, end)
+        if value and value.group(1):
+            unit = f" {value.group(2)}" if value.group(2) else ""
+            return f"{surface}: {value.group(1)}{unit}"
+        lab_status = LAB_STATUS.match(text, end)
+        if lab_status:
+            return f"{surface}: {' '.join(lab_status.group(1).lower().split())}"
+        return None
+
+    @staticmethod
+    def _format_vital(label: str, m: re.Match, unit) -> str:
+        if label == "BP":
+            return f"BP: {m.group(1)}/{m.group(2)}{unit}"
+        if unit is None:
+            # Temperature scale or weight unit as written in the note
+            captured = m.group(2) or ""
+            unit = captured.upper() if label == "Temp" else f" {captured}"
+        return f"{label}: {m.group(1)}{unit}".rstrip()
+
+    @staticmethod
+    def _unresolved_sentences(text: str, spans: List[tuple]) -> List[str]:
+        """Sentences with no local match that are long enough to hold an entity"""
+        spans.sort()
+        unresolved = []
+        position = 0
+        span_index = 0
+        for sentence in _SENTENCE_SPLIT.split(text):
+            start = text.find(sentence, position)
+            end = start + len(sentence)
+            position = end
+            while span_index < len(spans) and spans[span_index][1] <= start:
+                span_index += 1
+            covered = span_index < len(spans) and spans[span_index][0] < end
+            if not covered and len(sentence.split()) >= MIN_UNRESOLVED_WORDS:
+                unresolved.append(sentence.strip())
+        return unresolved
+
+
+_default_extractor = None
+
+
+def get_entity_extractor() -> LocalEntityExtractor:
+    """Process-wide extractor over the shared lexicon"""
+    global _default_extractor
+    if _default_extractor is None:
+        _default_extractor = LocalEntityExtractor()
+    return _default_extractor
@@ -0,0 +1,377 @@
+"""
+Deterministic fake LLM and embeddings backend for offline testing and benchmarking
+Enabled with AI_BACKEND=fake. Responses are schema-valid JSON derived from the
+prompt, so the real parsing and agent code paths run without network access.
+"""
+import os
+import re
+import json
+import math
+import time
+import random
+import asyncio
+import hashlib
+import threading
+import weakref
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+try:
+    from langchain_core.embeddings import Embeddings as _EmbeddingsBase
+except ImportError:
+    _EmbeddingsBase = object
+
+FAKE_MODEL_NAME = "fake-llm"
+
+HIGH_RISK_TERMS = ["critical", "urgent", "emergency", "severe", "chest pain", "sepsis", "unresponsive"]
+LOW_RISK_TERMS = ["stable", "normal", "routine", "improving", "unremarkable"]
+FINDING_TERMS = [
+    "hypertension", "diabetes", "infection", "fever", "pain", "cough",
+    "shortness of breath", "chest pain", "dizziness", "nausea", "bleeding",
+    "swelling", "confusion", "weakness", "fatigue"
+]
+MEDICATION_PATTERN = re.compile(r"\b([A-Z][a-z]+(?:pril|olol|statin|formin|cillin|mycin|azole|sartan|pine|done))\b(?:\s+(\d+\s?mg))?")
+VITAL_PATTERN = re.compile(r"\b(BP|HR|RR|Temp|SpO2)\s*:\s*([\d./]+\s*%?F?)", re.IGNORECASE)
+
+
+class FakeLLMError(Exception):
+    """Injected provider error"""
+    status_code = 500
+
+
+class FakeRateLimitError(FakeLLMError):
+    """Injected provider rate limit (HTTP 429)"""
+    status_code = 429
+
+
+@dataclass
+class FakeLLMConfig:
+    """Latency, throughput and error injection settings for the fake backend"""
+    latency_ms: float = 0.0           # Base latency per call (time to first token when streaming)
+    jitter_ms: float = 0.0            # Uniform random jitter added to latency
+    tokens_per_second: float = 0.0    # Streaming/generation speed, 0 = instant
+    max_rpm: int = 0                  # Requests per minute before 429s, 0 = unlimited
+    max_concurrency: int = 0          # Concurrent in-flight calls, extra calls block, 0 = unlimited
+    error_rate: float = 0.0           # Probability of an injected 500 error
+    embedding_dim: int = 256
+    seed: int = 42
+
+    @classmethod
+    def from_env(cls) -> "FakeLLMConfig":
+        return cls(
+            latency_ms=float(os.getenv("FAKE_LLM_LATENCY_MS", "0")),
+            jitter_ms=float(os.getenv("FAKE_LLM_JITTER_MS", "0")),
+            tokens_per_second=float(os.getenv("FAKE_LLM_TOKENS_PER_SEC", "0")),
+            max_rpm=int(os.getenv("FAKE_LLM_MAX_RPM", "0")),
+            max_concurrency=int(os.getenv("FAKE_LLM_MAX_CONCURRENCY", "0")),
+            error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+            embedding_dim=int(os.getenv("FAKE_EMBEDDING_DIM", "256")),
+            seed=int(os.getenv("FAKE_LLM_SEED", "42")),
+        )
+
+
+class FakeMessage:
+    """Minimal stand-in for a LangChain AIMessage / AIMessageChunk"""
+
+    def __init__(self, content: str):
+        self.content = content
+
+    def __repr__(self):
+        return f"FakeMessage({self.content[:40]!r})"
+
+
+class _Throttle:
+    """Shared latency, concurrency, rate limit and error injection for fake models"""
+
+    def __init__(self, config: FakeLLMConfig):
+        self.config = config
+        self._rng = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self._calls = deque()
+        self._semaphore = threading.BoundedSemaphore(config.max_concurrency) if config.max_concurrency else None
+        # asyncio semaphores are bound to one event loop, so coroutines queue on
+        # a per-loop one and then take a slot of the shared semaphore above
+        self._loop_semaphores = weakref.WeakKeyDictionary()
+        self.total_calls = 0
+        self.total_errors = 0
+
+    def admit(self) -> float:
+        """Check rate limit and error injection; returns the latency for this call in seconds"""
+        with self._lock:
+            now = time.monotonic()
+            self.total_calls += 1
+            if self.config.max_rpm:
+                while self._calls and now - self._calls[0] > 60:
+                    self._calls.popleft()
+                if len(self._calls) >= self.config.max_rpm:
+                    self.total_errors += 1
+                    raise FakeRateLimitError("Rate limit reached for fake-llm (requests per minute)")
+                self._calls.append(now)
+            if self.config.error_rate and self._rng.random() < self.config.error_rate:
+                self.total_errors += 1
+                raise FakeLLMError("Injected fake-llm server error")
+            jitter = self._rng.uniform(0, self.config.jitter_ms) if self.config.jitter_ms else 0.0
+        return (self.config.latency_ms + jitter) / 1000.0
+
+    def acquire(self):
+        if self._semaphore:
+            self._semaphore.acquire()
+
+    def release(self):
+        if self._semaphore:
+            self._semaphore.release()
+
+    async def acquire_async(self):
+        """acquire() for coroutines: waits on the event loop instead of blocking it"""
+        if not self._semaphore:
+            return
+        loop_semaphore = self._loop_semaphore()
+        await loop_semaphore.acquire()
+        try:
+            # Contention here is only with threaded callers; the loop semaphore
+            # keeps at most max_concurrency coroutines polling
+            while not self._semaphore.acquire(blocking=False):
+                await asyncio.sleep(0.005)
+        except BaseException:
+            loop_semaphore.release()
+            raise
+
+    def release_async(self):
+        if self._semaphore:
+            self._semaphore.release()
+            self._loop_semaphore().release()
+
+    def _loop_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphore = self._loop_semaphores.get(loop)
+            if semaphore is None:
+                semaphore = self._loop_semaphores[loop] = asyncio.Semaphore(self.config.max_concurrency)
+        return semaphore
+
+    def token_delay(self) -> float:
+        return 1.0 / self.config.tokens_per_second if self.config.tokens_per_second else 0.0
+
+
+class FakeChatModel:
+    """
+    Drop-in for ChatOpenAI's invoke/stream/ainvoke that returns schema-valid,
+    input-dependent JSON for every prompt MedicalAIService sends.
+    """
+
+    def __init__(self, config: Optional[FakeLLMConfig] = None, temperature: float = 0.0,
+                 throttle: Optional[_Throttle] = None):
+        self.config = config or FakeLLMConfig.from_env()
+        self.temperature = temperature
+        self.model_name = FAKE_MODEL_NAME
+        self._throttle = throttle or _Throttle(self.config)
+
+    @property
+    def stats(self) -> Dict:
+        return {"calls": self._throttle.total_calls, "errors": self._throttle.total_errors}
+
+    def invoke(self, messages, **kwargs) -> FakeMessage:
+        content = self._respond(messages)
+        latency = self._throttle.admit()
+        self._throttle.acquire()
+        try:
+            time.sleep(latency + self._throttle.token_delay() * len(_tokenize(content)))
+        finally:
+            self._throttle.release()
+        return FakeMessage(content)
+
+    def stream(self, messages, **kwargs) -> Iterator[FakeMessage]:
+        content = self._respond(messages)
+        latency = self._throttle.admit()
+        self._throttle.acquire()
+        try:
+            time.sleep(latency)
+            delay = self._throttle.token_delay()
+            for token in _tokenize(content):
+                if delay:
+                    time.sleep(delay)
+                yield FakeMessage(token)
+        finally:
+            self._throttle.release()
+
+    async def ainvoke(self, messages, **kwargs) -> FakeMessage:
+        content = self._respond(messages)
+        latency = self._throttle.admit()
+        await self._throttle.acquire_async()
+        try:
+            await asyncio.sleep(latency + self._throttle.token_delay() * len(_tokenize(content)))
+        finally:
+            self._throttle.release_async()
+        return FakeMessage(content)
+
+    def _respond(self, messages) -> str:
+        prompt = "\n".join(_message_text(m) for m in messages)
+        text = _extract_input(prompt)
+        if '"risk_level"' in prompt:
+            payload = _risk_response(text)
+        elif '"primary_treatment"' in prompt:
+            payload = _treatment_response(text)
+        elif '"conditions"' in prompt:
+            payload = _entity_response(text)
+        elif '"summary"' in prompt:
+            payload = _summary_response(text)
+        else:
+            payload = {"response": _first_sentence(text)}
+        return json.dumps(payload, indent=2)
+
+
+class FakeEmbeddings(_EmbeddingsBase):
+    """Deterministic hashing embeddings: token n-grams hashed into a fixed-size unit vector"""
+
+    def __init__(self, config: Optional[FakeLLMConfig] = None, throttle: Optional[_Throttle] = None):
+        self.config = config or FakeLLMConfig.from_env()
+        self.dim = self.config.embedding_dim
+        self._throttle = throttle or _Throttle(self.config)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self._throttle.admit())
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self._throttle.admit())
+        return self._embed(text)
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        words = re.findall(r"\w+", text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dim
+            sign = 1.0 if digest[4] & 1 else -1.0
+            vector[index] += sign
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+
+def create_fake_backend(config: Optional[FakeLLMConfig] = None):
+    """Build (llm, creative_llm, embeddings) sharing one throttle so limits apply across all three"""
+    config = config or FakeLLMConfig.from_env()
+    throttle = _Throttle(config)
+    return (
+        FakeChatModel(config, temperature=0.1, throttle=throttle),
+        FakeChatModel(config, temperature=0.7, throttle=throttle),
+        FakeEmbeddings(config, throttle=throttle),
+    )
+
+
+# Response builders
+def _message_text(message) -> str:
+    return message.content if hasattr(message, "content") else str(message)
+
+
+def _extract_input(prompt: str) -> str:
+    """Pull the clinical text out of a MedicalAIService prompt"""
+    for marker in ("MEDICAL NOTE:", "CURRENT NOTE:", "DIAGNOSIS:", "TEXT:"):
+        if marker in prompt:
+            section = prompt.split(marker, 1)[1]
+            return section.split("Provide your", 1)[0].split("Return JSON", 1)[0].strip()
+    return prompt
+
+
+def _tokenize(content: str) -> List[str]:
+    return re.findall(r"\s*\S+", content)
+
+
+def _first_sentence(text: str) -> str:
+    sentence = re.split(r"(?<=[.!?])\s", text.strip(), maxsplit=1)[0]
+    return sentence[:200]
+
+
+def _findings(text: str) -> List[str]:
+    lowered = text.lower()
+    return [term for term in FINDING_TERMS if term in lowered]
+
+
+def _medications(text: str) -> List[str]:
+    return [" ".join(filter(None, match)) for match in MEDICATION_PATTERN.findall(text)]
+
+
+def _vitals(text: str) -> List[str]:
+    return [f"{name}: {value.strip()}" for name, value in VITAL_PATTERN.findall(text)]
+
+
+def _risk_level(text: str) -> str:
+    lowered = text.lower()
+    high_hits = sum(term in lowered for term in HIGH_RISK_TERMS)
+    if high_hits >= 2:
+        return "CRITICAL"
+    if high_hits:
+        return "HIGH"
+    if any(term in lowered for term in LOW_RISK_TERMS):
+        return "LOW"
+    return "MEDIUM"
+
+
+def _score(text: str, low: int, high: int) -> int:
+    digest = hashlib.sha256(text.encode()).digest()
+    return low + digest[0] % (high - low + 1)
+
+
+def _summary_response(text: str) -> Dict:
+    findings = _findings(text)
+    return {
+        "summary": _first_sentence(text) or "No clinical content provided.",
+        "key_findings": ", ".join(findings) or "No significant findings",
+        "chief_complaint": findings[0] if findings else "Not documented",
+        "assessment": f"Presentation consistent with {findings[0]}" if findings else "Stable presentation",
+        "vital_signs": ", ".join(_vitals(text)) or "Not documented",
+        "medications": ", ".join(_medications(text)) or "None documented",
+        "treatment_plan": "Continue current management and monitor symptoms",
+        "follow_up": "Reassess within 24-48 hours",
+        "risk_factors": ", ".join(findings[:3]) or "None identified",
+        "urgent_flags": "Requires prompt review" if _risk_level(text) in ("HIGH", "CRITICAL") else "None"
+    }
+
+
+def _risk_response(text: str) -> Dict:
+    level = _risk_level(text)
+    findings = _findings(text)
+    severity = {"LOW": "mild", "MEDIUM": "moderate", "HIGH": "severe", "CRITICAL": "life-threatening"}[level]
+    return {
+        "risk_level": level,
+        "confidence_score": _score(text, 60, 95),
+        "summary": f"{level.title()} risk based on documented {', '.join(findings) or 'findings'}.",
+        "risk_factors": findings or ["No specific risk factors identified"],
+        "clinical_concerns": findings[:2],
+        "recommendations": [f"Monitor {finding}" for finding in findings[:3]] or ["Continue routine care"],
+        "monitoring_plan": "Vital signs every 4 hours" if level in ("HIGH", "CRITICAL") else "Routine monitoring",
+        "escalation_criteria": "Escalate on deterioration of vital signs",
+        "requires_urgent_attention": level in ("HIGH", "CRITICAL"),
+        "estimated_severity": severity
+    }
+
+
+def _treatment_response(text: str) -> Dict:
+    findings = _findings(text)
+    return {
+        "primary_treatment": f"Standard management of {findings[0]}" if findings else "Supportive care",
+        "medications": [
+            {"name": name, "dosage": "as prescribed", "frequency": "daily",
+             "duration": "ongoing", "rationale": "Documented in note"}
+            for name in _medications(text)
+        ],
+        "non_pharmacological": ["Patient education", "Regular monitoring"],
+        "monitoring_requirements": "Monitor vital signs and symptoms each shift",
+        "patient_education": ["Report worsening symptoms"],
+        "red_flags": [f"Worsening {finding}" for finding in findings[:2]],
+        "follow_up_timeline": "1-2 weeks"
+    }
+
+
+def _entity_response(text: str) -> Dict:
+    findings = _findings(text)
+    return {
+        "conditions": [f for f in findings if f in ("hypertension", "diabetes", "infection")],
+        "symptoms": [f for f in findings if f not in ("hypertension", "diabetes", "infection")],
+        "medications": _medications(text),
+        "procedures": [p for p in ("ECG", "CT", "MRI", "X-ray") if p.lower() in text.lower()],
+        "vital_signs": _vitals(text),
+        "lab_results": []
+    }
@@ -0,0 +1,302 @@
+"""
+Provider-aware LLM request scheduler
+Every LLM call goes through a process-wide scheduler that enforces token-bucket
+limits for requests and tokens per minute, dispatches by priority class
+(interactive > urgent risk > batch backfill) and round-robins between users
+within a class so one user's batch cannot starve everyone else.
+
+Callers tag their work with `llm_request_context(priority, user_id)`; the
+priority and user are carried in context variables down to MedicalAIService.
+Limits are per process, so set LLM_MAX_RPM / LLM_MAX_TPM to the provider quota
+divided by the number of API and worker processes.
+"""
+import os
+import time
+import enum
+import asyncio
+import threading
+import contextvars
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional
+
+# Provider defaults (requests per minute, tokens per minute); 0 means unlimited
+PROVIDER_LIMITS = {
+    "openai": (500, 200_000),
+    "fake": (0, 0),
+}
+DEFAULT_COMPLETION_TOKENS = 800
+CHARS_PER_TOKEN = 4
+# Longest sleep between admission checks of a coroutine waiting in the queue
+ASYNC_POLL_SECONDS = 0.05
+
+
+class Priority(enum.IntEnum):
+    INTERACTIVE = 0  # Clinician waiting on the response
+    URGENT = 1       # Risk assessments that drive alerts
+    BATCH = 2        # Backfills and scheduled sweeps
+
+
+_priority_var = contextvars.ContextVar("llm_priority", default=Priority.INTERACTIVE)
+_user_var = contextvars.ContextVar("llm_user_id", default=None)
+
+
+@contextmanager
+def llm_request_context(priority: Priority = Priority.INTERACTIVE, user_id: Optional[int] = None):
+    """Tag LLM calls made inside the block with a priority class and user"""
+    priority_token = _priority_var.set(priority)
+    user_token = _user_var.set(user_id)
+    try:
+        yield
+    finally:
+        _priority_var.reset(priority_token)
+        _user_var.reset(user_token)
+
+
+def iterate_in_llm_context(events: Iterator, priority: Priority, user_id: Optional[int] = None) -> Iterator:
+    """
+    Drive a generator with the LLM context applied to each step.
+    Streaming responses advance generators from worker threads with a fresh
+    context per step, so a context set once around the generator is lost.
+    """
+    while True:
+        with llm_request_context(priority, user_id):
+            try:
+                event = next(events)
+            except StopIteration:
+                return
+        yield event
+
+
+def estimate_tokens(messages, completion_tokens: int = DEFAULT_COMPLETION_TOKENS) -> int:
+    """Rough prompt + completion token estimate (~4 characters per token)"""
+    prompt_chars = sum(len(getattr(m, "content", str(m))) for m in messages)
+    return prompt_chars // CHARS_PER_TOKEN + completion_tokens
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `per_minute` with a one-minute burst capacity"""
+
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.per_minute <= 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.per_minute / 60.0)
+        self.updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Seconds until `amount` can be consumed (0 if available now)"""
+        if self.unlimited:
+            return 0.0
+        self._refill()
+        # Requests larger than the whole bucket are allowed once it is full
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60.0 / self.per_minute
+
+    def consume(self, amount: float):
+        if not self.unlimited:
+            self._refill()
+            self.tokens -= amount
+
+    def drain(self):
+        """Empty the bucket, e.g. after the provider answered 429"""
+        if not self.unlimited:
+            self._refill()
+            self.tokens = min(self.tokens, 0.0)
+
+
+class _Ticket:
+    __slots__ = ("priority", "user_id", "tokens", "enqueued_at")
+
+    def __init__(self, priority: Priority, user_id, tokens: int):
+        self.priority = priority
+        self.user_id = user_id
+        self.tokens = tokens
+        self.enqueued_at = time.monotonic()
+
+
+class LLMScheduler:
+    """Priority + fair-share admission control in front of one provider"""
+
+    def __init__(self, provider: str, max_rpm: int, max_tpm: int, wait_samples: int = 1000):
+        self.provider = provider
+        self.requests = TokenBucket(max_rpm)
+        self.tokens = TokenBucket(max_tpm)
+        self._cond = threading.Condition()
+        # priority -> user_id -> deque of tickets; OrderedDict order is the round-robin order
+        self._queues: Dict[Priority, "OrderedDict[object, deque]"] = {p: OrderedDict() for p in Priority}
+        self._waits: Dict[Priority, deque] = {p: deque(maxlen=wait_samples) for p in Priority}
+        self._dispatched = {p: 0 for p in Priority}
+        self._rate_limited = 0
+
+    def run(self, call: Callable, messages, completion_tokens: int = DEFAULT_COMPLETION_TOKENS):
+        """Wait for admission, then run `call()`; reconciles token usage afterwards"""
+        estimate = estimate_tokens(messages, completion_tokens)
+        self.acquire(estimate)
+        try:
+            response = call()
+        except Exception as e:
+            if getattr(e, "status_code", None) == 429 or "rate limit" in str(e).lower():
+                self.report_rate_limited()
+            raise
+        self._reconcile(response, estimate)
+        return response
+
+    async def arun(self, call: Callable[[], Awaitable], messages, completion_tokens: int = DEFAULT_COMPLETION_TOKENS):
+        """run() for coroutines: waits for admission without blocking the event loop"""
+        estimate = estimate_tokens(messages, completion_tokens)
+        await self.aacquire(estimate)
+        try:
+            response = await call()
+        except Exception as e:
+            if getattr(e, "status_code", None) == 429 or "rate limit" in str(e).lower():
+                self.report_rate_limited()
+            raise
+        self._reconcile(response, estimate)
+        return response
+
+    def acquire(self, estimated_tokens: int, priority: Optional[Priority] = None, user_id=None):
+        """Block until this request may be sent"""
+        ticket = self._enqueue(estimated_tokens, priority, user_id)
+        with self._cond:
+            while True:
+                wait = self._try_dispatch(ticket)
+                if wait <= 0:
+                    return
+                self._cond.wait(timeout=wait)
+
+    async def aacquire(self, estimated_tokens: int, priority: Optional[Priority] = None, user_id=None):
+        """acquire() for coroutines; polls instead of waiting on the condition"""
+        ticket = self._enqueue(estimated_tokens, priority, user_id)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_dispatch(ticket)
+                if wait <= 0:
+                    return
+                await asyncio.sleep(min(wait, ASYNC_POLL_SECONDS))
+        except asyncio.CancelledError:
+            # A cancelled waiter must not stay at the head of its queue
+            with self._cond:
+                self._abandon(ticket)
+            raise
+
+    def report_rate_limited(self):
+        """The provider rejected a request; stop sending until the buckets refill"""
+        with self._cond:
+            self._rate_limited += 1
+            self.requests.drain()
+            self.tokens.drain()
+
+    def metrics(self) -> Dict:
+        """Queue depth, dispatch counts and queue-wait distribution per priority class"""
+        with self._cond:
+            by_priority = {}
+            for priority in Priority:
+                waits = sorted(self._waits[priority])
+                by_priority[priority.name.lower()] = {
+                    "queued": sum(len(q) for q in self._queues[priority].values()),
+                    "dispatched": self._dispatched[priority],
+                    "wait_p50_ms": round(waits[len(waits) // 2] * 1000, 1) if waits else 0.0,
+                    "wait_p95_ms": round(waits[int(len(waits) * 0.95)] * 1000, 1) if waits else 0.0,
+                    "wait_max_ms": round(waits[-1] * 1000, 1) if waits else 0.0,
+                }
+            return {
+                "provider": self.provider,
+                "max_rpm": self.requests.per_minute,
+                "max_tpm": self.tokens.per_minute,
+                "rate_limited": self._rate_limited,
+                "priorities": by_priority,
+            }
+
+    def _enqueue(self, estimated_tokens: int, priority: Optional[Priority], user_id) -> _Ticket:
+        priority = _priority_var.get() if priority is None else priority
+        user_id = _user_var.get() if user_id is None else user_id
+        ticket = _Ticket(priority, user_id, estimated_tokens)
+        with self._cond:
+            self._queues[priority].setdefault(user_id, deque()).append(ticket)
+        return ticket
+
+    def _try_dispatch(self, ticket: _Ticket) -> float:
+        """Dispatch the ticket if it is next and the buckets allow; otherwise seconds to wait (lock held)"""
+        if self._head() is not ticket:
+            return 1.0
+        wait = max(self.requests.time_until(1), self.tokens.time_until(ticket.tokens))
+        if wait <= 0:
+            self._dispatch(ticket)
+        return wait
+
+    def _abandon(self, ticket: _Ticket):
+        users = self._queues[ticket.priority]
+        user_queue = users.get(ticket.user_id)
+        if user_queue and ticket in user_queue:
+            user_queue.remove(ticket)
+            if not user_queue:
+                del users[ticket.user_id]
+            self._cond.notify_all()
+
+    def _head(self) -> Optional[_Ticket]:
+        """Next ticket to dispatch: highest priority class, round-robin across users"""
+        for priority in Priority:
+            users = self._queues[priority]
+            if users:
+                return users[next(iter(users))][0]
+        return None
+
+    def _dispatch(self, ticket: _Ticket):
+        users = self._queues[ticket.priority]
+        user_queue = users[ticket.user_id]
+        user_queue.popleft()
+        # Move this user to the back of the round-robin order (or drop them if drained)
+        del users[ticket.user_id]
+        if user_queue:
+            users[ticket.user_id] = user_queue
+
+        self.requests.consume(1)
+        self.tokens.consume(ticket.tokens)
+        self._dispatched[ticket.priority] += 1
+        self._waits[ticket.priority].append(time.monotonic() - ticket.enqueued_at)
+        self._cond.notify_all()
+
+    def _reconcile(self, response, estimate: int):
+        """Charge the token bucket for actual usage when the provider reports it"""
+        usage = getattr(response, "usage_metadata", None) or {}
+        actual = usage.get("total_tokens") if isinstance(usage, dict) else None
+        if actual:
+            with self._cond:
+                self.tokens.consume(actual - estimate)
+
+
+_schedulers: Dict[str, LLMScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(provider: str) -> LLMScheduler:
+    """Process-wide scheduler for a provider, configured from LLM_MAX_RPM / LLM_MAX_TPM"""
+    with _schedulers_lock:
+        if provider not in _schedulers:
+            default_rpm, default_tpm = PROVIDER_LIMITS.get(provider, (0, 0))
+            if provider == "fake":
+                default_rpm = int(os.getenv("FAKE_LLM_MAX_RPM", "0"))
+            _schedulers[provider] = LLMScheduler(
+                provider,
+                max_rpm=int(os.getenv("LLM_MAX_RPM", default_rpm)),
+                max_tpm=int(os.getenv("LLM_MAX_TPM", default_tpm)),
+            )
+        return _schedulers[provider]
+
+
+def all_scheduler_metrics() -> List[Dict]:
+    with _schedulers_lock:
+        schedulers = list(_schedulers.values())
+    return [scheduler.metrics() for scheduler in schedulers]
@@ -0,0 +1,113 @@
+"""
+Post-commit AI pipeline trigger for notes
+Session hooks record notes whose content, type or status changed in a flush
+and, once the transaction commits, hand them to a background thread that
+queues the Celery pipeline (summarize + risk state -> alert -> embed). The
+write endpoint returns as soon as its commit finishes.
+
+Rapid edits are debounced: each event bumps a per-note revision in Redis and
+schedules the pipeline AI_PIPELINE_DEBOUNCE_S later; a run whose revision is no
+longer the latest drops out, so only the last edit in a burst is processed.
+Finalizing a note runs the pipeline without waiting.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+import redis
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from api.models.note import Note, NoteStatus
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+AI_AUTO_PIPELINE = os.getenv("AI_AUTO_PIPELINE", "true").lower() == "true"
+DEBOUNCE_SECONDS = float(os.getenv("AI_PIPELINE_DEBOUNCE_S", "30"))
+REVISION_TTL_SECONDS = 24 * 3600
+
+# Attributes whose change makes the note's AI output stale
+TRIGGER_ATTRIBUTES = ("content", "note_type", "status")
+_SESSION_KEY = "ai_note_events"
+
+# Queueing talks to the broker; keep it off the request thread
+_dispatch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="note-events")
+_redis_client: Optional[redis.Redis] = None
+
+
+def get_redis() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(REDIS_URL, socket_timeout=2, socket_connect_timeout=2)
+    return _redis_client
+
+
+def _revision_key(note_id: int) -> str:
+    return f"ai:note-pipeline:{note_id}"
+
+
+def latest_revision(note_id: int) -> Optional[int]:
+    """Revision of the most recent event for a note"""
+    value = get_redis().get(_revision_key(note_id))
+    return int(value) if value is not None else None
+
+
+def schedule_note_pipeline(note_id: int, reason: str):
+    """Bump the note's revision and queue a debounced pipeline run for it"""
+    from api.tasks.ai_tasks import run_note_pipeline
+
+    client = get_redis()
+    key = _revision_key(note_id)
+    revision = client.incr(key)
+    client.expire(key, REVISION_TTL_SECONDS)
+    countdown = 0 if reason == "finalized" else DEBOUNCE_SECONDS
+    run_note_pipeline.apply_async(args=[note_id, revision], countdown=countdown)
+
+
+def _event_reason(note: Note, is_new: bool) -> Optional[str]:
+    if is_new:
+        return "created"
+    state = inspect(note)
+    status_history = state.attrs.status.history
+    if status_history.has_changes() and note.status == NoteStatus.FINALIZED:
+        return "finalized"
+    if any(state.attrs[name].history.has_changes() for name in TRIGGER_ATTRIBUTES):
+        return "updated"
+    return None
+
+
+def _after_flush(session: Session, flush_context):
+    # new/dirty and attribute history still describe this flush here
+    pending: Dict[int, str] = session.info.setdefault(_SESSION_KEY, {})
+    for obj, is_new in [(o, True) for o in session.new] + [(o, False) for o in session.dirty]:
+        if isinstance(obj, Note):
+            reason = _event_reason(obj, is_new)
+            if reason and pending.get(obj.id) != "finalized":
+                pending[obj.id] = reason
+
+
+def _after_commit(session: Session):
+    pending = session.info.pop(_SESSION_KEY, None)
+    for note_id, reason in (pending or {}).items():
+        _dispatch_executor.submit(_dispatch, note_id, reason)
+
+
+def _after_rollback(session: Session):
+    session.info.pop(_SESSION_KEY, None)
+
+
+def _dispatch(note_id: int, reason: str):
+    try:
+        schedule_note_pipeline(note_id, reason)
+    except Exception as e:
+        print(f"⚠️ Could not queue AI pipeline for note {note_id}: {e}")
+
+
+def register_note_events(session_factory) -> bool:
+    """Attach the post-commit hooks to a sessionmaker (no-op when AI_AUTO_PIPELINE=false)"""
+    if not AI_AUTO_PIPELINE:
+        return False
+    if not event.contains(session_factory, "after_commit", _after_commit):
+        event.listen(session_factory, "after_flush", _after_flush)
+        event.listen(session_factory, "after_commit", _after_commit)
+        event.listen(session_factory, "after_rollback", _after_rollback)
+    return True
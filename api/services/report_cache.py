@@ -0,0 +1,215 @@
+"""
+Risk report cache with data versions and stale-while-revalidate
+Reports are cached per patient and trend window together with the patient's
+data version: the latest note write, the note count and the patient's own
+last update. Any note or patient write changes the version, so a cached report
+is fresh only while nothing it was built from has changed.
+
+A report whose version is out of date is still served (marked stale) for up to
+RISK_REPORT_MAX_STALE_S while one background refresh rebuilds it; older or
+missing entries are rebuilt before responding. Entries live in Redis so every
+API process and worker shares them (RISK_REPORT_CACHE=memory keeps them in
+process, =off disables caching).
+"""
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from api.models.note import Note
+from api.models.patient import Patient
+
+CACHE_BACKEND = os.getenv("RISK_REPORT_CACHE", "redis").lower()
+CACHE_TTL_SECONDS = int(os.getenv("RISK_REPORT_CACHE_TTL_S", str(24 * 3600)))
+MAX_STALE_SECONDS = int(os.getenv("RISK_REPORT_MAX_STALE_S", "900"))
+REFRESH_LOCK_SECONDS = 120
+
+FRESH, STALE, MISS, BYPASS = "fresh", "stale", "miss", "bypass"
+
+# Background refreshes run here so a stale response returns immediately
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="risk-report-refresh")
+
+
+def patient_data_version(db: Session, patient_id: int) -> Optional[str]:
+    """Version of everything a patient's risk report is built from, or None if the patient does not exist"""
+    note_filter = Note.patient_id == patient_id
+    row = db.execute(select(
+        select(func.coalesce(Patient.updated_at, Patient.created_at))
+        .where(Patient.id == patient_id).scalar_subquery(),
+        select(func.max(func.coalesce(Note.updated_at, Note.created_at)))
+        .where(note_filter).scalar_subquery(),
+        select(func.count(Note.id)).where(note_filter).scalar_subquery(),
+    )).one()
+    patient_changed, notes_changed, note_count = row
+    if patient_changed is None:
+        return None
+    return f"{patient_changed}|{notes_changed}|{note_count}"
+
+
+class _MemoryStore:
+    def __init__(self):
+        self._entries: Dict[str, Tuple[float, str]] = {}
+        self._locks: Dict[str, float] = {}
+        self._mutex = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._mutex:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.time():
+                return entry[1]
+            return None
+
+    def set(self, key: str, value: str, ttl: int):
+        with self._mutex:
+            self._entries[key] = (time.time() + ttl, value)
+
+    def acquire(self, key: str, ttl: int) -> bool:
+        with self._mutex:
+            if self._locks.get(key, 0) > time.time():
+                return False
+            self._locks[key] = time.time() + ttl
+            return True
+
+    def release(self, key: str):
+        with self._mutex:
+            self._locks.pop(key, None)
+
+
+class _RedisStore:
+    def __init__(self):
+        from api.services.note_events import get_redis
+        self._client = get_redis
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._client().get(key)
+        return value.decode() if isinstance(value, bytes) else value
+
+    def set(self, key: str, value: str, ttl: int):
+        self._client().set(key, value, ex=ttl)
+
+    def acquire(self, key: str, ttl: int) -> bool:
+        return bool(self._client().set(key, "1", nx=True, ex=ttl))
+
+    def release(self, key: str):
+        self._client().delete(key)
+
+
+class RiskReportCache:
+    """Versioned report cache; lookups fall back to building the report when the store is unreachable"""
+
+    def __init__(self, backend: str = CACHE_BACKEND):
+        self.enabled = backend != "off"
+        self._store = _MemoryStore() if backend == "memory" else _RedisStore()
+        self.hits = {FRESH: 0, STALE: 0, MISS: 0, BYPASS: 0}
+
+    @staticmethod
+    def _key(patient_id: int, variant: str) -> str:
+        return f"risk-report:{patient_id}:{variant}"
+
+    def get_or_build(self, db: Session, patient_id: int, variant: str, build: Callable[[Session], Dict],
+                     background_build: Callable[[], Dict], refresh: bool = False,
+                     allow_stale: bool = True) -> Tuple[Dict, Dict]:
+        """
+        Cached report for the patient plus cache metadata. `build(db)` runs
+        inline on a miss; `background_build()` (own session) refreshes a
+        stale entry after the stale report has been returned. With
+        allow_stale=False an out-of-date entry is rebuilt inline instead.
+        """
+        version = patient_data_version(db, patient_id)
+        key = self._key(patient_id, variant)
+        entry = None if refresh or not self.enabled else self._read(key)
+
+        if entry and entry["version"] == version:
+            return self._serve(entry, FRESH, version)
+        if allow_stale and entry and time.time() - entry["cached_at"] <= MAX_STALE_SECONDS:
+            refreshing = self._refresh_in_background(key, background_build)
+            return self._serve(entry, STALE, version, refreshing=refreshing)
+
+        report = build(db)
+        self.store(patient_id, variant, version, report)
+        status = BYPASS if refresh or not self.enabled else MISS
+        self.hits[status] += 1
+        return report, {"status": status, "data_version": version}
+
+    def lookup_fresh(self, db: Session, patient_id: int, variant: str) -> Optional[Dict]:
+        """Cached report only if it is current"""
+        if not self.enabled:
+            return None
+        entry = self._read(self._key(patient_id, variant))
+        if entry and entry["version"] == patient_data_version(db, patient_id):
+            self.hits[FRESH] += 1
+            return entry["report"]
+        return None
+
+    def store(self, patient_id: int, variant: str, version: Optional[str], report: Dict):
+        """Cache a report built from data at `version`; error and provisional reports are not cached"""
+        if not self.enabled or version is None or "error" in report or report.get("provisional"):
+            return
+        entry = {"version": version, "cached_at": time.time(), "report": report}
+        try:
+            self._store.set(self._key(patient_id, variant), json.dumps(entry, default=str), CACHE_TTL_SECONDS)
+        except Exception as e:
+            print(f"⚠️ Risk report cache write failed: {e}")
+
+    def metrics(self) -> Dict:
+        return {"enabled": self.enabled, "backend": CACHE_BACKEND, "lookups": dict(self.hits)}
+
+    def _read(self, key: str) -> Optional[Dict]:
+        try:
+            raw = self._store.get(key)
+        except Exception as e:
+            print(f"⚠️ Risk report cache read failed: {e}")
+            return None
+        return json.loads(raw) if raw else None
+
+    def _serve(self, entry: Dict, status: str, version: Optional[str], refreshing: bool = False) -> Tuple[Dict, Dict]:
+        self.hits[status] += 1
+        meta = {
+            "status": status,
+            "data_version": version,
+            "cached_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(entry["cached_at"])),
+        }
+        if status == STALE:
+            meta["refreshing"] = refreshing
+        return entry["report"], meta
+
+    def _refresh_in_background(self, key: str, background_build: Callable[[], Dict]) -> bool:
+        """Start one refresh per key across processes; True when a refresh is (now) in flight"""
+        lock_key = f"{key}:refreshing"
+        try:
+            if not self._store.acquire(lock_key, REFRESH_LOCK_SECONDS):
+                return True
+        except Exception:
+            return False
+
+        def run():
+            try:
+                background_build()
+            except Exception as e:
+                print(f"⚠️ Background risk report refresh failed: {e}")
+            finally:
+                try:
+                    self._store.release(lock_key)
+                except Exception:
+                    pass
+
+        _refresh_executor.submit(run)
+        return True
+
+
+_default_cache: Optional[RiskReportCache] = None
+_default_lock = threading.Lock()
+
+
+def get_report_cache() -> RiskReportCache:
+    """Process-wide risk report cache"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = RiskReportCache()
+        return _default_cache
@@ -0,0 +1,114 @@
+"""
+Materialized per-patient risk state
+The AI pipeline refreshes a patient's row in patient_risk_state whenever one of
+their notes gets a new risk level, so census and list views read one indexed
+table instead of re-deriving risk from notes or calling the model per patient.
+
+The level is the highest level among the patient's most recent assessed notes;
+the score is a recency-weighted average of those levels on a 0-100 scale, and
+the trend compares it with the score of the previous assessment. A refresh
+over the same notes and levels (the sweep, a rerun) changes nothing, so it
+does not reset the trend.
+"""
+import json
+from typing import Dict, Optional
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from api.models.note import Note
+from api.models.risk_state import PatientRiskState
+
+RISK_LEVEL_POINTS = {"LOW": 20.0, "MEDIUM": 50.0, "HIGH": 80.0, "CRITICAL": 100.0}
+RECENT_NOTES = 5
+# Each older note counts this much less than the one after it
+RECENCY_DECAY = 0.7
+# Score change that counts as a trend rather than noise
+TREND_THRESHOLD = 5.0
+
+
+def refresh_patient_risk_state(db: Session, patient_id: int) -> Optional[PatientRiskState]:
+    """
+    Recompute one patient's risk state from their recent assessed notes.
+    The caller commits; unflushed note changes must be flushed first.
+    """
+    recent = db.query(Note.id, Note.risk_level).filter(
+        Note.patient_id == patient_id,
+        Note.risk_level.in_(list(RISK_LEVEL_POINTS))
+    ).order_by(Note.created_at.desc(), Note.id.desc()).limit(RECENT_NOTES).all()
+
+    state = db.get(PatientRiskState, patient_id)
+    if not recent:
+        if state is not None:
+            db.delete(state)
+        return None
+
+    levels = [row.risk_level for row in recent]
+    weights = [RECENCY_DECAY ** i for i in range(len(levels))]
+    score = round(sum(RISK_LEVEL_POINTS[level] * w for level, w in zip(levels, weights)) / sum(weights), 1)
+    level = max(levels, key=RISK_LEVEL_POINTS.get)
+    note_ids = json.dumps([row.id for row in recent])
+
+    if state is not None and state.contributing_note_ids == note_ids and state.risk_score == score:
+        return state
+
+    previous_score = state.risk_score if state is not None else None
+    if previous_score is None:
+        trend = None
+    elif score - previous_score >= TREND_THRESHOLD:
+        trend = "increasing"
+    elif previous_score - score >= TREND_THRESHOLD:
+        trend = "decreasing"
+    else:
+        trend = "stable"
+
+    values = {
+        "risk_level": level,
+        "risk_score": score,
+        "previous_risk_score": previous_score,
+        "trend": trend,
+        "contributing_note_ids": note_ids,
+        "last_assessed_at": func.now(),
+    }
+    _upsert_state(db, patient_id, values)
+    return db.get(PatientRiskState, patient_id, populate_existing=True)
+
+
+def _upsert_state(db: Session, patient_id: int, values: Dict):
+    """
+    Write the row with INSERT ... ON CONFLICT, so two workers assessing a
+    patient for the first time at once do not fail (and roll back) on the
+    primary key
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        statement = insert(PatientRiskState).values(patient_id=patient_id, **values)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[PatientRiskState.patient_id],
+            set_={**values, "updated_at": func.now()},
+        ))
+        return
+    state = db.get(PatientRiskState, patient_id)
+    if state is None:
+        state = PatientRiskState(patient_id=patient_id)
+        db.add(state)
+    for column, value in values.items():
+        setattr(state, column, value)
+
+
+def risk_state_summary(state: Optional[PatientRiskState]) -> Optional[Dict]:
+    """Plain dict of a risk state, e.g. for task results"""
+    if state is None:
+        return None
+    note_ids = json.loads(state.contributing_note_ids or "[]")
+    return {
+        "patient_id": state.patient_id,
+        "risk_level": state.risk_level,
+        "risk_score": state.risk_score,
+        "previous_risk_score": state.previous_risk_score,
+        "trend": state.trend,
+        "contributing_note_ids": note_ids,
+        "latest_note_id": note_ids[0] if note_ids else None,
+    }
@@ -0,0 +1,190 @@
+"""
+Nightly population-wide risk sweep
+Every patient with notes written in the last RISK_SWEEP_ACTIVITY_DAYS gets a
+fresh risk report once a night, so morning rounds open on scores computed
+overnight instead of waiting on the model.
+
+A sweep walks patients in id order, RISK_SWEEP_CHUNK_SIZE at a time; the chunk
+is the unit of parallelism, so at most that many assessments are in flight.
+Progress lives in the risk_sweeps row (a cursor below which every patient is
+done) and in one risk_sweep_results row per patient, so a sweep interrupted by
+a worker restart resumes after its last finished chunk and skips patients it
+already assessed.
+"""
+import os
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from api.models.note import Note
+from api.models.risk_sweep import RiskSweep, RiskSweepResult
+
+SWEEP_HOUR_UTC = int(os.getenv("RISK_SWEEP_HOUR_UTC", "2"))
+ACTIVITY_DAYS = int(os.getenv("RISK_SWEEP_ACTIVITY_DAYS", "7"))
+CHUNK_SIZE = int(os.getenv("RISK_SWEEP_CHUNK_SIZE", "10"))
+# A running sweep without progress for this long is assumed interrupted
+STALL_SECONDS = int(os.getenv("RISK_SWEEP_STALL_S", "1800"))
+
+RUNNING, COMPLETED, FAILED = "running", "completed", "failed"
+
+RISK_LEVEL_ORDER = {"CRITICAL": 0, "HIGH": 1, "MEDIUM": 2, "LOW": 3}
+
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    # SQLite hands back naive UTC timestamps
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _active_patients(db: Session, since: datetime):
+    return db.query(Note.patient_id).filter(
+        or_(Note.created_at >= since, Note.updated_at >= since)
+    ).distinct()
+
+
+def latest_sweep(db: Session) -> Optional[RiskSweep]:
+    return db.query(RiskSweep).order_by(RiskSweep.id.desc()).first()
+
+
+def next_sweep_action(db: Session, force: bool = False, now: Optional[datetime] = None) -> Tuple[str, Optional[RiskSweep]]:
+    """
+    What the scheduler should do now: "start" a new sweep, "resume" a stalled
+    one, leave a live one "running", or stay "idle" until the next nightly slot.
+    """
+    now = now or datetime.now(timezone.utc)
+    running = db.query(RiskSweep).filter(RiskSweep.status == RUNNING).order_by(RiskSweep.id.desc()).first()
+    if running is not None:
+        stalled = now - _utc(running.heartbeat_at) > timedelta(seconds=STALL_SECONDS)
+        return ("resume" if stalled else "running"), running
+
+    latest = latest_sweep(db)
+    due_at = now.replace(hour=SWEEP_HOUR_UTC, minute=0, second=0, microsecond=0)
+    if now < due_at:
+        due_at -= timedelta(days=1)
+    if force or latest is None or _utc(latest.started_at) < due_at:
+        return "start", None
+    return "idle", latest
+
+
+def start_sweep(db: Session, now: Optional[datetime] = None) -> RiskSweep:
+    """Create a sweep over patients with recent note activity (committed)"""
+    now = now or datetime.now(timezone.utc)
+    since = now - timedelta(days=ACTIVITY_DAYS)
+    sweep = RiskSweep(
+        status=RUNNING,
+        activity_since=since,
+        cursor_patient_id=0,
+        total_patients=_active_patients(db, since).count(),
+    )
+    db.add(sweep)
+    db.commit()
+    db.refresh(sweep)
+    return sweep
+
+
+def touch_sweep(sweep: RiskSweep):
+    sweep.heartbeat_at = func.now()
+
+
+def next_chunk(db: Session, sweep: RiskSweep, size: int = CHUNK_SIZE) -> List[int]:
+    """Next patients after the cursor that this sweep has not assessed yet"""
+    done = db.query(RiskSweepResult.patient_id).filter(RiskSweepResult.sweep_id == sweep.id)
+    rows = _active_patients(db, sweep.activity_since).filter(
+        Note.patient_id > sweep.cursor_patient_id,
+        Note.patient_id.notin_(done)
+    ).order_by(Note.patient_id).limit(size).all()
+    return [row.patient_id for row in rows]
+
+
+def record_result(db: Session, sweep_id: int, patient_id: int, report: Optional[Dict] = None,
+                  error: Optional[str] = None) -> bool:
+    """Store one patient's outcome; False if the sweep already has it"""
+    error = error or (report or {}).get("error")
+    result = RiskSweepResult(
+        sweep_id=sweep_id,
+        patient_id=patient_id,
+        status=FAILED if error else COMPLETED,
+        risk_level=None if error else report.get("risk_level"),
+        report=None if error else json.dumps(report, default=str),
+        error=error,
+    )
+    db.add(result)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return False
+    return True
+
+
+def advance_sweep(db: Session, sweep_id: int, from_cursor: int, to_cursor: int) -> bool:
+    """
+    Move the cursor past a finished chunk and refresh the counters. Only the
+    chunk started from the current cursor may advance it, so a late chunk from
+    before a resume is ignored. The caller commits.
+    """
+    advanced = db.query(RiskSweep).filter(
+        RiskSweep.id == sweep_id,
+        RiskSweep.status == RUNNING,
+        RiskSweep.cursor_patient_id == from_cursor
+    ).update({RiskSweep.cursor_patient_id: to_cursor, RiskSweep.heartbeat_at: func.now()},
+             synchronize_session=False)
+    if not advanced:
+        return False
+
+    counts = dict(db.query(RiskSweepResult.status, func.count(RiskSweepResult.id)).filter(
+        RiskSweepResult.sweep_id == sweep_id
+    ).group_by(RiskSweepResult.status).all())
+    db.query(RiskSweep).filter(RiskSweep.id == sweep_id).update({
+        RiskSweep.assessed_patients: counts.get(COMPLETED, 0),
+        RiskSweep.failed_patients: counts.get(FAILED, 0),
+    }, synchronize_session=False)
+    return True
+
+
+def complete_sweep(sweep: RiskSweep):
+    sweep.status = COMPLETED
+    sweep.finished_at = func.now()
+    touch_sweep(sweep)
+
+
+def sweep_summary(sweep: Optional[RiskSweep]) -> Optional[Dict]:
+    if sweep is None:
+        return None
+    return {
+        "sweep_id": sweep.id,
+        "status": sweep.status,
+        "activity_since": sweep.activity_since,
+        "total_patients": sweep.total_patients,
+        "assessed_patients": sweep.assessed_patients,
+        "failed_patients": sweep.failed_patients,
+        "cursor_patient_id": sweep.cursor_patient_id,
+        "started_at": sweep.started_at,
+        "heartbeat_at": sweep.heartbeat_at,
+        "finished_at": sweep.finished_at,
+    }
+
+
+def sweep_results(db: Session, sweep_id: int, risk_level: Optional[str] = None, limit: int = 100) -> List[Dict]:
+    """A sweep's per-patient results, highest risk first"""
+    query = db.query(RiskSweepResult).filter(RiskSweepResult.sweep_id == sweep_id)
+    if risk_level:
+        query = query.filter(RiskSweepResult.risk_level == risk_level.upper())
+    level_rank = case(RISK_LEVEL_ORDER, value=RiskSweepResult.risk_level, else_=len(RISK_LEVEL_ORDER))
+    results = query.order_by(level_rank, RiskSweepResult.patient_id).limit(limit).all()
+    return [
+        {
+            "patient_id": r.patient_id,
+            "status": r.status,
+            "risk_level": r.risk_level,
+            "assessed_at": r.assessed_at,
+            "report": json.loads(r.report) if r.report else None,
+            "error": r.error,
+        }
+        for r in results
+    ]
@@ -0,0 +1,115 @@
+"""
+Risk trend time series computed in the database
+Notes are bucketed by day, week or month and counted per risk level in one
+GROUP BY query (date_trunc on PostgreSQL, strftime/date on SQLite), so only one
+row per period leaves the database however long the patient's history is.
+Periods without notes are filled in, giving a gap-free series oldest first.
+"""
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy import case, func, literal_column
+from sqlalchemy.orm import Session
+
+from api.models.note import Note
+
+TREND_WINDOWS = ("day", "week", "month")
+DEFAULT_WINDOW = "week"
+DEFAULT_PERIODS = 4
+MAX_PERIODS = 366
+
+HIGH_RISK_LEVELS = ("HIGH", "CRITICAL")
+
+
+def _period_start(day: date, window: str) -> date:
+    if window == "week":
+        return day - timedelta(days=day.weekday())
+    if window == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _previous_period(start: date, window: str) -> date:
+    if window == "week":
+        return start - timedelta(weeks=1)
+    if window == "month":
+        return (start - timedelta(days=1)).replace(day=1)
+    return start - timedelta(days=1)
+
+
+def _bucket_expression(db: Session, window: str):
+    """SQL expression giving the start of the note's period"""
+    if db.get_bind().dialect.name == "sqlite":
+        if window == "week":
+            # Monday of the week: forward to Sunday (or stay on it), then back six days
+            return func.date(Note.created_at, "weekday 0", "-6 days")
+        if window == "month":
+            return func.strftime("%Y-%m-01", Note.created_at)
+        return func.date(Note.created_at)
+    # Inline the (whitelisted) unit so SELECT and GROUP BY render the same expression
+    return func.date_trunc(literal_column(f"'{window}'"), Note.created_at)
+
+
+def _as_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def risk_trend_series(db: Session, patient_id: int, window: str = DEFAULT_WINDOW,
+                      periods: int = DEFAULT_PERIODS) -> List[Dict]:
+    """
+    Per-period note counts by risk level for the last `periods` windows,
+    including the current one, oldest first.
+    """
+    if window not in TREND_WINDOWS:
+        raise ValueError(f"window must be one of: {', '.join(TREND_WINDOWS)}")
+    periods = max(1, min(periods, MAX_PERIODS))
+
+    starts = [_period_start(date.today(), window)]
+    for _ in range(periods - 1):
+        starts.append(_previous_period(starts[-1], window))
+    starts.reverse()
+
+    bucket = _bucket_expression(db, window).label("period_start")
+    rows = db.query(
+        bucket,
+        func.count(Note.id).label("total_notes"),
+        func.sum(case((Note.risk_level.in_(HIGH_RISK_LEVELS), 1), else_=0)).label("high_risk_notes"),
+        func.sum(case((Note.risk_level == "MEDIUM", 1), else_=0)).label("medium_risk_notes"),
+        func.sum(case((Note.risk_level == "LOW", 1), else_=0)).label("low_risk_notes"),
+    ).filter(
+        Note.patient_id == patient_id,
+        Note.created_at >= datetime.combine(starts[0], datetime.min.time())
+    ).group_by(bucket).all()
+
+    counts = {_as_date(row.period_start): row for row in rows}
+    series = []
+    previous_share = None
+    for start in starts:
+        row = counts.get(start)
+        total = row.total_notes if row else 0
+        high = int(row.high_risk_notes or 0) if row else 0
+        entry = {
+            "period_start": start.isoformat(),
+            "total_notes": total,
+            "high_risk_notes": high,
+            "medium_risk_notes": int(row.medium_risk_notes or 0) if row else 0,
+            "low_risk_notes": int(row.low_risk_notes or 0) if row else 0,
+        }
+        # Direction of the high-risk share against the last period that had notes
+        share = high / total if total else None
+        if share is None or previous_share is None:
+            entry["risk_trend"] = "increasing" if high else "stable"
+        elif share > previous_share:
+            entry["risk_trend"] = "increasing"
+        elif share < previous_share:
+            entry["risk_trend"] = "decreasing"
+        else:
+            entry["risk_trend"] = "stable"
+        if share is not None:
+            previous_share = share
+        series.append(entry)
+    return series
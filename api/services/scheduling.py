@@ -0,0 +1,216 @@
+"""
+Appointment conflicts and free-slot search
+An appointment books its location and, when set, its clinician for the
+half-open interval [start_time, end_time); cancelled appointments book
+nothing. On Postgres exclusion constraints on the booked range enforce this
+(see api/models/appointment.py); prepare_booking() looks the clashes up first
+so the API can name them, and is the only check on other databases.
+
+Times are stored in UTC. Overlap queries are bounded below by the longest
+allowed appointment (APPOINTMENT_MAX_HOURS), so they are range scans on the
+(location | clinician_id, start_time) indexes rather than scans of everything
+that started earlier.
+
+availability() finds free slots for many clinicians and rooms over a date
+range with one query and one sweep over the sorted start/end events, so the
+calendar never has to be downloaded to find an opening.
+"""
+import os
+from datetime import datetime, time, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from api.models.appointment import Appointment
+
+MAX_APPOINTMENT_HOURS = int(os.getenv("APPOINTMENT_MAX_HOURS", "24"))
+MAX_AVAILABILITY_DAYS = int(os.getenv("APPOINTMENT_AVAILABILITY_MAX_DAYS", "31"))
+
+CANCELLED = "cancelled"
+CLINICIAN, LOCATION = "clinician", "location"
+
+Interval = Tuple[datetime, datetime]
+
+
+class AppointmentConflict(Exception):
+    """The appointment would double-book a location or clinician"""
+
+    def __init__(self, conflicts: List[Appointment]):
+        super().__init__(f"Conflicts with {len(conflicts)} existing appointment(s)")
+        self.conflicts = conflicts
+
+
+def as_utc(value: datetime) -> datetime:
+    """Aware UTC datetime; naive values (as SQLite returns them) are already UTC"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _booked_between(query, start: datetime, end: datetime):
+    """Appointments that are not cancelled and overlap [start, end)"""
+    return query.filter(
+        Appointment.start_time < end,
+        Appointment.start_time > start - timedelta(hours=MAX_APPOINTMENT_HOURS),
+        Appointment.end_time > start,
+        or_(Appointment.status.is_(None), Appointment.status != CANCELLED),
+    )
+
+
+def find_conflicts(db: Session, start: datetime, end: datetime, location: str,
+                   clinician_id: Optional[int] = None, exclude_id: Optional[int] = None) -> List[Appointment]:
+    """Booked appointments overlapping [start, end) in the same location or with the same clinician"""
+    same_resource = Appointment.location == location
+    if clinician_id is not None:
+        same_resource = or_(same_resource, Appointment.clinician_id == clinician_id)
+    query = _booked_between(db.query(Appointment).filter(same_resource), as_utc(start), as_utc(end))
+    if exclude_id is not None:
+        query = query.filter(Appointment.id != exclude_id)
+    # An edited appointment must not be flushed (and hit the constraint) before it is checked
+    with db.no_autoflush:
+        return query.order_by(Appointment.start_time).all()
+
+
+def prepare_booking(db: Session, appointment: Appointment):
+    """
+    Normalize the appointment's times to UTC and make sure it can be booked.
+    Raises ValueError for invalid times and AppointmentConflict when it
+    overlaps another booking of its location or clinician.
+    """
+    appointment.start_time = as_utc(appointment.start_time)
+    appointment.end_time = as_utc(appointment.end_time)
+    if appointment.end_time <= appointment.start_time:
+        raise ValueError("End time must be after start time.")
+    if appointment.end_time - appointment.start_time > timedelta(hours=MAX_APPOINTMENT_HOURS):
+        raise ValueError(f"Appointments cannot be longer than {MAX_APPOINTMENT_HOURS} hours.")
+    if appointment.status == CANCELLED:
+        return
+    conflicts = find_conflicts(db, appointment.start_time, appointment.end_time, appointment.location,
+                               appointment.clinician_id, exclude_id=appointment.id)
+    if conflicts:
+        raise AppointmentConflict(conflicts)
+
+
+def sweep_free_intervals(events: Iterable[Tuple[datetime, int, int]], resource_count: int,
+                         start: datetime, end: datetime) -> Tuple[List[List[Interval]], List[Interval]]:
+    """
+    One pass over (time, +1 | -1, resource index) busy events: the free
+    intervals of each resource within [start, end), and the intervals in
+    which all of them are free. Ends sort before starts at the same instant,
+    so back-to-back bookings leave no gap and do not overlap.
+    """
+    busy = [0] * resource_count
+    free_since = [start] * resource_count
+    free: List[List[Interval]] = [[] for _ in range(resource_count)]
+    all_free: List[Interval] = []
+    busy_resources = 0
+    all_free_since = start
+
+    for at, delta, i in sorted(events, key=lambda event: (event[0], event[1])):
+        busy[i] += delta
+        if delta > 0 and busy[i] == 1:
+            if at > free_since[i]:
+                free[i].append((free_since[i], at))
+            if busy_resources == 0 and at > all_free_since:
+                all_free.append((all_free_since, at))
+            busy_resources += 1
+        elif delta < 0 and busy[i] == 0:
+            free_since[i] = at
+            busy_resources -= 1
+            if busy_resources == 0:
+                all_free_since = at
+
+    for i in range(resource_count):
+        if busy[i] == 0 and end > free_since[i]:
+            free[i].append((free_since[i], end))
+    if busy_resources == 0 and end > all_free_since:
+        all_free.append((all_free_since, end))
+    return free, all_free
+
+
+def opening_hours(start: datetime, end: datetime, open_time: time, close_time: time, tz: str) -> List[Interval]:
+    """Daily opening windows (in timezone tz) that fall within [start, end), in UTC"""
+    zone = ZoneInfo(tz)
+    windows = []
+    day = start.astimezone(zone).date() - timedelta(days=1)
+    while datetime.combine(day, open_time, zone) < end:
+        opens = datetime.combine(day, open_time, zone)
+        closes = datetime.combine(day + timedelta(days=1) if close_time <= open_time else day, close_time, zone)
+        opens, closes = max(as_utc(opens), start), min(as_utc(closes), end)
+        if closes > opens:
+            windows.append((opens, closes))
+        day += timedelta(days=1)
+    return windows
+
+
+def intersect(intervals: Sequence[Interval], windows: Sequence[Interval]) -> List[Interval]:
+    """Overlap of two sorted, non-overlapping interval lists (a merge of both)"""
+    result = []
+    i = j = 0
+    while i < len(intervals) and j < len(windows):
+        lo = max(intervals[i][0], windows[j][0])
+        hi = min(intervals[i][1], windows[j][1])
+        if hi > lo:
+            result.append((lo, hi))
+        if intervals[i][1] < windows[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+def availability(db: Session, start: datetime, end: datetime, clinician_ids: Sequence[int] = (),
+                 locations: Sequence[str] = (), min_minutes: int = 30, open_time: Optional[time] = None,
+                 close_time: Optional[time] = None, tz: str = "UTC") -> Dict:
+    """
+    Free slots of at least min_minutes for each clinician and location within
+    [start, end), and the slots in which all of them are free at once.
+    With open_time and close_time, only those hours of each day (in tz) count.
+    """
+    start, end = as_utc(start), as_utc(end)
+    clinician_ids, locations = list(dict.fromkeys(clinician_ids)), list(dict.fromkeys(locations))
+    resources = [(CLINICIAN, c) for c in clinician_ids] + [(LOCATION, l) for l in locations]
+    index = {resource: i for i, resource in enumerate(resources)}
+
+    resource_filters = []
+    if clinician_ids:
+        resource_filters.append(Appointment.clinician_id.in_(clinician_ids))
+    if locations:
+        resource_filters.append(Appointment.location.in_(locations))
+    rows = _booked_between(
+        db.query(Appointment.location, Appointment.clinician_id, Appointment.start_time, Appointment.end_time)
+        .filter(or_(*resource_filters)),
+        start, end,
+    ).all()
+
+    events = []
+    for location, clinician_id, booked_from, booked_until in rows:
+        booked_from, booked_until = max(as_utc(booked_from), start), min(as_utc(booked_until), end)
+        for resource in ((LOCATION, location), (CLINICIAN, clinician_id)):
+            i = index.get(resource)
+            if i is not None:
+                events.append((booked_from, 1, i))
+                events.append((booked_until, -1, i))
+
+    free, all_free = sweep_free_intervals(events, len(resources), start, end)
+    windows = opening_hours(start, end, open_time, close_time, tz) if open_time and close_time else None
+    min_length = timedelta(minutes=min_minutes)
+
+    def slots(intervals: List[Interval]) -> List[Dict]:
+        if windows is not None:
+            intervals = intersect(intervals, windows)
+        return [{"start": lo, "end": hi} for lo, hi in intervals if hi - lo >= min_length]
+
+    return {
+        "start": start,
+        "end": end,
+        "min_duration_minutes": min_minutes,
+        "bookings_scanned": len(rows),
+        "resources": [
+            {"type": kind, "id": str(key), "free": slots(free[i])}
+            for (kind, key), i in index.items()
+        ],
+        "all_free": slots(all_free),
+    }
@@ -0,0 +1,123 @@
+"""
+Idempotent AI task submission
+Work on a note is keyed by note id, content hash and pipeline version - the
+same key under which its AI output would be current - and the key is held in
+Redis with the id of the task doing the work. While that task is in flight
+the key is a lease (AI_TASK_LEASE_S); once it succeeds the key is kept for
+AI_TASK_RESULT_TTL_S so repeat submissions are answered with the finished
+task. Duplicates (double clicks, retries, overlapping batches) attach to the
+holder instead of spending another LLM call. A failed task releases its key.
+
+Redis being unreachable never blocks work: claims then succeed and duplicates
+are left to the unchanged-note skip.
+"""
+import os
+import uuid
+from typing import Optional, Tuple
+
+from api.models.note import Note
+from api.services.ai_pipeline import content_hash
+from api.services.note_events import get_redis
+
+LEASE_SECONDS = int(os.getenv("AI_TASK_LEASE_S", str(35 * 60)))
+RESULT_TTL_SECONDS = int(os.getenv("AI_TASK_RESULT_TTL_S", "3600"))
+
+SUBMITTED, ATTACHED, REUSED = "submitted", "attached", "reused"
+FINISHED_FAILED_STATES = ("FAILURE", "REVOKED")
+
+# Compare-and-set on the holder's task id, so only the holder extends or drops its key
+_EXTEND_IF_HELD = """
+if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('expire', KEYS[1], ARGV[2]) end
+return 0
+"""
+_RELEASE_IF_HELD = """
+if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end
+return 0
+"""
+_REPLACE_IF_HELD = """
+if redis.call('get', KEYS[1]) == ARGV[1] then redis.call('set', KEYS[1], ARGV[2], 'EX', ARGV[3]) return 1 end
+return 0
+"""
+
+
+def note_task_key(note: Note, version: str) -> str:
+    return f"ai:idem:note:{note.id}:{content_hash(note)}:{version}"
+
+
+def _decode(value) -> Optional[str]:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def claim(key: str, task_id: str) -> Optional[str]:
+    """
+    Take the key for task_id. Returns None when task_id now holds it (or
+    already did), otherwise the id of the task that holds it.
+    """
+    try:
+        client = get_redis()
+        for _ in range(3):
+            if client.set(key, task_id, nx=True, ex=LEASE_SECONDS):
+                return None
+            holder = _decode(client.get(key))
+            if holder is not None:
+                return None if holder == task_id else holder
+            # The key expired between SET and GET; try again
+    except Exception as e:
+        print(f"⚠️ Idempotency claim failed, running without it: {e}")
+    return None
+
+
+def complete(key: str, task_id: str):
+    """Keep a finished task's key for RESULT_TTL_SECONDS so its result is reused"""
+    try:
+        get_redis().eval(_EXTEND_IF_HELD, 1, key, task_id, RESULT_TTL_SECONDS)
+    except Exception as e:
+        print(f"⚠️ Could not keep idempotency key {key}: {e}")
+
+
+def release(key: str, task_id: str):
+    """Drop a failed task's key so the next submission runs"""
+    try:
+        get_redis().eval(_RELEASE_IF_HELD, 1, key, task_id)
+    except Exception as e:
+        print(f"⚠️ Could not release idempotency key {key}: {e}")
+
+
+def finish(key: str, task_id: str, result: dict):
+    """
+    Keep the key after a final result; release it after a provisional one
+    (breaker open or fallback), which leaves the note in the AI backlog to be
+    processed again
+    """
+    if result.get("success") and not result.get("provisional"):
+        complete(key, task_id)
+    else:
+        release(key, task_id)
+
+
+def submit_note_ai(note: Note, user_id: int, version: str) -> Tuple[str, str]:
+    """
+    Queue process_note_ai for a note unless equivalent work is in flight or
+    recently finished. Returns (task_id, "submitted" | "attached" | "reused").
+    """
+    from celery.result import AsyncResult
+    from api.tasks.celery_app import celery_app
+    from api.tasks.ai_tasks import process_note_ai
+
+    key = note_task_key(note, version)
+    task_id = str(uuid.uuid4())
+    holder = claim(key, task_id)
+    if holder is not None:
+        state = AsyncResult(holder, app=celery_app).state
+        if state not in FINISHED_FAILED_STATES:
+            return holder, (REUSED if state == "SUCCESS" else ATTACHED)
+        # The holder failed without releasing (e.g. its worker died); take over its key
+        if not get_redis().eval(_REPLACE_IF_HELD, 1, key, holder, task_id, LEASE_SECONDS):
+            return _decode(get_redis().get(key)) or holder, ATTACHED
+
+    try:
+        process_note_ai.apply_async(args=[note.id, user_id], kwargs={"idempotency_key": key}, task_id=task_id)
+    except Exception:
+        release(key, task_id)
+        raise
+    return task_id, SUBMITTED
@@ -0,0 +1,67 @@
+"""
+Task progress pushed over Redis pub/sub
+Celery tasks publish every state change - started, update_state progress,
+retry, success, failure - to a per-task channel, and batch chunks publish each
+note's outcome on the batch's channel. The API relays a channel as
+server-sent events, so clients follow a job as it runs instead of polling the
+result backend.
+"""
+import json
+from typing import Any, Optional
+
+from redis import asyncio as aioredis
+
+from api.services.note_events import REDIS_URL, get_redis
+
+TERMINAL_STATES = ("SUCCESS", "FAILURE", "REVOKED")
+
+
+def task_channel(task_id: str) -> str:
+    return f"ai:task-events:{task_id}"
+
+
+def publish_task_event(task_id: Optional[str], state: str, meta: Any = None):
+    """Push a state change to the task's subscribers; never fails the task"""
+    if not task_id:
+        return
+    payload = json.dumps({"task_id": task_id, "state": state, "meta": meta}, default=str)
+    try:
+        get_redis().publish(task_channel(task_id), payload)
+    except Exception as e:
+        print(f"⚠️ Could not publish event for task {task_id}: {e}")
+
+
+async def subscribe_task_events(task_id: str):
+    """Async pub/sub subscription to a task's channel; release it with close_subscription"""
+    client = aioredis.Redis.from_url(REDIS_URL, socket_connect_timeout=2)
+    pubsub = client.pubsub()
+    try:
+        await pubsub.subscribe(task_channel(task_id))
+    except Exception:
+        await close_subscription(pubsub)
+        raise
+    return pubsub
+
+
+async def close_subscription(pubsub):
+    await pubsub.aclose()
+    await pubsub.connection_pool.disconnect()
+
+
+def _on_task_prerun(task_id=None, task=None, **kwargs):
+    publish_task_event(task_id, "STARTED", {"task": task.name if task else None})
+
+
+def _on_task_postrun(task_id=None, task=None, retval=None, state=None, **kwargs):
+    if state == "SUCCESS":
+        publish_task_event(task_id, state, retval)
+    else:
+        # FAILURE / RETRY carry the exception
+        publish_task_event(task_id, state, {"error": str(retval)})
+
+
+def register_task_events():
+    """Publish task lifecycle events from this Celery process"""
+    from celery.signals import task_prerun, task_postrun
+    task_prerun.connect(_on_task_prerun, weak=False, dispatch_uid="ai_task_events_prerun")
+    task_postrun.connect(_on_task_postrun, weak=False, dispatch_uid="ai_task_events_postrun")
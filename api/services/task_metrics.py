@@ -0,0 +1,282 @@
+"""
+Celery queue and task metrics in Prometheus text format
+Workers record every task's wait time (publish, or its eta, until a worker
+starts it), runtime, outcome and retries from Celery signals, per queue and
+task name. The collect_queue_metrics task (Celery beat, every
+CELERY_METRICS_INTERVAL_S) records each queue's length. Both go to Redis so
+that every worker process adds to the same series, and GET /metrics renders
+them for Prometheus (CELERY_METRICS_STORE=memory keeps them in process,
+=off disables them).
+
+Autoscaling signals: celery_queue_length and the wait-time histogram say
+when work backs up; celery_tasks_in_progress against celery_queue_concurrency
+says how saturated a queue's workers are. A worker process killed mid-task
+(hard time limit, OOM) never sends task_postrun, so its task stays counted
+in progress until the celery:metrics:gauges hash is deleted.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+METRICS_STORE = os.getenv("CELERY_METRICS_STORE", "redis").lower()
+COLLECT_INTERVAL_SECONDS = float(os.getenv("CELERY_METRICS_INTERVAL_S", "15"))
+
+COUNTERS_KEY = "celery:metrics:counters"
+GAUGES_KEY = "celery:metrics:gauges"
+PUBLISHED_HEADER = "published_at"
+
+WAIT_BUCKETS = (0.1, 0.5, 1, 5, 15, 30, 60, 300, 900, 1800, 3600)
+RUNTIME_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 1800)
+
+# Series are stored as "<metric>|<label>|<label>..." hash fields
+SEP = "|"
+
+# task_id -> start time of tasks running in this process (prerun to postrun)
+_started: Dict[str, float] = {}
+_started_lock = threading.Lock()
+
+
+class _MemoryStore:
+    def __init__(self):
+        self._hashes: Dict[str, Dict[str, float]] = {COUNTERS_KEY: {}, GAUGES_KEY: {}}
+        self._mutex = threading.Lock()
+
+    def add(self, key: str, increments: Dict[str, float]):
+        with self._mutex:
+            values = self._hashes[key]
+            for field, amount in increments.items():
+                values[field] = values.get(field, 0) + amount
+
+    def set(self, key: str, values: Dict[str, float]):
+        with self._mutex:
+            self._hashes[key].update(values)
+
+    def read(self, key: str) -> Dict[str, float]:
+        with self._mutex:
+            return dict(self._hashes[key])
+
+
+class _RedisStore:
+    def __init__(self):
+        from api.services.note_events import get_redis
+        self._client = get_redis
+
+    def add(self, key: str, increments: Dict[str, float]):
+        pipe = self._client().pipeline(transaction=False)
+        for field, amount in increments.items():
+            pipe.hincrbyfloat(key, field, amount)
+        pipe.execute()
+
+    def set(self, key: str, values: Dict[str, float]):
+        self._client().hset(key, mapping=values)
+
+    def read(self, key: str) -> Dict[str, float]:
+        return {
+            (field.decode() if isinstance(field, bytes) else field): float(value)
+            for field, value in self._client().hgetall(key).items()
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_metrics_store():
+    """Process-wide metrics store, or None when metrics are off"""
+    global _store
+    if METRICS_STORE == "off":
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = _MemoryStore() if METRICS_STORE == "memory" else _RedisStore()
+        return _store
+
+
+def _series(metric: str, *labels) -> str:
+    return SEP.join((metric, *(str(label) for label in labels)))
+
+
+def _histogram(metric: str, value: float, buckets: Iterable[float], *labels) -> Dict[str, float]:
+    increments = {_series(f"{metric}_bucket", *labels, bound): 1 for bound in buckets if value <= bound}
+    increments[_series(f"{metric}_bucket", *labels, "+Inf")] = 1
+    increments[_series(f"{metric}_sum", *labels)] = value
+    increments[_series(f"{metric}_count", *labels)] = 1
+    return increments
+
+
+def _record(key: str, increments: Dict[str, float]):
+    """Add to the shared series; never fails the task"""
+    store = get_metrics_store()
+    if store is None:
+        return
+    try:
+        store.add(key, increments)
+    except Exception as e:
+        print(f"⚠️ Could not record task metrics: {e}")
+
+
+def _task_queue(task) -> str:
+    delivery_info = task.request.delivery_info or {}
+    queue = delivery_info.get("routing_key")
+    if queue:
+        return queue
+    # Eager runs have no delivery info; use the task's route
+    route = (task.app.conf.task_routes or {}).get(task.name) or {}
+    return route.get("queue") or task.app.conf.task_default_queue
+
+
+def _ready_at(request) -> Optional[float]:
+    """When the task could first have started: its publish time, or its eta if later"""
+    published = getattr(request, PUBLISHED_HEADER, None)
+    if published is None:
+        return None
+    eta = request.eta
+    if eta:
+        eta = datetime.fromisoformat(eta) if isinstance(eta, str) else eta
+        return max(float(published), eta.timestamp())
+    return float(published)
+
+
+def _on_before_task_publish(headers=None, **kwargs):
+    # Also set on retries, which are published again
+    if headers is not None:
+        headers[PUBLISHED_HEADER] = time.time()
+
+
+def _on_task_prerun(task_id=None, task=None, **kwargs):
+    if task is None:
+        return
+    now = time.time()
+    with _started_lock:
+        _started[task_id] = now
+    queue = _task_queue(task)
+    increments = {_series("celery_tasks_in_progress", queue, task.name): 1}
+    _record(GAUGES_KEY, increments)
+    ready_at = _ready_at(task.request)
+    if ready_at is not None:
+        _record(COUNTERS_KEY, _histogram("celery_task_wait_seconds", max(now - ready_at, 0.0),
+                                         WAIT_BUCKETS, queue, task.name))
+
+
+def _on_task_postrun(task_id=None, task=None, state=None, **kwargs):
+    if task is None:
+        return
+    with _started_lock:
+        started = _started.pop(task_id, None)
+    queue = _task_queue(task)
+    _record(GAUGES_KEY, {_series("celery_tasks_in_progress", queue, task.name): -1})
+    increments = {_series("celery_tasks_total", queue, task.name, state or "UNKNOWN"): 1}
+    if started is not None:
+        increments.update(_histogram("celery_task_runtime_seconds", time.time() - started,
+                                     RUNTIME_BUCKETS, queue, task.name))
+    _record(COUNTERS_KEY, increments)
+
+
+def register_task_metrics():
+    """Stamp published tasks and record task metrics from this Celery process"""
+    from celery.signals import before_task_publish, task_prerun, task_postrun
+    before_task_publish.connect(_on_before_task_publish, weak=False, dispatch_uid="ai_task_metrics_publish")
+    task_prerun.connect(_on_task_prerun, weak=False, dispatch_uid="ai_task_metrics_prerun")
+    task_postrun.connect(_on_task_postrun, weak=False, dispatch_uid="ai_task_metrics_postrun")
+
+
+def collect_queue_metrics(app) -> Dict[str, int]:
+    """Record the number of messages waiting in each configured queue"""
+    lengths = {}
+    with app.connection_for_read() as connection:
+        channel = connection.default_channel
+        for queue in app.conf.task_queues:
+            # Not passive: Redis has no key for an empty queue, so a passive declare would fail
+            lengths[queue.name] = channel.queue_declare(queue=queue.name).message_count
+
+    store = get_metrics_store()
+    if store is not None:
+        values = {_series("celery_queue_length", name): length for name, length in lengths.items()}
+        values[_series("celery_queue_metrics_collected_timestamp_seconds")] = time.time()
+        store.set(GAUGES_KEY, values)
+    return lengths
+
+
+METRIC_HELP = {
+    "celery_queue_length": ("gauge", "Messages waiting in the queue"),
+    "celery_queue_concurrency": ("gauge", "Worker processes configured for the queue"),
+    "celery_queue_metrics_collected_timestamp_seconds": ("gauge", "When queue lengths were last collected"),
+    "celery_tasks_in_progress": ("gauge", "Tasks running now"),
+    "celery_tasks_total": ("counter", "Finished task runs by state (SUCCESS, FAILURE, RETRY)"),
+    "celery_task_wait_seconds": ("histogram", "Time from publish (or eta) until a worker started the task"),
+    "celery_task_runtime_seconds": ("histogram", "Task run time"),
+}
+
+# Label names per metric, in the order they are stored
+METRIC_LABELS = {
+    "celery_queue_length": ("queue",),
+    "celery_queue_concurrency": ("queue",),
+    "celery_queue_metrics_collected_timestamp_seconds": (),
+    "celery_tasks_in_progress": ("queue", "task"),
+    "celery_tasks_total": ("queue", "task", "state"),
+    "celery_task_wait_seconds": ("queue", "task"),
+    "celery_task_runtime_seconds": ("queue", "task"),
+}
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _parse(field: str) -> Tuple[str, str, List[str]]:
+    """(family, sample name, label values) of a stored series"""
+    name, *labels = field.split(SEP)
+    for suffix in ("_bucket", "_sum", "_count"):
+        family = name[:-len(suffix)]
+        if name.endswith(suffix) and METRIC_HELP.get(family, ("",))[0] == "histogram":
+            return family, name, labels
+    return name, name, labels
+
+
+def render_prometheus(queue_concurrency: Optional[Dict[str, int]] = None) -> str:
+    """All recorded series in Prometheus text exposition format"""
+    store = get_metrics_store()
+    series: Dict[str, List[Tuple[str, str, float]]] = {}
+    stored = {}
+    if store is not None:
+        stored.update(store.read(COUNTERS_KEY))
+        stored.update(store.read(GAUGES_KEY))
+    for queue, concurrency in (queue_concurrency or {}).items():
+        stored[_series("celery_queue_concurrency", queue)] = concurrency
+
+    for field, value in stored.items():
+        family, name, labels = _parse(field)
+        if family not in METRIC_HELP:
+            continue
+        names = list(METRIC_LABELS[family])
+        if name.endswith("_bucket"):
+            names.append("le")
+        label_text = ",".join(f'{label}="{_escape(value)}"' for label, value in zip(names, labels))
+        series.setdefault(family, []).append((name, label_text, value))
+
+    lines = []
+    for family in METRIC_HELP:
+        if family not in series:
+            continue
+        kind, help_text = METRIC_HELP[family]
+        lines.append(f"# HELP {family} {help_text}")
+        lines.append(f"# TYPE {family} {kind}")
+        for name, label_text, value in sorted(series[family], key=_sample_order):
+            labels = f"{{{label_text}}}" if label_text else ""
+            lines.append(f"{name}{labels} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _sample_order(sample: Tuple[str, str, float]):
+    # Buckets in ascending le order, then _sum and _count, within each label set
+    name, label_text, _ = sample
+    base, _, le = label_text.partition(',le="')
+    bound = le.rstrip('"')
+    bound = float("inf") if bound == "+Inf" else float(bound) if bound else 0.0
+    return base, name.endswith("_count"), name.endswith("_sum"), bound
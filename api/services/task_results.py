@@ -0,0 +1,183 @@
+"""
+Result policy for Celery tasks
+Anything the result backend holds is kept in Redis, so tasks return compact
+results: a status, ids and counts, plus an `output_ref` to the full output
+kept in the database, either in task_outputs (risk reports, batch
+outcomes) or already on the row it belongs to (a note's AI fields). The API
+expands the reference when the task's status is fetched (expand_result).
+
+- Results expire after CELERY_RESULT_TTL_S (the result_expires setting)
+- Stored outputs are purged CELERY_OUTPUT_RETENTION_S after they were
+  written, and never before the result that references them has expired
+- Result payloads of CELERY_RESULT_COMPRESS_MIN_BYTES or more are stored
+  gzip-compressed (the "json-gzip" result serializer); smaller ones, and
+  results written before compression was enabled, stay plain JSON
+- Only the users a task was granted to (grant_task_access, when the API
+  queues it) and admins may read its status and output (can_read_task)
+- result_backend_metrics() reports Redis memory and the result keys' count,
+  estimated size and how many have no expiry
+"""
+import gzip
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from kombu.serialization import register
+from sqlalchemy.orm import Session
+
+from api.models.note import Note
+from api.models.task_output import TaskOutput
+from api.services.note_events import get_redis
+
+RESULT_TTL_SECONDS = int(os.getenv("CELERY_RESULT_TTL_S", str(24 * 3600)))
+OUTPUT_RETENTION_SECONDS = max(int(os.getenv("CELERY_OUTPUT_RETENTION_S", str(7 * 24 * 3600))), RESULT_TTL_SECONDS)
+COMPRESS_MIN_BYTES = int(os.getenv("CELERY_RESULT_COMPRESS_MIN_BYTES", "512"))
+RESULT_COMPRESSION = os.getenv("CELERY_RESULT_COMPRESSION", "gzip").lower()
+
+RESULT_SERIALIZER = "json-gzip"
+RESULT_KEY_PATTERN = "celery-task*-meta-*"  # Task results and group (chord) results
+METRICS_SAMPLE_KEYS = 200
+
+TASK_USERS_KEY = "ai:task:users:{}"
+
+# Output kinds: stored in task_outputs, except NOTE which points at the note itself
+RISK_REPORT, NOTE_BATCH, NOTE = "risk_report", "note_batch", "note"
+
+
+def _dumps(data: Any) -> bytes:
+    raw = json.dumps(data, default=str).encode()
+    if RESULT_COMPRESSION != "gzip" or len(raw) < COMPRESS_MIN_BYTES:
+        return raw
+    return gzip.compress(raw, compresslevel=6)
+
+
+def _loads(payload) -> Any:
+    if isinstance(payload, str):
+        payload = payload.encode()
+    payload = bytes(payload)
+    if payload[:2] == b"\x1f\x8b":
+        payload = gzip.decompress(payload)
+    return json.loads(payload)
+
+
+def register_result_serializer():
+    """Make "json-gzip" available to workers and to clients reading results"""
+    register(RESULT_SERIALIZER, _dumps, _loads,
+             content_type="application/x-json-gzip", content_encoding="binary")
+
+
+def store_output(db: Session, task_id: str, task_name: str, kind: str, payload: Dict,
+                 user_id: Optional[int] = None, patient_id: Optional[int] = None) -> Dict:
+    """
+    Save a task's full output (a retry of the same task overwrites it) and
+    return the reference to put in its result. Commits.
+    """
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=OUTPUT_RETENTION_SECONDS)
+    output = db.query(TaskOutput).filter(TaskOutput.task_id == task_id).first()
+    if output is None:
+        output = TaskOutput(task_id=task_id, task_name=task_name, kind=kind)
+        db.add(output)
+    output.user_id = user_id
+    output.patient_id = patient_id
+    output.payload = json.dumps(payload, default=str)
+    output.expires_at = expires_at
+    db.commit()
+    return {"kind": kind, "id": task_id}
+
+
+def note_output_ref(note_id: int) -> Dict:
+    """Reference to the AI fields saved on a note"""
+    return {"kind": NOTE, "id": note_id}
+
+
+def load_output(db: Session, ref: Dict) -> Optional[Dict]:
+    """The output a reference points to, or None once it is gone"""
+    if ref.get("kind") == NOTE:
+        note = db.query(Note).filter(Note.id == ref["id"]).first()
+        if note is None:
+            return None
+        return {"summary": note.summary, "risk_level": note.risk_level, "recommendations": note.recommendations}
+
+    output = db.query(TaskOutput).filter(
+        TaskOutput.task_id == ref["id"],
+        TaskOutput.expires_at > datetime.now(timezone.utc),
+    ).first()
+    return json.loads(output.payload) if output else None
+
+
+def expand_result(db: Session, result: Any) -> Any:
+    """A task result with its referenced output merged back in, as the task used to return it"""
+    ref = result.get("output_ref") if isinstance(result, dict) else None
+    if not ref:
+        return result
+    output = load_output(db, ref)
+    if output is None:
+        return {**result, "output_expired": True}
+    return {**result, **output}
+
+
+def purge_expired_outputs(db: Session) -> int:
+    """Delete stored outputs past their retention; returns how many"""
+    deleted = db.query(TaskOutput).filter(
+        TaskOutput.expires_at <= datetime.now(timezone.utc)
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+def grant_task_access(task_id: str, user_id: int):
+    """Let a user read the task's status and result (its submitter, or a user attached to it)"""
+    key = TASK_USERS_KEY.format(task_id)
+    try:
+        pipe = get_redis().pipeline()
+        pipe.sadd(key, user_id)
+        pipe.expire(key, RESULT_TTL_SECONDS)
+        pipe.execute()
+    except Exception as e:
+        print(f"⚠️ Could not record access to task {task_id}: {e}")
+
+
+def can_read_task(db: Session, task_id: str, user) -> bool:
+    """Admins read every task; other users the ones granted to them or whose stored output they requested"""
+    if user.role == "admin":
+        return True
+    try:
+        if get_redis().sismember(TASK_USERS_KEY.format(task_id), user.id):
+            return True
+    except Exception as e:
+        print(f"⚠️ Could not check access to task {task_id}: {e}")
+    output = db.query(TaskOutput.user_id).filter(TaskOutput.task_id == task_id).first()
+    return output is not None and output.user_id == user.id
+
+
+def result_backend_metrics() -> Dict:
+    """
+    Memory used by the Redis result backend. Key sizes are measured on a
+    sample of METRICS_SAMPLE_KEYS result keys and scaled to all of them.
+    """
+    client = get_redis()
+    memory = client.info("memory")
+    keys = list(client.scan_iter(match=RESULT_KEY_PATTERN, count=1000))
+
+    pipe = client.pipeline(transaction=False)
+    for key in keys:
+        pipe.ttl(key)
+    ttls = pipe.execute() if keys else []
+    sample = keys[:METRICS_SAMPLE_KEYS]
+    pipe = client.pipeline(transaction=False)
+    for key in sample:
+        pipe.memory_usage(key)
+    sizes = [size or 0 for size in pipe.execute()] if sample else []
+
+    average = sum(sizes) / len(sizes) if sizes else 0
+    return {
+        "used_memory_bytes": memory.get("used_memory"),
+        "used_memory_peak_bytes": memory.get("used_memory_peak"),
+        "result_keys": len(keys),
+        "result_keys_without_ttl": sum(1 for ttl in ttls if ttl == -1),
+        "result_bytes_estimate": int(average * len(keys)),
+        "result_key_avg_bytes": round(average, 1),
+        "result_ttl_s": RESULT_TTL_SECONDS,
+        "compression": RESULT_COMPRESSION,
+    }
@@ -0,0 +1,253 @@
+"""
+Incremental note vector store
+The FAISS index used for similar-case retrieval is kept on disk in
+VECTOR_STORE_DIR together with a high-water mark: the (changed_at, id) of the
+last note applied, where changed_at is updated_at or, for never-edited notes,
+created_at. A sync reads only notes past the mark, in keyset order and
+VECTOR_STORE_SYNC_CHUNK_SIZE rows at a time, so the database reads and
+embedding calls of a run scale with what changed since the last one.
+
+Every chunk of a note is stored under the id "note:<id>:<n>", so an edited
+note's old chunks are replaced and an archived (or un-finalized) note's are
+removed. Notes whose indexed text is unchanged - e.g. only their AI fields
+were written back - are not embedded again.
+
+Rows changed in the last VECTOR_STORE_SYNC_LAG_S seconds are left for the next
+run: their transactions may not have committed yet, and a mark past them
+would skip them for good.
+"""
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from api.models.note import Note, NoteStatus
+from api.services.note_events import get_redis
+
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", "data/vector_store")
+SYNC_CHUNK_SIZE = int(os.getenv("VECTOR_STORE_SYNC_CHUNK_SIZE", "500"))
+SYNC_LAG_SECONDS = int(os.getenv("VECTOR_STORE_SYNC_LAG_S", "60"))
+# One writer at a time: concurrent saves of the index would drop each other's changes
+LOCK_KEY = "ai:vector-store:lock"
+LOCK_SECONDS = 30 * 60
+# Note pipelines ask for a sync this long after their write; one request per window is queued
+SCHEDULE_KEY = "ai:vector-store:scheduled"
+
+WATERMARK_FILE = "watermark.json"
+
+_RELEASE_IF_HELD = """
+if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end
+return 0
+"""
+
+# When a note last changed; updated_at is only set by edits
+changed_at = func.coalesce(Note.updated_at, Note.created_at)
+
+
+class VectorStoreBusy(Exception):
+    """Another worker is writing the vector store"""
+
+
+def note_text(title: str, content: str) -> str:
+    return f"{title}: {content}"
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def document_id(note_id: int, position: int) -> str:
+    return f"note:{note_id}:{position}"
+
+
+@contextmanager
+def vector_store_lock(owner: str):
+    """Hold the writer lock for the duration; Redis being down does not block the sync"""
+    try:
+        client = get_redis()
+        acquired = client.set(LOCK_KEY, owner, nx=True, ex=LOCK_SECONDS)
+    except Exception as e:
+        print(f"⚠️ Vector store lock unavailable, syncing without it: {e}")
+        client, acquired = None, True
+    if not acquired:
+        raise VectorStoreBusy(LOCK_KEY)
+    try:
+        yield
+    finally:
+        if client is not None:
+            try:
+                client.eval(_RELEASE_IF_HELD, 1, LOCK_KEY, owner)
+            except Exception as e:
+                print(f"⚠️ Could not release vector store lock: {e}")
+
+
+def claim_scheduled_sync(delay_seconds: int) -> bool:
+    """True when the caller should queue a sync; False when one is already queued"""
+    try:
+        return bool(get_redis().set(SCHEDULE_KEY, "1", nx=True, ex=delay_seconds))
+    except Exception as e:
+        print(f"⚠️ Could not coalesce vector store syncs: {e}")
+        return True
+
+
+def read_watermark(directory: str = VECTOR_STORE_DIR) -> Optional[Tuple[datetime, int]]:
+    path = os.path.join(directory, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        mark = json.load(f)
+    return datetime.fromisoformat(mark["changed_at"]), mark["note_id"]
+
+
+def write_watermark(mark: Tuple[datetime, int], directory: str = VECTOR_STORE_DIR):
+    """Replace the watermark file atomically"""
+    path = os.path.join(directory, WATERMARK_FILE)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump({"changed_at": mark[0].isoformat(), "note_id": mark[1]}, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def changed_notes(db: Session, after: Optional[Tuple[datetime, int]], until: datetime,
+                  chunk_size: int = SYNC_CHUNK_SIZE) -> Iterator[List]:
+    """
+    Notes changed after the mark and no later than `until`, oldest first, as
+    chunks of (id, title, content, status, changed_at) rows
+    """
+    while True:
+        query = db.query(
+            Note.id, Note.title, Note.content, Note.status, changed_at.label("changed_at")
+        ).filter(changed_at <= until)
+        if after is not None:
+            query = query.filter(_after_mark(db, after))
+        rows = query.order_by(changed_at, Note.id).limit(chunk_size).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        after = (rows[-1].changed_at, rows[-1].id)
+
+
+def _after_mark(db: Session, mark: Tuple[datetime, int]):
+    """Keyset condition: (changed_at, id) > mark"""
+    if db.get_bind().dialect.name == "sqlite":
+        # SQLite keeps server-side timestamps without fractional seconds but binds
+        # parameters with them, so equal times only compare equal as Julian days
+        column, value = func.julianday(changed_at), func.julianday(mark[0])
+    else:
+        column, value = changed_at, mark[0]
+    return or_(column > value, and_(column == value, Note.id > mark[1]))
+
+
+def load_store(embeddings, directory: str = VECTOR_STORE_DIR):
+    """The persisted FAISS store, or None before the first sync"""
+    from langchain_community.vectorstores import FAISS
+
+    if not os.path.exists(os.path.join(directory, "index.faiss")):
+        return None
+    # The index is written only by this module
+    return FAISS.load_local(directory, embeddings, allow_dangerous_deserialization=True)
+
+
+def save_store(store, mark: Optional[Tuple[datetime, int]], directory: str = VECTOR_STORE_DIR):
+    """Save the index, then the mark; a crash in between only means re-applying some notes"""
+    os.makedirs(directory, exist_ok=True)
+    if store is not None:
+        store.save_local(directory)
+    if mark is not None:
+        write_watermark(mark, directory)
+
+
+def _indexed_ids(store, note_id: int) -> List[str]:
+    from langchain_core.documents import Document
+
+    ids = []
+    while store is not None and isinstance(store.docstore.search(document_id(note_id, len(ids))), Document):
+        ids.append(document_id(note_id, len(ids)))
+    return ids
+
+
+def apply_notes(store, rows: Sequence, embeddings, text_splitter) -> Tuple[object, Dict[str, int]]:
+    """
+    Bring the store in line with the given note rows: finalized notes are
+    (re-)indexed when their text changed, all others are removed. Returns the
+    store (created on first use) and counts of indexed, removed and unchanged notes.
+    """
+    from langchain_community.vectorstores import FAISS
+
+    counts = {"indexed": 0, "removed": 0, "unchanged": 0}
+    stale_ids: List[str] = []
+    docs, ids = [], []
+    for row in rows:
+        existing = _indexed_ids(store, row.id)
+        if row.status != NoteStatus.FINALIZED:
+            if existing:
+                stale_ids.extend(existing)
+                counts["removed"] += 1
+            continue
+
+        text = note_text(row.title, row.content)
+        digest = text_hash(text)
+        if existing and store.docstore.search(existing[0]).metadata.get("text_hash") == digest:
+            counts["unchanged"] += 1
+            continue
+
+        stale_ids.extend(existing)
+        chunks = text_splitter.create_documents([text], metadatas=[{"note_id": row.id, "text_hash": digest}])
+        docs.extend(chunks)
+        ids.extend(document_id(row.id, position) for position in range(len(chunks)))
+        counts["indexed"] += 1
+
+    # One delete and one add per chunk of notes: FAISS rebuilds its id map on every delete
+    if stale_ids:
+        store.delete(stale_ids)
+    if docs:
+        if store is None:
+            store = FAISS.from_documents(docs, embeddings, ids=ids)
+        else:
+            store.add_documents(docs, ids=ids)
+    return store, counts
+
+
+def sync_vector_store(db: Session, embeddings, text_splitter, owner: str,
+                      directory: str = VECTOR_STORE_DIR) -> Dict:
+    """
+    Apply every note changed since the last sync and advance the mark.
+    Raises VectorStoreBusy when another sync holds the lock.
+    """
+    until = datetime.now(timezone.utc) - timedelta(seconds=SYNC_LAG_SECONDS)
+    with vector_store_lock(owner):
+        mark = read_watermark(directory)
+        chunks = changed_notes(db, mark, until)
+        first = next(chunks, None)
+        if first is None:
+            # Nothing changed: do not load the index at all
+            return {"status": "unchanged", "notes_seen": 0, "watermark": _describe(mark)}
+
+        store = load_store(embeddings, directory)
+        totals = {"indexed": 0, "removed": 0, "unchanged": 0}
+        seen = 0
+        for rows in _prepend(first, chunks):
+            store, counts = apply_notes(store, rows, embeddings, text_splitter)
+            for key, value in counts.items():
+                totals[key] += value
+            seen += len(rows)
+            mark = (rows[-1].changed_at, rows[-1].id)
+
+        save_store(store, mark, directory)
+        return {"status": "completed", "notes_seen": seen, **totals, "watermark": _describe(mark)}
+
+
+def _prepend(first, rest):
+    yield first
+    yield from rest
+
+
+def _describe(mark: Optional[Tuple[datetime, int]]) -> Optional[Dict]:
+    return {"changed_at": mark[0].isoformat(), "note_id": mark[1]} if mark else None
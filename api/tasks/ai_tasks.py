@@ -1,26 +1,54 @@
 """
 Background AI processing tasks using Celery
 """
-from celery import current_task
+from celery import current_task, chain, chord, group
+from celery.signals import worker_process_init, worker_process_shutdown
 from api.tasks.celery_app import celery_app
+from api.agents.pool import get_agent_pool
 from api.agents.summarization_agent import SummarizationAgent
-from api.agents.risk_agent import RiskAssessmentAgent
 from api.db.database import SessionLocal
 from api.models.note import Note
 from api.models.patient import Patient
+from api.models.risk_state import PatientRiskState
 from api.models.audit import AuditLog, AuditAction
-from api.models.user import User
+from api.models.user import User, UserRole
+from api.services.llm_scheduler import Priority, llm_request_context
+from api.services.ai_pipeline import notes_needing_ai
+from api.services import task_results
 from sqlalchemy.orm import Session
+import asyncio
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
-@celery_app.task(bind=True)
-def process_note_ai(self, note_id: int, user_id: int):
+NOTE_TASK_MAX_RETRIES = 3
+
+@worker_process_init.connect
+def warm_agents(**kwargs):
+    """Build this worker process's agents (and load the vector index) before its first task"""
+    try:
+        get_agent_pool().warm()
+    except Exception as e:
+        # Tasks build the agents on first use instead
+        logger.error(f"Could not warm AI agents: {str(e)}")
+
+@worker_process_shutdown.connect
+def close_agents(**kwargs):
+    get_agent_pool().close()
+
+@celery_app.task(bind=True, max_retries=NOTE_TASK_MAX_RETRIES)
+def process_note_ai(self, note_id: int, user_id: int, idempotency_key: str = None):
     """
-    Background task to process a note with AI summarization and risk assessment
+    Background task to process a note with AI summarization and risk assessment.
+    Holds the note's idempotency key while it runs (claiming it when queued
+    without one, e.g. in the note pipeline); if another task already holds
+    it, this one returns without calling the model.
     """
+    from api.services import task_dedup
+    
     db = SessionLocal()
+    key = idempotency_key
     try:
         # Update task status
         current_task.update_state(
@@ -37,42 +65,128 @@ def process_note_ai(self, note_id: int, user_id: int):
         if not patient:
             raise Exception(f"Patient for note {note_id} not found")
         
+        summarization_agent = get_agent_pool().summarization_agent()
+        if key is None:
+            key = task_dedup.note_task_key(note, summarization_agent.pipeline_version)
+            holder = task_dedup.claim(key, self.request.id)
+            if holder is not None:
+                return {"status": "duplicate", "note_id": note_id, "attached_to": holder}
+        
         # Process with AI
-        summarization_agent = SummarizationAgent()
-        result = summarization_agent.process_note(note, patient, db)
+        with llm_request_context(Priority.URGENT, user_id):
+            result = summarization_agent.process_note(note, patient, db)
         
         # Log audit trail
-        user = db.query(User).filter(User.id == user_id).first()
-        if user:
-            audit_log = AuditLog(
-                user_id=user_id,
-                action=AuditAction.UPDATE,
-                resource_type="note",
-                resource_id=str(note_id),
-                details=f"AI processing completed for note: {note.title}",
-                ip_address="system"
-            )
-            db.add(audit_log)
-            db.commit()
+        _log_note_ai_audit(db, user_id, note_id, note.title)
         
         if result["success"]:
-            return {
-                "status": "completed",
-                "note_id": note_id,
-                "summary": result["summary"],
-                "risk_level": result["risk_level"],
-                "recommendations": result["recommendations"]
-            }
+            task_dedup.finish(key, self.request.id, result)
+            return _note_ai_result(note_id, result, _current_risk_state(db, note.patient_id))
         else:
             raise Exception(f"AI processing failed: {result['error']}")
     
     except Exception as e:
         logger.error(f"Error processing note {note_id}: {str(e)}")
-        raise self.retry(exc=e, countdown=60, max_retries=3)
+        if key is not None and self.request.retries >= self.max_retries:
+            task_dedup.release(key, self.request.id)
+        raise self.retry(exc=e, countdown=60)
     
     finally:
         db.close()
 
+async def process_note_ai_async(task, note_id: int, user_id: int, idempotency_key: str = None):
+    """
+    process_note_ai for the asyncio worker (api/tasks/async_worker.py): the
+    model calls are awaited on the worker's event loop and the database work
+    runs in two short blocking sections off it. `task` is the worker's
+    AsyncTaskContext.
+    """
+    from api.services import task_dedup
+    
+    key = idempotency_key
+    try:
+        await task.update_state(
+            state="PROGRESS",
+            meta={"status": "Processing note with AI", "note_id": note_id}
+        )
+        
+        summarization_agent = get_agent_pool().summarization_agent()
+        note, patient, history = await asyncio.to_thread(_load_note_for_ai, summarization_agent, note_id)
+        if key is None:
+            key = task_dedup.note_task_key(note, summarization_agent.pipeline_version)
+            holder = await asyncio.to_thread(task_dedup.claim, key, task.id)
+            if holder is not None:
+                return {"status": "duplicate", "note_id": note_id, "attached_to": holder}
+        
+        with llm_request_context(Priority.URGENT, user_id):
+            values, result = await summarization_agent.aprocess_note(note, patient, history)
+        risk_state = await asyncio.to_thread(_save_note_ai, summarization_agent, note, values, user_id)
+        
+        if result["success"]:
+            await asyncio.to_thread(task_dedup.finish, key, task.id, result)
+            return _note_ai_result(note_id, result, risk_state)
+        raise Exception(f"AI processing failed: {result['error']}")
+    
+    except Exception as e:
+        logger.error(f"Error processing note {note_id}: {str(e)}")
+        if key is not None and task.retries >= NOTE_TASK_MAX_RETRIES:
+            await asyncio.to_thread(task_dedup.release, key, task.id)
+        raise task.retry(exc=e, countdown=60)
+
+def _load_note_for_ai(summarization_agent: SummarizationAgent, note_id: int):
+    """Note, patient and recent history for aprocess_note, read in one session and detached"""
+    db = SessionLocal()
+    try:
+        note = db.query(Note).filter(Note.id == note_id).first()
+        if not note:
+            raise Exception(f"Note {note_id} not found")
+        patient = db.query(Patient).filter(Patient.id == note.patient_id).first()
+        if not patient:
+            raise Exception(f"Patient for note {note_id} not found")
+        return note, patient, summarization_agent.get_patient_history(patient.id, db)
+    finally:
+        db.close()
+
+def _save_note_ai(summarization_agent: SummarizationAgent, note: Note, values, user_id: int):
+    """Save the note's AI results; returns the patient's refreshed risk state"""
+    db = SessionLocal()
+    try:
+        if values:
+            summarization_agent.save_results(db, {note.id: values}, {note.patient_id})
+        _log_note_ai_audit(db, user_id, note.id, note.title)
+        return _current_risk_state(db, note.patient_id)
+    finally:
+        db.close()
+
+def _log_note_ai_audit(db: Session, user_id: int, note_id: int, title: str):
+    user = db.query(User).filter(User.id == user_id).first()
+    if user:
+        audit_log = AuditLog(
+            user_id=user_id,
+            action=AuditAction.UPDATE,
+            resource_type="note",
+            resource_id=str(note_id),
+            details=f"AI processing completed for note: {title}",
+            ip_address="system"
+        )
+        db.add(audit_log)
+        db.commit()
+
+def _current_risk_state(db: Session, patient_id: int):
+    from api.services.risk_state import risk_state_summary
+    return risk_state_summary(db.get(PatientRiskState, patient_id))
+
+def _note_ai_result(note_id: int, result: dict, risk_state: dict = None) -> dict:
+    # Summary and recommendations are saved on the note; the result points there.
+    # risk_state is the patient state processing just refreshed, for evaluate_patient_alerts.
+    return {
+        "status": "completed",
+        "note_id": note_id,
+        "risk_level": result["risk_level"],
+        "risk_state": risk_state,
+        "output_ref": task_results.note_output_ref(note_id)
+    }
+
 @celery_app.task(bind=True)
 def generate_patient_risk_report(self, patient_id: int, user_id: int):
     """
@@ -85,8 +199,9 @@ def generate_patient_risk_report(self, patient_id: int, user_id: int):
             meta={"status": "Generating risk report", "patient_id": patient_id}
         )
         
-        risk_agent = RiskAssessmentAgent()
-        risk_report = risk_agent.generate_patient_risk_report(patient_id, db)
+        risk_agent = get_agent_pool().risk_agent()
+        with llm_request_context(Priority.URGENT, user_id):
+            risk_report, cache = risk_agent.get_cached_risk_report(patient_id, db)
         
         # Log audit trail
         user = db.query(User).filter(User.id == user_id).first()
@@ -102,10 +217,16 @@ def generate_patient_risk_report(self, patient_id: int, user_id: int):
             db.add(audit_log)
             db.commit()
         
+        output_ref = task_results.store_output(
+            db, self.request.id, self.name, task_results.RISK_REPORT, {"risk_report": risk_report},
+            user_id=user_id, patient_id=patient_id
+        )
         return {
             "status": "completed",
             "patient_id": patient_id,
-            "risk_report": risk_report
+            "risk_level": risk_report.get("risk_level"),
+            "cache": cache,
+            "output_ref": output_ref
         }
     
     except Exception as e:
@@ -115,46 +236,111 @@ def generate_patient_risk_report(self, patient_id: int, user_id: int):
     finally:
         db.close()
 
+BATCH_CHUNK_SIZE = int(os.getenv("AI_BATCH_CHUNK_SIZE", "25"))
+BATCH_CHUNK_MAX_RETRIES = 3
+
 @celery_app.task(bind=True)
 def batch_process_notes(self, note_ids: list, user_id: int):
     """
-    Background task to batch process multiple notes
+    Fan a batch of notes out as chunk tasks (one chord) so every worker takes
+    part; per-note progress is kept under this task's id and the chord
+    callback writes the audit entry once all chunks are done.
     """
+    from api.services import batch_progress
+    
+    batch_id = self.request.id
+    note_ids = list(dict.fromkeys(note_ids))
+    chunks = [note_ids[i:i + BATCH_CHUNK_SIZE] for i in range(0, len(note_ids), BATCH_CHUNK_SIZE)]
+    batch_progress.start_batch(batch_id, note_ids, user_id, len(chunks))
+    
+    if not chunks:
+        return finish_note_batch([], batch_id, user_id)
+    
+    result = chord(
+        group(process_notes_chunk.s(chunk, user_id, batch_id) for chunk in chunks),
+        finish_note_batch.s(batch_id, user_id)
+    ).apply_async()
+    return {
+        "status": "queued",
+        "batch_id": batch_id,
+        "total": len(note_ids),
+        "chunks": len(chunks),
+        "result_id": result.id
+    }
+
+@celery_app.task(bind=True, max_retries=BATCH_CHUNK_MAX_RETRIES)
+def process_notes_chunk(self, note_ids: list, user_id: int, batch_id: str):
+    """
+    Process one chunk of a batch. Each note's outcome is recorded as it
+    finishes; if some notes fail, the chunk is retried with just those notes.
+    """
+    from api.services import batch_progress, task_dedup
+    
+    attempt = self.request.retries
     db = SessionLocal()
+    failed = []
+    claimed = {}
     try:
-        current_task.update_state(
-            state="PROGRESS",
-            meta={"status": f"Processing {len(note_ids)} notes", "total": len(note_ids)}
-        )
-        
-        summarization_agent = SummarizationAgent()
-        results = []
+        summarization_agent = get_agent_pool().summarization_agent()
         
-        for i, note_id in enumerate(note_ids):
-            # Update progress
-            current_task.update_state(
+        def progress(note_id: int, result: dict):
+            self.update_state(
                 state="PROGRESS",
-                meta={
-                    "status": f"Processing note {i+1}/{len(note_ids)}",
-                    "current": i + 1,
-                    "total": len(note_ids)
-                }
+                meta={"batch_id": batch_id, "note_id": note_id, "total": len(note_ids)}
             )
-            
-            note = db.query(Note).filter(Note.id == note_id).first()
-            if note:
-                patient = db.query(Patient).filter(Patient.id == note.patient_id).first()
-                if patient:
-                    result = summarization_agent.process_note(note, patient, db)
-                    results.append({
-                        "note_id": note_id,
-                        "success": result["success"],
-                        "summary": result.get("summary"),
-                        "risk_level": result.get("risk_level"),
-                        "error": result.get("error")
-                    })
         
-        # Log audit trail
+        def claim(note: Note):
+            # Notes another task (e.g. an overlapping batch) is already processing are skipped
+            key = task_dedup.note_task_key(note, summarization_agent.pipeline_version)
+            holder = task_dedup.claim(key, self.request.id)
+            if holder is None:
+                claimed[note.id] = key
+            return holder
+        
+        try:
+            with llm_request_context(Priority.BATCH, user_id):
+                results = summarization_agent.process_notes(note_ids, db, progress=progress, claim=claim)
+        except Exception as e:
+            # The write-back failed, so nothing in the chunk was saved
+            db.rollback()
+            results = {note_id: {"success": False, "error": str(e)} for note_id in note_ids}
+        
+        for note_id, key in claimed.items():
+            task_dedup.finish(key, self.request.id, results[note_id])
+        
+        # Outcomes are recorded once the chunk's write-back has committed
+        for note_id in note_ids:
+            result = results.get(note_id)
+            if result is None:
+                batch_progress.record_note(batch_id, note_id, batch_progress.MISSING, attempt)
+            elif result["success"]:
+                status = batch_progress.SKIPPED if result.get("skipped") else batch_progress.COMPLETED
+                extra = {"duplicate_of": result["duplicate_of"]} if result.get("duplicate_of") else {}
+                batch_progress.record_note(batch_id, note_id, status, attempt, risk_level=result.get("risk_level"), **extra)
+            else:
+                failed.append(note_id)
+                batch_progress.record_note(batch_id, note_id, batch_progress.FAILED, attempt, error=result.get("error"))
+    finally:
+        db.close()
+    
+    if failed and attempt < self.max_retries:
+        # Only the failed notes are redone; the chord waits for the retry
+        raise self.retry(args=[failed, user_id, batch_id], countdown=60 * (attempt + 1))
+    return {"processed": len(note_ids), "failed": failed}
+
+@celery_app.task(bind=True)
+def finish_note_batch(self, chunk_results: list, batch_id: str, user_id: int):
+    """Chord callback: aggregate per-note outcomes, store them and audit the batch"""
+    from api.services import batch_progress
+    
+    results = batch_progress.note_results(batch_id)
+    counts = {status: 0 for status in batch_progress.NOTE_STATUSES}
+    for result in results:
+        counts[result["status"]] += 1
+    batch_progress.finish_batch(batch_id, {"batch_id": batch_id, "total": len(results), "counts": counts})
+    
+    db = SessionLocal()
+    try:
         user = db.query(User).filter(User.id == user_id).first()
         if user:
             audit_log = AuditLog(
@@ -162,46 +348,260 @@ def batch_process_notes(self, note_ids: list, user_id: int):
                 action=AuditAction.UPDATE,
                 resource_type="note",
                 resource_id="batch",
-                details=f"Batch processed {len(note_ids)} notes",
+                details=(
+                    f"Batch processed {len(results)} notes: {counts['completed']} completed, "
+                    f"{counts['skipped']} unchanged, {counts['failed']} failed, {counts['missing']} missing"
+                ),
                 ip_address="system"
             )
             db.add(audit_log)
             db.commit()
         
-        return {
-            "status": "completed",
-            "processed_notes": len(results),
-            "results": results
-        }
+        output_ref = task_results.store_output(
+            db, self.request.id or batch_id, self.name, task_results.NOTE_BATCH, {"results": results},
+            user_id=user_id
+        )
+    finally:
+        db.close()
     
-    except Exception as e:
-        logger.error(f"Error in batch processing: {str(e)}")
-        raise self.retry(exc=e, countdown=60, max_retries=3)
+    return {
+        "status": "completed",
+        "batch_id": batch_id,
+        "processed_notes": len(results),
+        "skipped_notes": counts["skipped"],
+        "failed_notes": counts["failed"],
+        "output_ref": output_ref
+    }
+
+@celery_app.task
+def process_ai_backlog(user_id: int, limit: int = 100):
+    """
+    Queue a batch for notes whose AI fields are missing or out of date
+    """
+    db = SessionLocal()
+    try:
+        version = get_agent_pool().summarization_agent().pipeline_version
+        note_ids = [note.id for note in notes_needing_ai(db, version, limit=limit)]
+        if note_ids:
+            batch_process_notes.delay(note_ids, user_id)
+        return {"status": "queued", "queued_notes": len(note_ids), "pipeline_version": version}
+    finally:
+        db.close()
+
+@celery_app.task
+def run_note_pipeline(note_id: int, revision: int):
+    """
+    Debounced entry point queued after a note is created, edited or finalized.
+    Starts summarize + risk state -> alert -> embed unless a newer event for
+    the note has superseded this one.
+    """
+    from api.services.note_events import latest_revision
+    
+    latest = latest_revision(note_id)
+    if latest is not None and latest != revision:
+        return {"status": "superseded", "note_id": note_id, "revision": revision, "latest": latest}
     
+    db = SessionLocal()
+    try:
+        note = db.query(Note).filter(Note.id == note_id).first()
+        if not note:
+            return {"status": "skipped", "note_id": note_id, "reason": "note not found"}
+        
+        # Processing refreshes the patient's risk state and hands it to the alert check
+        pipeline = chain(
+            process_note_ai.si(note_id, note.author_id),
+            evaluate_patient_alerts.s(note.patient_id),
+            upsert_note_embedding.si(note_id),
+        )
+        result = pipeline.apply_async()
+        return {"status": "started", "note_id": note_id, "revision": revision, "task_id": result.id}
     finally:
         db.close()
 
 @celery_app.task
-def update_vector_store():
+def upsert_note_embedding(note_id: int):
+    """
+    Bring a changed note into the vector store used for similar-case retrieval.
+    Queues one incremental sync per VECTOR_STORE_SYNC_LAG_S window, after the
+    lag, so a burst of edits costs a single index update.
+    """
+    from api.services.vector_index import SYNC_LAG_SECONDS, claim_scheduled_sync
+    
+    delay = SYNC_LAG_SECONDS + 5
+    if not claim_scheduled_sync(delay):
+        return {"status": "already_scheduled", "note_id": note_id}
+    update_vector_store.apply_async(countdown=delay)
+    return {"status": "scheduled", "note_id": note_id, "countdown": delay}
+
+@celery_app.task
+def evaluate_patient_alerts(note_result: dict, patient_id: int):
     """
-    Background task to update vector store with new notes
+    Alert clinical staff when a patient is high or critical risk and not improving.
+    One alert per patient per AI_ALERT_COOLDOWN_S. note_result is process_note_ai's
+    result; runs that did not process the note (duplicates) carry no risk state,
+    so the stored one is used.
     """
+    risk_state = (note_result or {}).get("risk_state")
+    if risk_state is None:
+        db = SessionLocal()
+        try:
+            risk_state = _current_risk_state(db, patient_id) or {}
+        finally:
+            db.close()
+    if risk_state.get("risk_level") not in ("HIGH", "CRITICAL") or risk_state.get("trend") == "decreasing":
+        return {"status": "no_alert", "patient_id": patient_id}
+    
+    from api.services.note_events import get_redis
+    cooldown = int(os.getenv("AI_ALERT_COOLDOWN_S", str(6 * 3600)))
+    if not get_redis().set(f"ai:alert:patient:{patient_id}", risk_state["latest_note_id"], nx=True, ex=cooldown):
+        return {"status": "suppressed", "patient_id": patient_id}
+    
     db = SessionLocal()
     try:
-        from api.services.ai_service import MedicalAIService
-        ai_service = MedicalAIService()
+        patient = db.query(Patient).filter(Patient.id == patient_id).first()
+        staff_emails = [row.email for row in db.query(User.email).filter(
+            User.role == UserRole.DOCTOR,
+            User.is_active == True
+        )]
         
-        # Get all notes for vector store
-        notes = db.query(Note).filter(Note.status == "finalized").all()
-        note_contents = [f"{note.title}: {note.content}" for note in notes]
+        trend = f", trend {risk_state['trend']}" if risk_state.get("trend") else ""
+        from api.services.notification_service import NotificationService
+        result = NotificationService().send_critical_alert(
+            staff_emails=staff_emails,
+            patient_name=f"{patient.first_name} {patient.last_name}" if patient else f"Patient {patient_id}",
+            alert_message=(
+                f"Patient risk is {risk_state['risk_level']} (score {risk_state['risk_score']}{trend}) "
+                f"after note #{risk_state['latest_note_id']}."
+            )
+        )
+        return {"status": "alerted", "patient_id": patient_id, "recipients": len(staff_emails), "success": result["success"]}
+    finally:
+        db.close()
+
+@celery_app.task
+def run_risk_sweep(force: bool = False):
+    """
+    Beat entry point for the nightly population risk sweep: starts a sweep
+    once the nightly slot has passed, resumes one that stopped making
+    progress, and otherwise does nothing. force=True starts one now.
+    """
+    from api.services import risk_sweep
+    
+    db = SessionLocal()
+    try:
+        action, sweep = risk_sweep.next_sweep_action(db, force=force)
+        if action == "start":
+            sweep = risk_sweep.start_sweep(db)
+        if action in ("start", "resume"):
+            risk_sweep.touch_sweep(sweep)
+            db.commit()
+            sweep_risk_chunk.delay(sweep.id)
+        return {"status": action, "sweep": risk_sweep.sweep_summary(sweep)}
+    finally:
+        db.close()
+
+@celery_app.task
+def sweep_risk_chunk(sweep_id: int):
+    """
+    Fan out risk assessments for the sweep's next chunk of patients; the chord
+    callback advances the cursor and queues the chunk after it.
+    """
+    from api.services import risk_sweep
+    from api.models.risk_sweep import RiskSweep
+    
+    db = SessionLocal()
+    try:
+        sweep = db.get(RiskSweep, sweep_id)
+        if not sweep or sweep.status != risk_sweep.RUNNING:
+            return {"status": "skipped", "sweep_id": sweep_id}
         
-        # Update vector store
-        ai_service.add_documents_to_vector_store(note_contents)
+        patient_ids = risk_sweep.next_chunk(db, sweep)
+        if not patient_ids:
+            risk_sweep.advance_sweep(db, sweep_id, sweep.cursor_patient_id, sweep.cursor_patient_id)
+            db.refresh(sweep)
+            risk_sweep.complete_sweep(sweep)
+            db.commit()
+            return {"status": "completed", "sweep": risk_sweep.sweep_summary(sweep)}
         
-        return {
-            "status": "completed",
-            "notes_processed": len(note_contents)
-        }
+        cursor = sweep.cursor_patient_id
+        risk_sweep.touch_sweep(sweep)
+        db.commit()
+        chord(
+            group(assess_sweep_patient.s(sweep_id, patient_id) for patient_id in patient_ids),
+            finish_sweep_chunk.s(sweep_id, cursor, patient_ids[-1])
+        ).apply_async()
+        return {"status": "queued", "sweep_id": sweep_id, "patients": len(patient_ids)}
+    finally:
+        db.close()
+
+@celery_app.task(rate_limit=os.getenv("RISK_SWEEP_RATE_LIMIT", "30/m"))
+def assess_sweep_patient(sweep_id: int, patient_id: int):
+    """
+    Risk report for one patient in a sweep, stored with the sweep's results and
+    in the report cache. Runs at batch priority so clinicians' requests go first.
+    """
+    from api.services import risk_sweep
+    
+    db = SessionLocal()
+    try:
+        with llm_request_context(Priority.BATCH):
+            report, cache = get_agent_pool().risk_agent().get_cached_risk_report(patient_id, db, allow_stale=False)
+        stored = risk_sweep.record_result(db, sweep_id, patient_id, report)
+        return {"patient_id": patient_id, "stored": stored, "cache": cache["status"], "error": report.get("error")}
+    
+    except Exception as e:
+        # A failed patient must not fail the chord; record it and move on
+        logger.error(f"Error assessing patient {patient_id} in risk sweep {sweep_id}: {str(e)}")
+        db.rollback()
+        risk_sweep.record_result(db, sweep_id, patient_id, error=str(e))
+        return {"patient_id": patient_id, "stored": True, "error": str(e)}
+    
+    finally:
+        db.close()
+
+@celery_app.task
+def finish_sweep_chunk(results: list, sweep_id: int, from_cursor: int, to_cursor: int):
+    """Chord callback: record the finished chunk and queue the next one"""
+    from api.services import risk_sweep
+    
+    db = SessionLocal()
+    try:
+        if not risk_sweep.advance_sweep(db, sweep_id, from_cursor, to_cursor):
+            # The sweep was resumed past this chunk or is no longer running
+            return {"status": "superseded", "sweep_id": sweep_id, "cursor": from_cursor}
+        db.commit()
+    finally:
+        db.close()
+    
+    sweep_risk_chunk.delay(sweep_id)
+    return {
+        "status": "advanced",
+        "sweep_id": sweep_id,
+        "cursor": to_cursor,
+        "failed": sum(1 for r in results if r.get("error"))
+    }
+
+@celery_app.task(bind=True)
+def update_vector_store(self):
+    """
+    Apply notes created, edited, finalized or archived since the last run to
+    the persisted vector store (see api/services/vector_index.py)
+    """
+    from api.services.vector_index import VectorStoreBusy, sync_vector_store
+    
+    ai_service = get_agent_pool().ai_service()
+    if not ai_service.enabled:
+        return {"status": "skipped", "reason": "AI service disabled"}
+    
+    db = SessionLocal()
+    try:
+        result = sync_vector_store(db, ai_service.embeddings, ai_service.text_splitter,
+                                   owner=self.request.id or "local")
+        logger.info(f"Vector store sync: {result}")
+        return result
+    
+    except VectorStoreBusy:
+        return {"status": "busy"}
     
     except Exception as e:
         logger.error(f"Error updating vector store: {str(e)}")
@@ -209,3 +609,22 @@ def update_vector_store():
     
     finally:
         db.close()
+
+@celery_app.task
+def purge_task_outputs():
+    """Delete task outputs past their retention (see api/services/task_results.py)"""
+    db = SessionLocal()
+    try:
+        deleted = task_results.purge_expired_outputs(db)
+        if deleted:
+            logger.info(f"Purged {deleted} expired task outputs")
+        return {"deleted": deleted}
+    finally:
+        db.close()
+
+@celery_app.task
+def collect_queue_metrics():
+    """Record queue lengths for the metrics exporter (see api/services/task_metrics.py)"""
+    from api.services.task_metrics import collect_queue_metrics as collect
+    
+    return collect(celery_app)
@@ -0,0 +1,351 @@
+"""
+Asyncio worker for I/O-bound AI tasks
+A prefork Celery worker runs one task per process, and an LLM task spends
+nearly all of its time waiting on the provider, so throughput is bought with
+processes (and their memory). This worker consumes the same Celery queues
+from a single process and runs many tasks at once on one event loop:
+
+- Tasks with a native coroutine (ASYNC_TASKS) await their model calls with
+  ainvoke; their database work runs in short blocking sections on the loop's
+  executor (AI_ASYNC_DB_THREADS threads, within the SQLAlchemy pool size).
+- Every other task that reaches the queue runs on AI_ASYNC_SYNC_THREADS
+  threads, exactly as in a worker process.
+
+Both go through Celery's tracer (trace_task), so results, retries, link
+callbacks, chains, chord parts and task signals are Celery's own. For a
+native task the tracer calls NativeTask, which runs the coroutine on the
+loop and waits for it on a thread; that thread only waits, so it costs
+little next to a worker process.
+
+Like the Celery worker, messages with an eta or countdown stay unacked until
+they are due (the broker redelivers them if this process dies) and take no
+slot meanwhile; expired tasks and tasks revoked with `celery control revoke`
+are recorded as REVOKED instead of run. revoke --terminate cancels a running
+native task; other running tasks finish. At most --concurrency tasks run at
+once.
+
+    python -m api.tasks.async_worker -Q urgent,bulk --concurrency 100
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import heapq
+import itertools
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from celery import signals
+from celery.app.task import Context
+from celery.app.trace import build_tracer, trace_task
+from celery.exceptions import Ignore, TimeLimitExceeded
+from celery.utils.objects import mro_lookup
+from celery.worker import state as worker_state
+
+from api.agents.pool import get_agent_pool
+from api.tasks.celery_app import celery_app
+from api.tasks import ai_tasks
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = int(os.getenv("AI_ASYNC_CONCURRENCY", "100"))
+DB_THREADS = int(os.getenv("AI_ASYNC_DB_THREADS", "10"))
+SYNC_THREADS = int(os.getenv("AI_ASYNC_SYNC_THREADS", "4"))
+
+# Celery task name -> coroutine run instead of the task body
+ASYNC_TASKS: Dict[str, Callable[..., Awaitable]] = {
+    ai_tasks.process_note_ai.name: ai_tasks.process_note_ai_async,
+}
+
+# Task hooks the tracer calls only when the task class overrides them
+TASK_HOOKS = ("before_start", "on_success", "after_return")
+
+
+class RetryTask(Exception):
+    """Raised (via AsyncTaskContext.retry) to have Task.retry send the task again"""
+
+    def __init__(self, exc: Exception, countdown: float, max_retries: Optional[int] = None):
+        super().__init__(str(exc))
+        self.exc = exc
+        self.countdown = countdown
+        self.max_retries = max_retries
+
+
+class AsyncTaskContext:
+    """What a native coroutine gets instead of a bound Celery task"""
+
+    def __init__(self, task, request: Context):
+        self.task = task
+        self.request = request
+        self.id = request.id
+        self.retries = request.retries or 0
+
+    async def update_state(self, state: str, meta: Optional[Dict] = None):
+        await asyncio.to_thread(self.task.update_state, self.id, state, meta)
+
+    def retry(self, exc: Exception, countdown: float = 60, max_retries: Optional[int] = None) -> Exception:
+        """The exception to raise; Task.retry resends the task, or re-raises exc once retries are used up"""
+        return RetryTask(exc, countdown, max_retries)
+
+
+class NativeTask:
+    """
+    A task as the tracer sees it, with the body replaced by a coroutine run on
+    the worker's loop. Every other attribute (request stack, backend, retry,
+    hooks) is the real task's.
+    """
+
+    def __init__(self, task, fn: Callable[..., Awaitable], worker: "AsyncWorker"):
+        self._task = task
+        self._fn = fn
+        self._worker = worker
+        self.__trace__ = build_tracer(task.name, self, app=celery_app, hostname=worker.hostname)
+
+    @classmethod
+    def wrap(cls, task, fn: Callable[..., Awaitable], worker: "AsyncWorker") -> "NativeTask":
+        # build_tracer looks hooks up on the class, so overridden ones are forwarded there
+        hooks = {
+            hook: (lambda name: lambda self, *args, **kwargs: getattr(self._task, name)(*args, **kwargs))(hook)
+            for hook in TASK_HOOKS
+            if mro_lookup(type(task), hook, stop={celery_app.Task, object}, monkey_patched=["celery.app.task"])
+        }
+        return type(f"Native{type(task).__name__}", (cls,), hooks)(task, fn, worker)
+
+    def __getattr__(self, name):
+        return getattr(self._task, name)
+
+    def __call__(self, *args, **kwargs):
+        task, request = self._task, self._task.request
+        future = asyncio.run_coroutine_threadsafe(
+            self._fn(AsyncTaskContext(task, request), *args, **kwargs), self._worker.loop
+        )
+        self._worker.running[request.id] = future
+        time_limit = (request.timelimit or [None])[0] or task.time_limit or celery_app.conf.task_time_limit
+        try:
+            return future.result(timeout=time_limit)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeLimitExceeded(time_limit)
+        except concurrent.futures.CancelledError:
+            # revoke --terminate: recorded like a terminated prefork task, no result of its own
+            task.backend.mark_as_revoked(request.id, "terminated", request=request)
+            signals.task_revoked.send(sender=task, request=request, terminated=True, signum=None, expired=False)
+            raise Ignore()
+        except RetryTask as retry:
+            raise task.retry(exc=retry.exc, countdown=retry.countdown, max_retries=retry.max_retries)
+        finally:
+            self._worker.running.pop(request.id, None)
+
+
+def _parse_time(value) -> Optional[float]:
+    """Epoch seconds of an eta/expires header (ISO 8601, naive means UTC)"""
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value) if isinstance(value, str) else value
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+class AsyncWorker:
+    """Consumes Celery queues and runs the tasks concurrently on one event loop"""
+
+    def __init__(self, queues: List[str], concurrency: int = DEFAULT_CONCURRENCY,
+                 db_threads: int = DB_THREADS, sync_threads: int = SYNC_THREADS):
+        self.queues = queues
+        self.concurrency = concurrency
+        self.db_threads = db_threads
+        self.sync_threads = sync_threads
+        self.hostname = f"async@{socket.gethostname()}"
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._stopping = threading.Event()
+        self._inflight: Set[asyncio.Future] = set()
+        # Unacked eta messages (due, seq, body, message), kept by the consumer thread
+        self._scheduled: List = []
+        self._sequence = itertools.count()
+        # task id -> coroutine future of native tasks now running
+        self.running: Dict[str, concurrent.futures.Future] = {}
+        self.native: Dict[str, NativeTask] = {}
+
+    def run(self):
+        asyncio.run(self._main())
+
+    def stop(self):
+        self._stopping.set()
+
+    async def _main(self):
+        self.loop = asyncio.get_running_loop()
+        # asyncio.to_thread (database sections) runs on the default executor
+        self.loop.set_default_executor(ThreadPoolExecutor(self.db_threads, thread_name_prefix="ai-async-db"))
+        self._start_executors()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            self.loop.add_signal_handler(sig, self.stop)
+
+        pool = get_agent_pool()
+        await asyncio.to_thread(pool.warm)
+        consumer = threading.Thread(target=self._consume, name="ai-async-consumer", daemon=True)
+        consumer.start()
+        print(f"🚀 Async worker {self.hostname} consuming {', '.join(self.queues)} (concurrency {self.concurrency})")
+
+        while not self._stopping.is_set():
+            await asyncio.sleep(0.5)
+        print(f"🛑 Stopping: waiting for {len(self._inflight)} running tasks")
+        await asyncio.to_thread(consumer.join)
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        self._sync_executor.shutdown()
+        self._native_executor.shutdown()
+        await pool.ai_service().aclose()
+
+    def _start_executors(self):
+        self._sync_executor = ThreadPoolExecutor(self.sync_threads, thread_name_prefix="ai-async-sync")
+        # One waiting thread per running native task
+        self._native_executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix="ai-async-native")
+        self.native = {name: NativeTask.wrap(celery_app.tasks[name], fn, self) for name, fn in ASYNC_TASKS.items()}
+
+    # Consumer thread: kombu is synchronous, so messages are fetched, held and acked here
+    def _consume(self):
+        while not self._stopping.is_set():
+            try:
+                with celery_app.connection_for_read() as connection:
+                    queues = [celery_app.amqp.queues[name] for name in self.queues]
+                    control = celery_app.control.mailbox.Node(self.hostname, handlers={"revoke": self._on_revoke})
+                    with connection.Consumer(queues, callbacks=[self._on_message], accept=["json"]), \
+                            control.listen(channel=connection.channel()):
+                        try:
+                            while not self._stopping.is_set():
+                                self._dispatch_due()
+                                try:
+                                    connection.drain_events(timeout=self._next_wakeup())
+                                except socket.timeout:
+                                    pass
+                        finally:
+                            # Back to the queue for the next worker (a dead connection returns them anyway)
+                            for *_, message in self._scheduled:
+                                message.requeue()
+                            self._scheduled.clear()
+            except Exception as e:
+                self._scheduled.clear()
+                logger.error(f"Async worker lost its broker connection: {str(e)}")
+                self._stopping.wait(1)
+
+    def _on_message(self, body, message):
+        due = _parse_time((message.headers or {}).get("eta"))
+        if due is not None and due > time.time():
+            heapq.heappush(self._scheduled, (due, next(self._sequence), body, message))
+            return
+        self._dispatch(body, message)
+
+    def _next_wakeup(self) -> float:
+        if not self._scheduled:
+            return 1.0
+        return min(1.0, max(self._scheduled[0][0] - time.time(), 0.01))
+
+    def _dispatch_due(self):
+        now = time.time()
+        while self._scheduled and self._scheduled[0][0] <= now and not self._stopping.is_set():
+            _, _, body, message = heapq.heappop(self._scheduled)
+            self._dispatch(body, message)
+
+    def _dispatch(self, body, message):
+        # Blocks the consumer (so nothing more is fetched) while every slot is taken
+        while not self._slots.acquire(timeout=1):
+            if self._stopping.is_set():
+                message.requeue()
+                return
+        headers = message.headers or {}
+        message.ack()
+        if self._discard(body, headers):
+            self._slots.release()
+            return
+        self.loop.call_soon_threadsafe(self._start, body, headers, message.delivery_info or {},
+                                       message.properties or {})
+
+    def _discard(self, body, headers: Dict) -> bool:
+        """Record a revoked or expired task as REVOKED instead of running it"""
+        task_id, task = headers.get("id"), celery_app.tasks.get(headers.get("task"))
+        expires = _parse_time(headers.get("expires"))
+        expired = expires is not None and expires < time.time()
+        if task is None or not (expired or task_id in worker_state.revoked):
+            return False
+        request = Context(self._request(body, headers, {}, {}))
+        logger.info(f"Discarding {'expired' if expired else 'revoked'} task {task.name}[{task_id}]")
+        task.backend.mark_as_revoked(task_id, "expired" if expired else "revoked", request=request)
+        signals.task_revoked.send(sender=task, request=request, terminated=False, signum=None, expired=expired)
+        return True
+
+    def _on_revoke(self, state, task_id, terminate=False, signal=None, **kwargs):
+        """Control command handler (consumer thread), as the Celery worker's revoke"""
+        task_ids = [task_id] if isinstance(task_id, str) else list(task_id or [])
+        for revoked_id in task_ids:
+            worker_state.revoked.add(revoked_id)
+            if terminate and revoked_id in self.running:
+                self.running[revoked_id].cancel()
+        return {"ok": f"tasks {set(task_ids)} flagged as revoked"}
+
+    def _start(self, body, headers: Dict, delivery_info: Dict, properties: Dict):
+        task = asyncio.ensure_future(self._execute(body, headers, delivery_info, properties))
+        self._inflight.add(task)
+        task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Future):
+        self._inflight.discard(task)
+        self._slots.release()
+
+    def _request(self, body, headers: Dict, delivery_info: Dict, properties: Dict) -> Dict:
+        args, kwargs, embed = body
+        return {
+            **headers,
+            **(embed or {}),
+            "args": args,
+            "kwargs": kwargs,
+            "hostname": self.hostname,
+            "is_eager": False,
+            "properties": properties,
+            "reply_to": properties.get("reply_to"),
+            "correlation_id": properties.get("correlation_id"),
+            "delivery_info": {
+                "exchange": delivery_info.get("exchange"),
+                "routing_key": delivery_info.get("routing_key"),
+                "priority": properties.get("priority"),
+                "redelivered": delivery_info.get("redelivered", False),
+            },
+        }
+
+    async def _execute(self, body, headers: Dict, delivery_info: Dict, properties: Dict):
+        name, task_id = headers.get("task"), headers.get("id")
+        task = self.native.get(name) or celery_app.tasks.get(name)
+        if task is None:
+            logger.error(f"Async worker received unknown task {name} [{task_id}]")
+            return
+
+        args, kwargs, _ = body
+        request = self._request(body, headers, delivery_info, properties)
+        executor = self._native_executor if name in self.native else self._sync_executor
+        _, info, _, _ = await self.loop.run_in_executor(
+            executor,
+            lambda: trace_task(task, task_id, args, kwargs, request, app=celery_app, hostname=self.hostname)
+        )
+        if info is not None and info.state == "FAILURE":
+            logger.error(f"Task {name}[{task_id}] failed: {info.retval!r}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run Celery AI tasks concurrently on one asyncio event loop")
+    parser.add_argument("-Q", "--queues", default="urgent,bulk", help="Comma-separated queues to consume")
+    parser.add_argument("-c", "--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Tasks held at once")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    AsyncWorker([q.strip() for q in args.queues.split(",") if q.strip()], args.concurrency).run()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
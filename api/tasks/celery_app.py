@@ -1,7 +1,9 @@
 """
 Celery configuration for background tasks
 """
-from celery import Celery
+from celery import Celery, Task
+from celery.schedules import crontab
+from kombu import Queue
 import os
 from dotenv import load_dotenv
 
@@ -10,18 +12,77 @@ load_dotenv()
 # Celery configuration
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
 
+class ProgressTask(Task):
+    """Task whose update_state progress is also pushed to API subscribers"""
+    
+    def update_state(self, task_id=None, state=None, meta=None, **kwargs):
+        super().update_state(task_id=task_id, state=state, meta=meta, **kwargs)
+        from api.services.task_events import publish_task_event
+        publish_task_event(task_id or self.request.id, state, meta)
+
 celery_app = Celery(
     "medical_notes_ai",
     broker=REDIS_URL,
     backend=REDIS_URL,
-    include=["api.tasks.ai_tasks"]
+    include=["api.tasks.ai_tasks"],
+    task_cls=ProgressTask
 )
 
+# Queues, most latency-sensitive first. Run one worker per queue so a bulk
+# backfill cannot occupy the processes urgent and interactive work needs
+# (see start_workers.sh; CELERY_<QUEUE>_CONCURRENCY sets each pool's size).
+INTERACTIVE_QUEUE = "interactive"  # A clinician is waiting on the result
+URGENT_QUEUE = "urgent"            # Note pipeline and alerts after a write
+BULK_QUEUE = "bulk"                # Batches, backfills and sweep assessments
+MAINTENANCE_QUEUE = "maintenance"  # Scheduled housekeeping
+TASK_QUEUES = (INTERACTIVE_QUEUE, URGENT_QUEUE, BULK_QUEUE, MAINTENANCE_QUEUE)
+
+QUEUE_CONCURRENCY = {
+    INTERACTIVE_QUEUE: int(os.getenv("CELERY_INTERACTIVE_CONCURRENCY", "4")),
+    URGENT_QUEUE: int(os.getenv("CELERY_URGENT_CONCURRENCY", "4")),
+    BULK_QUEUE: int(os.getenv("CELERY_BULK_CONCURRENCY", "2")),
+    MAINTENANCE_QUEUE: int(os.getenv("CELERY_MAINTENANCE_CONCURRENCY", "1")),
+}
+
+# Message priority within a queue (Redis: 0 is served first, 9 last)
+PRIORITY_HIGH, PRIORITY_DEFAULT, PRIORITY_LOW = 0, 5, 9
+
+def _route(queue: str, priority: int = PRIORITY_DEFAULT) -> dict:
+    return {"queue": queue, "priority": priority}
+
+TASK_ROUTES = {
+    "api.tasks.ai_tasks.generate_patient_risk_report": _route(INTERACTIVE_QUEUE, PRIORITY_HIGH),
+    "api.tasks.ai_tasks.process_note_ai": _route(URGENT_QUEUE, PRIORITY_HIGH),
+    "api.tasks.ai_tasks.run_note_pipeline": _route(URGENT_QUEUE),
+    "api.tasks.ai_tasks.upsert_note_embedding": _route(URGENT_QUEUE),
+    "api.tasks.ai_tasks.evaluate_patient_alerts": _route(URGENT_QUEUE, PRIORITY_HIGH),
+    "api.tasks.ai_tasks.batch_process_notes": _route(BULK_QUEUE),
+    "api.tasks.ai_tasks.process_notes_chunk": _route(BULK_QUEUE),
+    "api.tasks.ai_tasks.finish_note_batch": _route(BULK_QUEUE, PRIORITY_HIGH),
+    "api.tasks.ai_tasks.process_ai_backlog": _route(BULK_QUEUE),
+    "api.tasks.ai_tasks.sweep_risk_chunk": _route(BULK_QUEUE, PRIORITY_LOW),
+    "api.tasks.ai_tasks.assess_sweep_patient": _route(BULK_QUEUE, PRIORITY_LOW),
+    "api.tasks.ai_tasks.finish_sweep_chunk": _route(BULK_QUEUE, PRIORITY_LOW),
+    "api.tasks.ai_tasks.run_risk_sweep": _route(MAINTENANCE_QUEUE),
+    "api.tasks.ai_tasks.update_vector_store": _route(MAINTENANCE_QUEUE),
+    "api.tasks.ai_tasks.purge_task_outputs": _route(MAINTENANCE_QUEUE),
+    "api.tasks.ai_tasks.collect_queue_metrics": _route(MAINTENANCE_QUEUE, PRIORITY_HIGH),
+}
+
+# Compact results, expiring and compressed (see api/services/task_results.py)
+from api.services.task_results import (  # noqa: E402
+    RESULT_SERIALIZER, RESULT_TTL_SECONDS, register_result_serializer
+)
+register_result_serializer()
+
 # Celery configuration
 celery_app.conf.update(
     task_serializer="json",
     accept_content=["json"],
-    result_serializer="json",
+    result_serializer=RESULT_SERIALIZER,
+    # Plain JSON still decodes: results from before compression was enabled
+    result_accept_content=["json", RESULT_SERIALIZER],
+    result_expires=RESULT_TTL_SECONDS,
     timezone="UTC",
     enable_utc=True,
     task_track_started=True,
@@ -29,4 +90,47 @@ celery_app.conf.update(
     task_soft_time_limit=25 * 60,  # 25 minutes
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=1000,
+    task_queues=[Queue(name) for name in TASK_QUEUES],
+    task_default_queue=URGENT_QUEUE,
+    task_routes=TASK_ROUTES,
+    task_default_priority=PRIORITY_DEFAULT,
+    # Redis emulates priorities with one list per step; serve higher ones first
+    broker_transport_options={
+        "priority_steps": list(range(10)),
+        "sep": ":",
+        "queue_order_strategy": "priority",
+    },
 )
+
+# Started / retry / success / failure events for the task progress stream
+from api.services.task_events import register_task_events  # noqa: E402
+register_task_events()
+
+# Queue length, wait time, runtime and retry metrics for GET /metrics
+from api.services.task_metrics import COLLECT_INTERVAL_SECONDS, register_task_metrics  # noqa: E402
+register_task_metrics()
+
+# Periodic tasks (run `celery -A api.tasks.celery_app beat` alongside the workers)
+celery_app.conf.beat_schedule = {
+    # Starts the nightly risk sweep at RISK_SWEEP_HOUR_UTC and resumes an interrupted one
+    "risk-sweep": {
+        "task": "api.tasks.ai_tasks.run_risk_sweep",
+        "schedule": crontab(minute=f"*/{os.getenv('RISK_SWEEP_CHECK_MINUTES', '15')}"),
+    },
+    # Applies notes changed since the last run to the similar-case vector store
+    "vector-store-sync": {
+        "task": "api.tasks.ai_tasks.update_vector_store",
+        "schedule": crontab(minute=f"*/{os.getenv('VECTOR_STORE_SYNC_MINUTES', '10')}"),
+    },
+    # Queue lengths for GET /metrics; a run that could not start before the next is dropped
+    "queue-metrics": {
+        "task": "api.tasks.ai_tasks.collect_queue_metrics",
+        "schedule": COLLECT_INTERVAL_SECONDS,
+        "options": {"expires": COLLECT_INTERVAL_SECONDS},
+    },
+    # Deletes stored task outputs past CELERY_OUTPUT_RETENTION_S
+    "task-output-purge": {
+        "task": "api.tasks.ai_tasks.purge_task_outputs",
+        "schedule": crontab(minute=0),
+    },
+}
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Prefork versus asyncio worker: note processing throughput and memory
+Processes the same notes two ways, with the fake LLM's injected latency
+standing in for the provider:
+
+- prefork: N forked processes, each taking one note at a time (prefetch 1)
+  and running the synchronous process_note path, as a prefork Celery worker
+  with --concurrency N does
+- async: one process running the asyncio worker's path (load, aprocess_note
+  with ainvoke, save) for up to C notes at once on one event loop
+
+Workers fork from a parent that has already imported the tasks, as Celery's
+pool does, and the clock starts once every worker has built its agents.
+Memory is each worker process's peak RSS and its PSS at the end (PSS splits
+pages shared after fork between the processes). The broker is left out, so
+this needs no Redis and measures only the execution model.
+
+    python -m benchmarks.compare_worker_modes --notes 200 --llm-latency-ms 300 \\
+        --prefork 4 16 --async-concurrency 50
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.run_ai_benchmarks import RESULTS_DIR, git_revision  # noqa: E402
+
+
+def process_memory() -> Dict[str, float]:
+    """Peak RSS and current PSS of this process in MB (Linux /proc)"""
+    memory = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                memory["peak_rss_mb"] = int(line.split()[1]) / 1024
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    memory["pss_mb"] = int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return memory
+
+
+def prefork_child(note_ids, ready, go, results):
+    """One prefork worker process: one note at a time, synchronous model calls"""
+    from api.agents.pool import get_agent_pool
+    from api.db.database import SessionLocal
+    from api.models.note import Note
+
+    agent = get_agent_pool().summarization_agent()
+    ready.put(True)
+    go.wait()
+    processed = 0
+    while True:
+        note_id = note_ids.get()
+        if note_id is None:
+            break
+        db = SessionLocal()
+        try:
+            note = db.query(Note).filter(Note.id == note_id).first()
+            result = agent.process_note(note, note.patient, db, force=True)
+            processed += bool(result["success"])
+        finally:
+            db.close()
+    results.put({"processed": processed, **process_memory()})
+
+
+def async_child(note_ids: List[int], concurrency: int, db_threads: int, ready, go, results):
+    """The asyncio worker: up to `concurrency` notes at once on one event loop"""
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+    from api.agents.pool import get_agent_pool
+    from api.tasks.ai_tasks import _load_note_for_ai, _save_note_ai
+
+    agent = get_agent_pool().summarization_agent()
+    ready.put(True)
+    go.wait()
+
+    async def run():
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(db_threads))
+        slots = asyncio.Semaphore(concurrency)
+
+        async def one(note_id: int) -> bool:
+            async with slots:
+                note, patient, history = await asyncio.to_thread(_load_note_for_ai, agent, note_id)
+                values, result = await agent.aprocess_note(note, patient, history, force=True)
+                await asyncio.to_thread(_save_note_ai, agent, note, values, user_id=0)
+                return bool(result["success"])
+
+        return sum(await asyncio.gather(*(one(note_id) for note_id in note_ids)))
+
+    processed = asyncio.run(run())
+    results.put({"processed": processed, **process_memory()})
+
+
+def run_workers(mode: str, target, args_per_worker: List[tuple]) -> Dict:
+    """Start the workers, wait until all are warm, then time them to completion"""
+    ctx = multiprocessing.get_context("fork")
+    ready, go, results = ctx.Queue(), ctx.Event(), ctx.Queue()
+    workers = [ctx.Process(target=target, args=(*args, ready, go, results)) for args in args_per_worker]
+    for worker in workers:
+        worker.start()
+    for _ in workers:
+        ready.get()
+    start = time.perf_counter()
+    go.set()
+    reports = [results.get() for _ in workers]
+    elapsed = time.perf_counter() - start
+    for worker in workers:
+        worker.join()
+    return summarize(mode, reports, elapsed)
+
+
+def run_prefork(note_ids: List[int], processes: int) -> Dict:
+    queue = multiprocessing.get_context("fork").Queue()
+    for note_id in note_ids:
+        queue.put(note_id)
+    for _ in range(processes):
+        queue.put(None)
+    return run_workers(f"prefork x{processes}", prefork_child, [(queue,)] * processes)
+
+
+def run_async(note_ids: List[int], concurrency: int, db_threads: int) -> Dict:
+    return run_workers(f"async c{concurrency}", async_child, [(note_ids, concurrency, db_threads)])
+
+
+def summarize(mode: str, reports: List[Dict], elapsed: float) -> Dict:
+    processed = sum(r["processed"] for r in reports)
+    peak_rss = sum(r["peak_rss_mb"] for r in reports)
+    pss = sum(r.get("pss_mb", 0.0) for r in reports)
+    return {
+        "mode": mode,
+        "processes": len(reports),
+        "notes_processed": processed,
+        "elapsed_s": round(elapsed, 2),
+        "notes_per_s": round(processed / elapsed, 2),
+        "peak_rss_mb": round(peak_rss, 1),
+        "pss_mb": round(pss, 1) if pss else None,
+        "notes_per_s_per_gb_pss": round(processed / elapsed / (pss / 1024), 1) if pss else None,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare prefork and asyncio note processing")
+    parser.add_argument("--notes", type=int, default=200, help="Notes processed per mode")
+    parser.add_argument("--llm-latency-ms", type=float, default=300, help="Injected latency per model call")
+    parser.add_argument("--prefork", type=int, nargs="+", default=[4, 16], help="Prefork process counts to run")
+    parser.add_argument("--async-concurrency", type=int, nargs="+", default=[50], help="Async concurrency levels")
+    parser.add_argument("--db-threads", type=int, default=10, help="Async worker database threads")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/worker_modes-<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    os.environ["AI_BACKEND"] = "fake"
+    os.environ["AI_AUTO_PIPELINE"] = "false"
+    os.environ["RISK_REPORT_CACHE"] = "memory"
+    os.environ["FAKE_LLM_LATENCY_MS"] = str(args.llm_latency_ms)
+    os.environ["DATABASE_URL"] = f"sqlite:///{Path(tempfile.mkdtemp(prefix='mednotes-workers-')) / 'bench.db'}"
+
+    from benchmarks import dataset
+    from api.db.database import Base, SessionLocal, engine
+    import api.models.appointment, api.models.audit  # noqa: F401  register all tables
+    from api.models.note import Note
+    # Imported before forking, as a Celery worker imports its tasks before starting the pool
+    import api.tasks.ai_tasks  # noqa: F401
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    author = dataset.seed_users(db)
+    patient_ids = dataset.seed_patients(db, max(1, args.notes // 5))
+    dataset.seed_notes(db, patient_ids, 5, author.id)
+    note_ids = [row.id for row in db.query(Note.id).order_by(Note.id).limit(args.notes)]
+    db.close()
+    # Children open their own connections
+    engine.dispose()
+
+    results = []
+    for processes in args.prefork:
+        print(f"⏱  prefork with {processes} processes")
+        results.append(run_prefork(note_ids, processes))
+        print(json.dumps(results[-1]))
+    for concurrency in args.async_concurrency:
+        print(f"⏱  async with concurrency {concurrency}")
+        results.append(run_async(note_ids, concurrency, args.db_threads))
+        print(json.dumps(results[-1]))
+
+    report = {
+        "metadata": {
+            "timestamp": datetime.now().isoformat(),
+            "git_revision": git_revision(),
+            "notes": len(note_ids),
+            "llm_latency_ms": args.llm_latency_ms,
+            "db_threads": args.db_threads,
+        },
+        "results": results,
+    }
+    RESULTS_DIR.mkdir(exist_ok=True)
+    output = Path(args.output) if args.output else RESULTS_DIR / f"worker_modes-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.write_text(json.dumps(report, indent=2))
+    print(f"✅ Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""
+Synthetic dataset generation for benchmarks
+Seeds users, patients and notes with realistic clinical text, and clinician
+calendars, directly through the ORM models, using bulk inserts so large
+tables seed quickly.
+"""
+import random
+from datetime import date, datetime, timedelta
+from typing import List
+
+from sqlalchemy.orm import Session
+
+from api.models.user import User, UserRole
+from api.models.patient import Patient
+from api.models.note import Note, NoteType, NoteStatus
+from api.models.appointment import Appointment
+
+COMPLAINTS = [
+    "chest pain radiating to left arm", "shortness of breath on exertion", "fever and productive cough",
+    "dizziness when standing", "abdominal pain with nausea", "swelling of both ankles",
+    "headache and blurred vision", "fatigue and weight loss", "confusion since this morning",
+]
+HISTORY = ["hypertension", "type 2 diabetes", "COPD", "atrial fibrillation", "CKD stage 3", "asthma"]
+MEDICATIONS = ["Lisinopril 10mg daily", "Metformin 500mg BID", "Atorvastatin 20mg nightly",
+               "Metoprolol 25mg BID", "Amlodipine 5mg daily", "Warfarin 5mg daily"]
+ASSESSMENTS = ["Patient is stable, routine follow-up.", "Condition improving on current regimen.",
+               "Urgent review requested, severe symptoms.", "Critical: escalate to attending.",
+               "Vitals within normal limits."]
+RISK_LEVELS = [None, "LOW", "MEDIUM", "HIGH", "CRITICAL"]
+
+
+def note_text(rng: random.Random, paragraphs: int = 1) -> str:
+    """Build a synthetic clinical note of roughly 350 characters per paragraph"""
+    parts = []
+    for _ in range(paragraphs):
+        parts.append(
+            f"Patient presents with {rng.choice(COMPLAINTS)}, onset {rng.randint(1, 72)} hours ago. "
+            f"BP: {rng.randint(100, 180)}/{rng.randint(60, 110)}, HR: {rng.randint(55, 130)}, "
+            f"RR: {rng.randint(12, 28)}, Temp: {rng.uniform(97.0, 103.0):.1f}F, SpO2: {rng.randint(86, 100)}%. "
+            f"History of {rng.choice(HISTORY)}, on {rng.choice(MEDICATIONS)}. "
+            f"{rng.choice(ASSESSMENTS)}"
+        )
+    return "\n\n".join(parts)
+
+
+def seed_users(db: Session) -> User:
+    """Create (or reuse) the benchmark author"""
+    user = db.query(User).filter(User.email == "bench@hospital.com").first()
+    if not user:
+        user = User(email="bench@hospital.com", hashed_password="!", full_name="Benchmark Author",
+                    role=UserRole.DOCTOR)
+        db.add(user)
+        db.commit()
+    return user
+
+
+def seed_patients(db: Session, count: int, prefix: str = "BENCH", seed: int = 7) -> List[int]:
+    """Bulk insert patients and return their ids"""
+    rng = random.Random(seed)
+    rows = [
+        {
+            "patient_id": f"{prefix}-{i}",
+            "first_name": f"Patient{i}",
+            "last_name": prefix.title(),
+            "date_of_birth": date(1940, 1, 1) + timedelta(days=rng.randint(0, 25000)),
+            "medical_record_number": f"{prefix}-MRN-{i}",
+            "allergies": rng.choice([None, "Penicillin", "Latex"]),
+            "medical_history": ", ".join(rng.sample(HISTORY, 2)),
+        }
+        for i in range(count)
+    ]
+    db.bulk_insert_mappings(Patient, rows)
+    db.commit()
+    return [p.id for p in db.query(Patient.id).filter(Patient.patient_id.like(f"{prefix}-%")).order_by(Patient.id)]
+
+
+def seed_notes(db: Session, patient_ids: List[int], notes_per_patient: int, author_id: int,
+               with_ai_fields: bool = False, paragraphs: int = 1, seed: int = 11) -> int:
+    """Bulk insert notes spread over the last 90 days; returns the number inserted"""
+    rng = random.Random(seed)
+    now = datetime.now()
+    rows = []
+    for patient_id in patient_ids:
+        for _ in range(notes_per_patient):
+            rows.append({
+                "patient_id": patient_id,
+                "author_id": author_id,
+                "note_type": rng.choice([NoteType.DOCTOR_NOTE, NoteType.NURSE_NOTE]),
+                "title": rng.choice(["Progress Note", "Admission Note", "Shift Assessment", "Follow-up"]),
+                "content": note_text(rng, paragraphs),
+                "status": rng.choice([NoteStatus.DRAFT, NoteStatus.FINALIZED, NoteStatus.FINALIZED]),
+                "created_at": now - timedelta(minutes=rng.randint(0, 90 * 24 * 60)),
+                "risk_level": rng.choice(RISK_LEVELS) if with_ai_fields else None,
+            })
+            if len(rows) >= 5000:
+                db.bulk_insert_mappings(Note, rows)
+                rows = []
+    if rows:
+        db.bulk_insert_mappings(Note, rows)
+    db.commit()
+    return len(patient_ids) * notes_per_patient
+
+
+def seed_clinicians(db: Session, count: int, prefix: str = "bench") -> List[int]:
+    """Bulk insert doctors and return their ids"""
+    rows = [
+        {"email": f"{prefix}-clinician-{i}@hospital.com", "hashed_password": "!",
+         "full_name": f"Clinician {i}", "role": UserRole.DOCTOR}
+        for i in range(count)
+    ]
+    db.bulk_insert_mappings(User, rows)
+    db.commit()
+    return [u.id for u in db.query(User.id).filter(User.email.like(f"{prefix}-clinician-%")).order_by(User.id)]
+
+
+def seed_appointments(db: Session, count: int, clinician_ids: List[int], locations: List[str], author_id: int,
+                      start: datetime, seed: int = 13) -> int:
+    """
+    Bulk insert appointments from `start` on: each clinician's days fill up
+    from 08:00 to 17:00 UTC with 15-60 minute visits and short gaps, in a
+    random room. Returns the number of days the calendar spans.
+    """
+    rng = random.Random(seed)
+    first_visit = start.replace(hour=8, minute=0, second=0, microsecond=0)
+    cursors = {clinician_id: first_visit for clinician_id in clinician_ids}
+    rows = []
+    for n in range(count):
+        clinician_id = clinician_ids[n % len(clinician_ids)]
+        begins = cursors[clinician_id] + timedelta(minutes=rng.choice([0, 0, 15, 30]))
+        duration = timedelta(minutes=rng.choice([15, 30, 45, 60]))
+        if (begins + duration).hour >= 17 or (begins + duration).date() != begins.date():
+            begins = (begins + timedelta(days=1)).replace(hour=8, minute=0)
+        cursors[clinician_id] = begins + duration
+        rows.append({
+            "title": rng.choice(["Consultation", "Follow-up", "Procedure", "Telehealth"]),
+            "patient_name": f"Patient {rng.randint(1, 5000)}",
+            "appointment_type": "Consultation",
+            "status": rng.choice(["confirmed", "confirmed", "confirmed", "pending", "cancelled"]),
+            "location": rng.choice(locations),
+            "clinician_id": clinician_id,
+            "start_time": begins,
+            "end_time": begins + duration,
+            "created_by": author_id,
+        })
+        if len(rows) >= 5000:
+            db.bulk_insert_mappings(Appointment, rows)
+            rows = []
+    if rows:
+        db.bulk_insert_mappings(Appointment, rows)
+    db.commit()
+    return (max(cursors.values()).date() - first_visit.date()).days + 1
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Queue isolation load test
+Measures the round-trip latency of interactive risk-report tasks while idle
+and while a bulk batch backfill is running. Interactive tasks go to the
+interactive queue and the backfill to the bulk queue, so interactive latency
+should stay flat; --shared-queue sends the interactive tasks to the bulk
+queue as well, to show the starvation the separate queues prevent.
+
+Needs the real stack: Redis, the database in DATABASE_URL and workers started
+with ./start_workers.sh. Run the workers with the fake backend and no report
+cache so every sample does the same work:
+
+    AI_BACKEND=fake FAKE_LLM_LATENCY_MS=200 RISK_REPORT_CACHE=off ./start_workers.sh
+    python -m benchmarks.load_test_queues --bulk-notes 1000
+    python -m benchmarks.load_test_queues --bulk-notes 1000 --shared-queue
+
+The seeded LOAD<timestamp>-* patients and notes are added to DATABASE_URL; use a
+scratch database.
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.run_ai_benchmarks import RESULTS_DIR, describe, git_revision  # noqa: E402
+
+
+def sample_latency(submit: Callable[[int], object], patient_ids: List[int], count: int,
+                   interval_s: float, keep_going: Callable[[], bool] = lambda: True) -> List[float]:
+    """Submit one task at a time and time it until its result is back"""
+    samples = []
+    for i in range(count):
+        if not keep_going():
+            break
+        start = time.perf_counter()
+        submit(patient_ids[i % len(patient_ids)]).get(timeout=300)
+        samples.append((time.perf_counter() - start) * 1000)
+        time.sleep(interval_s)
+    return samples
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Interactive task latency with and without a bulk backfill running")
+    parser.add_argument("--bulk-notes", type=int, default=1000, help="Notes in the bulk batch")
+    parser.add_argument("--samples", type=int, default=30, help="Interactive samples per phase")
+    parser.add_argument("--interval-ms", type=float, default=200, help="Pause between interactive samples")
+    parser.add_argument("--shared-queue", action="store_true", help="Send interactive tasks to the bulk queue too")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/queue_isolation-<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    from benchmarks import dataset
+    from api.db.database import Base, SessionLocal, engine
+    from api.models.note import Note
+    from api.models.patient import Patient
+    from api.services.batch_progress import batch_progress
+    from api.tasks.celery_app import BULK_QUEUE, INTERACTIVE_QUEUE
+    from api.tasks.ai_tasks import batch_process_notes, generate_patient_risk_report
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    prefix = f"LOAD{int(time.time())}"
+    author = dataset.seed_users(db)
+    patient_ids = dataset.seed_patients(db, max(args.samples, args.bulk_notes // 10), prefix=prefix)
+    dataset.seed_notes(db, patient_ids, max(1, args.bulk_notes // len(patient_ids)), author.id)
+    note_ids = [row.id for row in db.query(Note.id).join(Patient).filter(
+        Patient.patient_id.like(f"{prefix}-%")
+    ).order_by(Note.id).limit(args.bulk_notes)]
+    db.close()
+
+    interactive_queue = BULK_QUEUE if args.shared_queue else INTERACTIVE_QUEUE
+
+    def submit(patient_id: int):
+        return generate_patient_risk_report.apply_async(args=[patient_id, author.id], queue=interactive_queue)
+
+    print(f"⏱  Idle: {args.samples} interactive samples on '{interactive_queue}'")
+    idle = sample_latency(submit, patient_ids, args.samples, args.interval_ms / 1000)
+
+    print(f"📦 Queueing bulk batch of {len(note_ids)} notes")
+    batch_id = batch_process_notes.delay(note_ids, author.id).id
+    bulk_started = time.perf_counter()
+
+    def bulk_running() -> bool:
+        progress = batch_progress(batch_id, include_notes=False)
+        return progress is None or progress["status"] == "running"
+
+    print("⏱  Under load: interactive samples while the batch runs")
+    # Skip the patients used while idle so no sample can be served from earlier work
+    loaded = sample_latency(submit, patient_ids[args.samples:] or patient_ids, args.samples,
+                            args.interval_ms / 1000, bulk_running)
+    progress = batch_progress(batch_id, include_notes=False) or {}
+
+    results = {
+        "idle": describe(idle),
+        "under_load": describe(loaded) if loaded else None,
+        "p95_ratio": round(describe(loaded)["p95_ms"] / describe(idle)["p95_ms"], 2) if loaded else None,
+        "bulk": {
+            "notes": len(note_ids),
+            "done_during_samples": progress.get("done"),
+            "elapsed_s": round(time.perf_counter() - bulk_started, 1),
+        },
+    }
+    report = {
+        "metadata": {
+            "timestamp": datetime.now().isoformat(),
+            "git_revision": git_revision(),
+            "interactive_queue": interactive_queue,
+            "bulk_notes": args.bulk_notes,
+            "samples": args.samples,
+        },
+        "results": results,
+    }
+    RESULTS_DIR.mkdir(exist_ok=True)
+    output = Path(args.output) if args.output else RESULTS_DIR / f"queue_isolation-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.write_text(json.dumps(report, indent=2))
+    print(json.dumps(results, indent=2))
+    print(f"✅ Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
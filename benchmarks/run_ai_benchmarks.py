@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+"""
+AI pipeline benchmark suite
+Runs against the fake LLM backend (AI_BACKEND=fake) and a throwaway SQLite
+database seeded with synthetic data, then writes the results as JSON under
+benchmarks/results/ so runs can be compared over time.
+
+    python -m benchmarks.run_ai_benchmarks
+    python -m benchmarks.run_ai_benchmarks --quick --llm-latency-ms 50
+    python -m benchmarks.run_ai_benchmarks --compare benchmarks/results/<previous>.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def configure_environment(args) -> None:
+    """Point the app at the fake backend and a scratch database before any api import"""
+    os.environ["AI_BACKEND"] = "fake"
+    os.environ["AI_AUTO_PIPELINE"] = "false"
+    os.environ["RISK_REPORT_CACHE"] = "memory"
+    os.environ["FAKE_LLM_LATENCY_MS"] = str(args.llm_latency_ms)
+    os.environ["FAKE_LLM_TOKENS_PER_SEC"] = str(args.llm_tokens_per_sec)
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        db_path = Path(tempfile.mkdtemp(prefix="mednotes-bench-")) / "bench.db"
+        os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+
+
+def timed(fn: Callable) -> float:
+    """Run fn once and return elapsed milliseconds"""
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def describe(samples: List[float]) -> Dict[str, float]:
+    """Latency distribution in milliseconds"""
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+        "p50_ms": round(ordered[len(ordered) // 2], 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+class BenchmarkContext:
+    """Fresh schema per benchmark so table sizes are controlled"""
+
+    def __init__(self):
+        from api.db.database import Base, SessionLocal, engine
+        import api.models.appointment, api.models.audit  # noqa: F401  register all tables
+
+        self.Base, self.SessionLocal, self.engine = Base, SessionLocal, engine
+
+    def reset(self):
+        self.Base.metadata.drop_all(bind=self.engine)
+        self.Base.metadata.create_all(bind=self.engine)
+        return self.SessionLocal()
+
+    def count_statements(self, fn: Callable) -> int:
+        """Run fn once and return the number of SQL statements it executed"""
+        from sqlalchemy import event
+
+        count = 0
+
+        def on_execute(*args):
+            nonlocal count
+            count += 1
+
+        event.listen(self.engine, "before_cursor_execute", on_execute)
+        try:
+            fn()
+        finally:
+            event.remove(self.engine, "before_cursor_execute", on_execute)
+        return count
+
+
+def bench_process_note(ctx: BenchmarkContext, sizes: Dict) -> Dict:
+    """Per-note latency of SummarizationAgent.process_note"""
+    from benchmarks import dataset
+    from api.agents.summarization_agent import SummarizationAgent
+    from api.models.note import Note
+
+    db = ctx.reset()
+    author = dataset.seed_users(db)
+    patient_ids = dataset.seed_patients(db, sizes["process_note_patients"])
+    dataset.seed_notes(db, patient_ids, 5, author.id)
+    agent = SummarizationAgent()
+
+    notes = db.query(Note).limit(sizes["process_note_samples"]).all()
+    samples = [timed(lambda: agent.process_note(note, note.patient, db)) for note in notes]
+    db.close()
+    return describe(samples)
+
+
+def bench_batch_summarize(ctx: BenchmarkContext, sizes: Dict) -> Dict:
+    """/ai/batch-summarize throughput versus batch size"""
+    from fastapi.testclient import TestClient
+    from benchmarks import dataset
+    from api.deps import get_current_active_user
+    from api.main import app
+    from api.models.note import Note
+
+    db = ctx.reset()
+    author = dataset.seed_users(db)
+    patient_ids = dataset.seed_patients(db, 20)
+    dataset.seed_notes(db, patient_ids, 2 * sum(sizes["batch_sizes"]) // 20 + 1, author.id)
+    note_ids = [row.id for row in db.query(Note.id).order_by(Note.id)]
+    app.dependency_overrides[get_current_active_user] = lambda: author
+
+    def submit(batch):
+        client.post("/ai/batch-summarize", json={"note_ids": batch}).raise_for_status()
+
+    results = {}
+    offset = 0
+    try:
+        with TestClient(app) as client:
+            for batch_size in sizes["batch_sizes"]:
+                # Disjoint batches so every note is new; the repeat hits the unchanged-note skip
+                batch = note_ids[offset:offset + batch_size]
+                offset += batch_size
+                elapsed = timed(lambda: submit(batch))
+                results[str(batch_size)] = {
+                    "elapsed_ms": round(elapsed, 3),
+                    "notes_per_sec": round(batch_size / (elapsed / 1000), 2),
+                    "repeat_elapsed_ms": round(timed(lambda: submit(batch)), 3),
+                }
+            # SQL statements per note for a fresh batch (includes the request's auth/session overhead)
+            for batch_size in sizes["batch_sizes"]:
+                batch = note_ids[offset:offset + batch_size]
+                offset += batch_size
+                statements = ctx.count_statements(lambda: submit(batch))
+                results[str(batch_size)]["statements_per_note"] = round(statements / batch_size, 2)
+    finally:
+        app.dependency_overrides.pop(get_current_active_user, None)
+        db.close()
+    return results
+
+
+def bench_risk_report(ctx: BenchmarkContext, sizes: Dict) -> Dict:
+    """generate_patient_risk_report latency versus notes per patient, uncached and from the report cache"""
+    from benchmarks import dataset
+    from api.agents.risk_agent import RiskAssessmentAgent
+
+    agent = RiskAssessmentAgent()
+    results = {}
+    for notes_per_patient in sizes["notes_per_patient"]:
+        db = ctx.reset()
+        author = dataset.seed_users(db)
+        patient_ids = dataset.seed_patients(db, 3)
+        dataset.seed_notes(db, patient_ids, notes_per_patient, author.id, with_ai_fields=True)
+        samples = [timed(lambda: agent.generate_patient_risk_report(pid, db)) for pid in patient_ids]
+        # Rebuild to fill the report cache (ids repeat across dataset sizes); the timed calls are hits
+        for pid in patient_ids:
+            agent.get_cached_risk_report(pid, db, refresh=True)
+        cached = [timed(lambda: agent.get_cached_risk_report(pid, db)) for pid in patient_ids]
+        results[str(notes_per_patient)] = {**describe(samples), "cached": describe(cached)}
+        db.close()
+    return results
+
+
+def bench_high_risk_patients(ctx: BenchmarkContext, sizes: Dict) -> Dict:
+    """get_high_risk_patients latency versus notes table size"""
+    from benchmarks import dataset
+    from api.agents.risk_agent import RiskAssessmentAgent
+
+    agent = RiskAssessmentAgent()
+    db = ctx.reset()
+    author = dataset.seed_users(db)
+    results = {}
+    seeded = 0
+    for table_size in sizes["note_table_sizes"]:
+        # Grow the table incrementally: 10 notes per patient
+        patients_needed = (table_size - seeded) // 10
+        patient_ids = dataset.seed_patients(db, patients_needed, prefix=f"HR{table_size}")
+        seeded += dataset.seed_notes(db, patient_ids, 10, author.id, with_ai_fields=True)
+        samples = [timed(lambda: agent.get_high_risk_patients(db, limit=20)) for _ in range(sizes["repeats"])]
+        results[str(seeded)] = {
+            **describe(samples),
+            "patients_returned": len(agent.get_high_risk_patients(db, limit=20)),
+        }
+    db.close()
+    return results
+
+
+def bench_vector_store(ctx: BenchmarkContext, sizes: Dict) -> Dict:
+    """Vector store build and similarity query time versus corpus size"""
+    import random
+    from benchmarks import dataset
+    from api.services.ai_service import MedicalAIService
+
+    rng = random.Random(3)
+    results = {}
+    for corpus_size in sizes["vector_corpus_sizes"]:
+        service = MedicalAIService()
+        notes = [{"date": "2025-01-01", "type": "doctor_note", "content": dataset.note_text(rng, 3)}
+                 for _ in range(corpus_size)]
+        build_ms = timed(lambda: service.create_vectorstore_from_notes(notes))
+        queries = [dataset.note_text(rng) for _ in range(sizes["repeats"])]
+        query_samples = [timed(lambda: service.vectorstore.similarity_search(q, k=3)) for q in queries]
+        results[str(corpus_size)] = {"build_ms": round(build_ms, 3), "query": describe(query_samples)}
+    return results
+
+
+def bench_vector_store_sync(ctx: BenchmarkContext, sizes: Dict) -> Dict:
+    """Incremental vector store sync: first full run versus a small delta, by corpus size"""
+    import tracemalloc
+    from datetime import timezone
+    from benchmarks import dataset
+    from api.models.note import Note, NoteStatus
+    from api.services import vector_index
+    from api.services.ai_service import MedicalAIService
+
+    service = MedicalAIService()
+    # The seeded edits are committed; nothing needs to wait for the next run
+    vector_index.SYNC_LAG_SECONDS = 0
+    delta = sizes["vector_sync_delta"]
+
+    def measured_sync(db, directory):
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = vector_index.sync_vector_store(db, service.embeddings, service.text_splitter,
+                                                owner="bench", directory=directory)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return {"ms": round(elapsed_ms, 3), "python_peak_kb": round(peak / 1024, 1),
+                **{k: result.get(k, 0) for k in ("notes_seen", "indexed", "removed", "unchanged")}}
+
+    results = {}
+    for corpus_size in sizes["vector_corpus_sizes"]:
+        db = ctx.reset()
+        author = dataset.seed_users(db)
+        patient_ids = dataset.seed_patients(db, max(1, corpus_size // 10), prefix=f"VS{corpus_size}")
+        dataset.seed_notes(db, patient_ids, 10, author.id)
+        directory = tempfile.mkdtemp(prefix="mednotes-vectors-")
+        full = measured_sync(db, directory)
+
+        # Edit half of the delta and archive the other half
+        edited_at = datetime.now(timezone.utc)
+        notes = db.query(Note).filter(Note.status == NoteStatus.FINALIZED).order_by(Note.id).limit(delta).all()
+        for i, note in enumerate(notes):
+            if i % 2:
+                note.status = NoteStatus.ARCHIVED
+            else:
+                note.content += " Reassessed, plan updated."
+            note.updated_at = edited_at
+        db.commit()
+        incremental = measured_sync(db, directory)
+        idle = measured_sync(db, directory)
+        results[str(corpus_size)] = {"full": full, "delta": incremental, "idle": idle}
+        db.close()
+    return results
+
+
+def bench_lexicon(ctx: BenchmarkContext, sizes: Dict) -> Dict:
+    """Clinical lexicon single-pass scan versus the old per-list substring checks, by note size"""
+    import random
+    from benchmarks import dataset
+    from api.services.clinical_lexicon import get_lexicon
+
+    lexicon = get_lexicon()
+    category_terms = {c: lexicon.terms(c) for c in ("risk_factor", "tag", "high_risk", "low_risk")}
+
+    def substring_baseline(text: str):
+        # What the agents did before: lowercase per word list, then `in` per keyword
+        return {c: [t for t in terms if t in text.lower()] for c, terms in category_terms.items()}
+
+    rng = random.Random(5)
+    results = {}
+    for size_kb in sizes["lexicon_note_kb"]:
+        text = ""
+        while len(text) < size_kb * 1024:
+            text += dataset.note_text(rng) + " Patient denies chest pain or fever.\n"
+        text = text[:size_kb * 1024]
+        results[f"{size_kb}kb"] = {
+            "lexicon_scan": describe([timed(lambda: lexicon.scan(text)) for _ in range(sizes["repeats"])]),
+            "substring_baseline": describe([timed(lambda: substring_baseline(text)) for _ in range(sizes["repeats"])]),
+        }
+    return results
+
+
+def bench_entities(ctx: BenchmarkContext, sizes: Dict) -> Dict:
+    """extract_medical_entities with the local fast path versus an LLM call for every note"""
+    import random
+    from benchmarks import dataset
+    from api.services.ai_service import MedicalAIService
+    from api.services.entity_extractor import get_entity_extractor
+    from langchain_core.messages import HumanMessage
+
+    service = MedicalAIService()
+    rng = random.Random(9)
+    notes = [
+        dataset.note_text(rng) + " BP 142/88, HR 91, SpO2 95%. On lisinopril 10 mg daily. Troponin 0.02 ng/mL."
+        for _ in range(sizes["entity_notes"])
+    ]
+    local_only = sum(1 for text in notes if not get_entity_extractor().extract(text).unresolved)
+    return {
+        "notes": len(notes),
+        "resolved_locally": local_only,
+        "local_extract": describe([timed(lambda: get_entity_extractor().extract(text)) for text in notes]),
+        "hybrid": describe([timed(lambda: service.extract_medical_entities(text)) for text in notes]),
+        "llm_every_note": describe([
+            timed(lambda: service._invoke(service.llm, [HumanMessage(content=text)], "entities")) for text in notes
+        ]),
+    }
+
+
+def bench_availability(ctx: BenchmarkContext, sizes: Dict) -> Dict:
+    """Appointment conflict checks and a week's availability sweep versus calendar size"""
+    import random
+    from datetime import datetime, timedelta, timezone
+    from benchmarks import dataset
+    from api.models.appointment import Appointment
+    from api.services import scheduling
+
+    rng = random.Random(5)
+    rooms = [f"Room {i}" for i in range(20)]
+    start = datetime(2026, 1, 5, tzinfo=timezone.utc)
+    results = {}
+    for count in sizes["appointment_counts"]:
+        db = ctx.reset()
+        author = dataset.seed_users(db)
+        clinicians = dataset.seed_clinicians(db, 50)
+        days = dataset.seed_appointments(db, count, clinicians, rooms, author.id, start)
+        probes = [start + timedelta(days=rng.randrange(days), hours=rng.randint(8, 16)) for _ in range(sizes["repeats"])]
+        week_start = start + timedelta(days=max(0, days // 2 - 3))
+        week_end = week_start + timedelta(days=7)
+        week = lambda: scheduling.availability(db, week_start, week_end, clinicians[:20], rooms[:10])
+        results[str(count)] = {
+            "calendar_days": days,
+            "conflict_check": describe([
+                timed(lambda: scheduling.find_conflicts(db, t, t + timedelta(minutes=30), rng.choice(rooms),
+                                                        rng.choice(clinicians)))
+                for t in probes
+            ]),
+            # 20 clinicians and 10 rooms, one query and one sweep
+            "availability_week": describe([timed(week) for _ in range(sizes["repeats"])]),
+            "bookings_scanned": week()["bookings_scanned"],
+            # What the calendar UI fetched before: every appointment of the week
+            "calendar_week_download": describe([
+                timed(lambda: db.query(Appointment).filter(Appointment.start_time >= week_start,
+                                                           Appointment.start_time < week_end).all())
+                for _ in range(sizes["repeats"])
+            ]),
+        }
+        db.close()
+    return results
+
+
+BENCHMARKS = {
+    "process_note": bench_process_note,
+    "batch_summarize": bench_batch_summarize,
+    "risk_report": bench_risk_report,
+    "high_risk_patients": bench_high_risk_patients,
+    "vector_store": bench_vector_store,
+    "vector_store_sync": bench_vector_store_sync,
+    "lexicon": bench_lexicon,
+    "entities": bench_entities,
+    "availability": bench_availability,
+}
+
+FULL_SIZES = {
+    "process_note_patients": 50,
+    "process_note_samples": 200,
+    "batch_sizes": [1, 10, 50, 100, 250],
+    "notes_per_patient": [1, 10, 50, 200, 500],
+    "note_table_sizes": [1000, 10000, 50000],
+    "vector_corpus_sizes": [100, 500, 2000],
+    "vector_sync_delta": 20,
+    "lexicon_note_kb": [1, 10, 50, 100],
+    "entity_notes": 100,
+    "appointment_counts": [1000, 10000, 50000],
+    "repeats": 20,
+}
+
+QUICK_SIZES = {
+    "process_note_patients": 10,
+    "process_note_samples": 20,
+    "batch_sizes": [1, 10, 25],
+    "notes_per_patient": [1, 10, 50],
+    "note_table_sizes": [500, 2000],
+    "vector_corpus_sizes": [50, 200],
+    "vector_sync_delta": 10,
+    "lexicon_note_kb": [1, 10, 100],
+    "entity_notes": 20,
+    "appointment_counts": [500, 5000],
+    "repeats": 5,
+}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def flatten(results: Dict, prefix: str = "") -> Dict[str, float]:
+    """Flatten nested results into {"a.b.c": value} for comparison"""
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def compare(current: Dict, previous_path: str) -> None:
+    """Print the relative change of every shared metric against a previous run"""
+    previous = json.loads(Path(previous_path).read_text())
+    old, new = flatten(previous["results"]), flatten(current["results"])
+    print(f"\nComparison against {previous_path} ({previous['metadata'].get('git_revision')})")
+    for key in sorted(set(old) & set(new)):
+        if key.endswith(".count") or not old[key]:
+            continue
+        change = (new[key] - old[key]) / old[key] * 100
+        print(f"  {key:<55} {old[key]:>12.3f} -> {new[key]:>12.3f}  ({change:+.1f}%)")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the AI pipeline against the fake LLM backend")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="Run only these benchmarks")
+    parser.add_argument("--quick", action="store_true", help="Small dataset sizes for a fast smoke run")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Injected LLM latency per call")
+    parser.add_argument("--llm-tokens-per-sec", type=float, default=0.0, help="Injected LLM generation speed")
+    parser.add_argument("--database-url", help="Database to benchmark against (default: scratch SQLite)")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/ai_pipeline-<timestamp>.json)")
+    parser.add_argument("--compare", help="Previous result file to compare against")
+    args = parser.parse_args(argv)
+
+    configure_environment(args)
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    ctx = BenchmarkContext()
+    sizes = QUICK_SIZES if args.quick else FULL_SIZES
+
+    results = {}
+    for name in args.only or BENCHMARKS:
+        print(f"▶ {name}")
+        start = time.perf_counter()
+        results[name] = BENCHMARKS[name](ctx, sizes)
+        print(f"  done in {time.perf_counter() - start:.1f}s")
+
+    report = {
+        "metadata": {
+            "timestamp": datetime.now().isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": os.environ["DATABASE_URL"].split(":", 1)[0],
+            "llm_latency_ms": args.llm_latency_ms,
+            "llm_tokens_per_sec": args.llm_tokens_per_sec,
+            "sizes": sizes,
+        },
+        "results": results,
+    }
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    output = Path(args.output) if args.output else RESULTS_DIR / f"ai_pipeline-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.write_text(json.dumps(report, indent=2))
+    print(f"✅ Results written to {output}")
+
+    if args.compare:
+        compare(report, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
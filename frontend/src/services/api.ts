@@ -14,6 +14,14 @@ interface User {
   role: string;
 }
 
+interface PatientRiskState {
+  risk_level: string;
+  risk_score: number;
+  trend?: string | null;
+  contributing_note_ids: number[];
+  last_assessed_at: string;
+}
+
 interface Patient {
   id: number;
   patient_id: string;
@@ -23,6 +31,7 @@ interface Patient {
   medical_record_number: string;
   allergies?: string;
   medical_history?: string;
+  risk_state?: PatientRiskState | null;
 }
 
 interface Note {
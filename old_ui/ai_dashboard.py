@@ -1,3 +1,5 @@
+import json
+
 import streamlit as st
 import requests
 import pandas as pd
@@ -60,6 +62,51 @@ def _fetch_high_risk():
     return []
 
 
+def _iter_sse(resp):
+    """Yield (event, data) pairs from a server-sent events response."""
+    event, data = "message", []
+    for line in resp.iter_lines(decode_unicode=True):
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+
+
+def _stream_summary(note, placeholder):
+    """Stream a note summary into a placeholder as the model generates it."""
+    title = note.get("title", "Untitled")
+    text = ""
+    try:
+        with requests.post(
+            f"{st.session_state.API_BASE_URL}/ai/summarize/{note['id']}/stream",
+            headers=_headers(),
+            stream=True,
+            timeout=(8, 120),
+        ) as resp:
+            if resp.status_code != 200:
+                placeholder.warning(f"{title}: summary failed ({resp.status_code})")
+                return False
+            for event, data in _iter_sse(resp):
+                if event == "token":
+                    text += data
+                    placeholder.markdown(f"**{title}**\n\n```\n{text}\n```")
+                elif event == "result":
+                    placeholder.markdown(
+                        f"**{title}** • Risk: {data.get('risk_level', '—')}\n\n{data.get('summary', '')}"
+                    )
+                    return True
+                elif event == "error":
+                    placeholder.warning(f"{title}: {data.get('detail', 'AI processing failed')}")
+                    return False
+    except Exception as ex:
+        placeholder.warning(f"{title}: {ex}")
+    return False
+
+
 def show_ai_dashboard():
     st_section_header(
         "AI Insights Lab",
@@ -118,14 +165,9 @@ def show_ai_dashboard():
         with right:
             if st_gradient_button("Run Full AI Analysis", icon="🚀", key="run-ai"):
                 unprocessed = [n for n in notes if not n.get("summary")]
-                with st.spinner("Processing notes with AI..."):
-                    for note in unprocessed:
-                        requests.post(
-                            f"{st.session_state.API_BASE_URL}/ai/summarize/{note['id']}",
-                            headers=_headers(),
-                        )
-                st.success(f"Queued {len(unprocessed)} notes for AI summarization.")
-                st.experimental_rerun()
+                with left:
+                    completed = sum(_stream_summary(note, st.empty()) for note in unprocessed)
+                st.success(f"Summarized {completed} of {len(unprocessed)} notes with AI.")
 
         processed_notes = [n for n in notes if n.get("summary")]
         if processed_notes:
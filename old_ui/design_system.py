@@ -405,6 +405,7 @@ def st_patient_card(name: str, mrn: str, risk: str = "LOW", meta: Optional[str]
         "LOW": "rgba(25,135,84,0.15); color:#198754;",
         "MEDIUM": "rgba(255,193,7,0.2); color:#b7791f;",
         "HIGH": "rgba(220,53,69,0.2); color:#dc3545;",
+        "CRITICAL": "rgba(157,2,8,0.2); color:#9d0208;",
     }.get(risk.upper(), "rgba(15,23,42,0.08); color:var(--muted);")
     st.markdown(
         f"""
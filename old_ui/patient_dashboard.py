@@ -13,6 +13,14 @@ from design_system import (
     st_tabbed_navbar,
 )
 
+RISK_COLORS = {
+    "Unassessed": "#cbd5e1",
+    "Low": "#4cc9f0",
+    "Medium": "#f9c74f",
+    "High": "#f94144",
+    "Critical": "#9d0208",
+}
+
 
 def _headers():
     if st.session_state.access_token:
@@ -25,6 +33,7 @@ def _fetch_patients():
         resp = requests.get(
             f"{st.session_state.API_BASE_URL}/patients/",
             headers=_headers(),
+            params={"sort_by": "risk"},
             timeout=8,
         )
         if resp.status_code == 200:
@@ -34,6 +43,12 @@ def _fetch_patients():
     return []
 
 
+def _risk_level(patient) -> str:
+    """Current risk level from the patient's materialized risk state"""
+    state = patient.get("risk_state") or {}
+    return state.get("risk_level") or "UNASSESSED"
+
+
 def _calculate_age(dob: str) -> int:
     try:
         birth = datetime.strptime(dob, "%Y-%m-%d")
@@ -88,10 +103,11 @@ def show_patient_dashboard():
     st.session_state.patient_dashboard_nav = selected_tab
 
     if selected_tab == "📊 Overview":
+        high_risk = sum(1 for p in patients if _risk_level(p) in ("HIGH", "CRITICAL"))
         stats = [
             ("Active Patients", str(len(patients)), "+3 this week", "👥"),
             ("Chronic Care", "18", "engaged", "🩺"),
-            ("High Risk", "4", "requires review", "⚠️"),
+            ("High Risk", str(high_risk), "requires review", "⚠️"),
             ("Upcoming Visits", "12", "next 7 days", "📅"),
         ]
         cols = st.columns(4)
@@ -105,7 +121,7 @@ def show_patient_dashboard():
             with grid_cols[idx % 3]:
                 name = f"{patient.get('first_name','')} {patient.get('last_name','')}"
                 mrn = patient.get("medical_record_number", "MRN-0000")
-                risk = ["LOW", "MEDIUM", "HIGH"][idx % 3]
+                risk = _risk_level(patient)
                 st_patient_card(
                     name,
                     mrn,
@@ -185,10 +201,10 @@ def show_patient_dashboard():
                 {
                     "name": f"{p.get('first_name','')} {p.get('last_name','')}",
                     "age": _calculate_age(p.get("date_of_birth", "1980-01-01")),
-                    "risk": ["Low", "Medium", "High"][idx % 3],
+                    "risk": _risk_level(p).title(),
                     "medical_history": p.get("medical_history", "General Care"),
                 }
-                for idx, p in enumerate(patients)
+                for p in patients
             ]
         )
 
@@ -197,7 +213,7 @@ def show_patient_dashboard():
         with metric_cols[0]:
             st_card("Median Age", f"{int(analytics_df['age'].median())}", icon="🎂")
         with metric_cols[1]:
-            st_card("High-Risk Cohort", f"{(analytics_df['risk'] == 'High').sum()}", icon="⚠️")
+            st_card("High-Risk Cohort", f"{analytics_df['risk'].isin(['High', 'Critical']).sum()}", icon="⚠️")
         with metric_cols[2]:
             chronic_share = int(
                 (analytics_df['medical_history'].str.contains("diabetes|hypertension|copd|asthma", case=False).mean())
@@ -212,7 +228,7 @@ def show_patient_dashboard():
                 analytics_df,
                 names="risk",
                 color="risk",
-                color_discrete_map={"Low": "#4cc9f0", "Medium": "#f9c74f", "High": "#f94144"},
+                color_discrete_map=RISK_COLORS,
             )
             fig.update_traces(
                 textposition="inside",
@@ -271,21 +287,21 @@ def show_patient_dashboard():
             st.info("No condition data available.")
 
         st.markdown("##### Risk vs Age Correlation")
-        risk_map = {"Low": 1, "Medium": 2, "High": 3}
+        risk_map = {"Unassessed": 0, "Low": 1, "Medium": 2, "High": 3, "Critical": 4}
         scatter_df = analytics_df.assign(risk_score=analytics_df["risk"].map(risk_map))
         fig = px.scatter(
             scatter_df,
             x="age",
             y="risk_score",
             color="risk",
-            color_discrete_map={"Low": "#4cc9f0", "Medium": "#f9c74f", "High": "#f94144"},
+            color_discrete_map=RISK_COLORS,
             hover_data=["name"],
         )
         fig.update_layout(
             yaxis=dict(
                 tickmode="array",
-                tickvals=[1, 2, 3],
-                ticktext=["Low", "Medium", "High"],
+                tickvals=list(risk_map.values()),
+                ticktext=list(risk_map),
                 color="#475569",
             ),
             paper_bgcolor="white",
@@ -0,0 +1,31 @@
+#!/bin/bash
+# One Celery worker per queue so bulk work never takes the processes that
+# urgent and interactive tasks need, plus beat for scheduled jobs.
+# Pool sizes: CELERY_<QUEUE>_CONCURRENCY (see api/tasks/celery_app.py).
+# AI_ASYNC_WORKER=true serves urgent and bulk from one asyncio worker
+# (api/tasks/async_worker.py, AI_ASYNC_CONCURRENCY tasks at once) instead.
+cd "$(dirname "$0")"
+[ -f venv/bin/activate ] && source venv/bin/activate
+
+start_worker() {
+    local queue=$1 concurrency=$2
+    echo "🚀 Starting Celery worker for '$queue' queue (concurrency $concurrency)"
+    celery -A api.tasks.celery_app worker -Q "$queue" -n "$queue@%h" \
+        --concurrency "$concurrency" --loglevel info &
+}
+
+start_worker interactive "${CELERY_INTERACTIVE_CONCURRENCY:-4}"
+if [ "${AI_ASYNC_WORKER:-false}" = "true" ]; then
+    echo "🚀 Starting async AI worker for 'urgent' and 'bulk' queues"
+    python -m api.tasks.async_worker -Q urgent,bulk &
+else
+    start_worker urgent "${CELERY_URGENT_CONCURRENCY:-4}"
+    start_worker bulk "${CELERY_BULK_CONCURRENCY:-2}"
+fi
+start_worker maintenance "${CELERY_MAINTENANCE_CONCURRENCY:-1}"
+
+echo "⏰ Starting Celery beat"
+celery -A api.tasks.celery_app beat --loglevel info &
+
+trap 'kill $(jobs -p)' INT TERM
+wait
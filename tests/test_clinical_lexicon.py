@@ -0,0 +1,12 @@
+from api.services.clinical_lexicon import get_lexicon
+
+
+def test_tag_nested_in_longer_term():
+    # "chest pain" is not a tag itself, but the "pain" inside it is
+    text = "Patient presents with chest pain radiating to left arm"
+    assert get_lexicon().concepts(text, "tag") == ["pain"]
+    assert get_lexicon().concepts(text, "risk_factor") == ["chest pain"]
+
+
+def test_negated_term_gives_no_nested_tag():
+    assert get_lexicon().concepts("Denies chest pain", "tag") == []
@@ -0,0 +1,13 @@
+from api.services.entity_extractor import get_entity_extractor
+
+
+def test_lab_without_value_recorded_as_pending():
+    result = get_entity_extractor().extract("Troponin pending. Patient resting comfortably in bed.")
+    assert result.entities["lab_results"] == ["Troponin: pending"]
+
+
+def test_bare_lab_mention_left_for_llm():
+    sentence = "Repeat troponin in the morning for trend."
+    result = get_entity_extractor().extract(sentence)
+    assert result.entities["lab_results"] == []
+    assert result.unresolved == [sentence]